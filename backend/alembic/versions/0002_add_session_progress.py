@@ -0,0 +1,46 @@
+"""add session_progress table
+
+Revision ID: 0002_add_session_progress
+Revises: 0001_add_session_condition_id
+Create Date: 2026-10-17
+
+Adds a `session_progress` table holding the latest single-block progress
+payload per session, so progress reads are a primary-key lookup instead of a
+scan over the user's `progress_update` events.
+
+The table starts empty; run `python backfill_session_progress.py` to populate
+it from the event log. Until then, reads fall back to the event scan.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0002_add_session_progress"
+down_revision = "0001_add_session_condition_id"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "session_progress",
+        sa.Column(
+            "session_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("sessions.session_id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.user_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("state_json", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("session_progress")
@@ -0,0 +1,80 @@
+"""promote session_id from events.payload_json to an indexed column
+
+Revision ID: 0003_add_event_session_id
+Revises: 0002_add_session_progress
+Create Date: 2026-10-17
+
+Adds a nullable `events.session_id` column plus a composite index on
+(user_id, type, session_id, created_at), then backfills the column from
+`payload_json["session_id"]` in batches. Events without a session (memory
+and condition events) stay NULL.
+"""
+from uuid import UUID
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0003_add_event_session_id"
+down_revision = "0002_add_session_progress"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+events = sa.table(
+    "events",
+    sa.column("event_id", postgresql.UUID(as_uuid=True)),
+    sa.column("session_id", postgresql.UUID(as_uuid=True)),
+    sa.column("payload_json", sa.JSON()),
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "events",
+        sa.Column("session_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_index(
+        "ix_events_user_type_session_created",
+        "events",
+        ["user_id", "type", "session_id", "created_at"],
+    )
+
+    bind = op.get_bind()
+    last_event_id = None
+    while True:
+        query = (
+            sa.select(events.c.event_id, events.c.payload_json)
+            .where(events.c.session_id.is_(None), events.c.payload_json.isnot(None))
+            .order_by(events.c.event_id)
+            .limit(BATCH_SIZE)
+        )
+        if last_event_id is not None:
+            query = query.where(events.c.event_id > last_event_id)
+        rows = bind.execute(query).fetchall()
+        if not rows:
+            break
+        updates = []
+        for event_id, payload in rows:
+            raw = (payload or {}).get("session_id") if isinstance(payload, dict) else None
+            if not raw:
+                continue
+            try:
+                updates.append({"_event_id": event_id, "_session_id": UUID(str(raw))})
+            except ValueError:
+                continue
+        if updates:
+            bind.execute(
+                events.update()
+                .where(events.c.event_id == sa.bindparam("_event_id"))
+                .values(session_id=sa.bindparam("_session_id")),
+                updates,
+            )
+        last_event_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_user_type_session_created", table_name="events")
+    op.drop_column("events", "session_id")
@@ -0,0 +1,29 @@
+"""add version to session_progress
+
+Revision ID: 0004_add_session_progress_version
+Revises: 0003_add_event_session_id
+Create Date: 2026-10-17
+
+Adds `session_progress.version`, incremented on every progress write. Each
+worker's in-process progress cache stamps entries with it, so a write from
+another worker is detected as a version mismatch. Existing rows start at 1.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_add_session_progress_version"
+down_revision = "0003_add_event_session_id"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "session_progress",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("session_progress", "version")
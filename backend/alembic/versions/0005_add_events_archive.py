@@ -0,0 +1,36 @@
+"""add events_archive table
+
+Revision ID: 0005_add_events_archive
+Revises: 0004_add_session_progress_version
+Create Date: 2026-10-17
+
+Adds `events_archive`, the destination for superseded `progress_update`
+events moved out of `events` by `compact_progress_events.py`. Same columns
+as `events` plus `archived_at`, without foreign keys.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0005_add_events_archive"
+down_revision = "0004_add_session_progress_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "events_archive",
+        sa.Column("event_id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("type", sa.String(length=50), nullable=False),
+        sa.Column("session_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("payload_json", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("events_archive")
@@ -0,0 +1,92 @@
+"""add monotonic seq ordering column to messages and events
+
+Revision ID: 0006_add_message_event_seq
+Revises: 0005_add_events_archive
+Create Date: 2026-10-17
+
+`created_at` has one-second resolution on SQLite, so the user and assistant
+rows written in the same commit tie and "latest" queries are ambiguous. This
+adds a BIGINT `seq` column (assigned by `models.next_sequence` for new rows)
+to `messages`, `events` and `events_archive`, and replaces the events index
+with (user_id, type, session_id, seq) plus a new (session_id, seq) index on
+messages.
+
+Existing rows are backfilled in created_at order as nanoseconds since the
+epoch, bumped by one on ties (user messages before assistant messages), so
+they sort before every row written after the upgrade.
+"""
+from datetime import timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0006_add_message_event_seq"
+down_revision = "0005_add_events_archive"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill(bind, table: sa.Table, pk: sa.Column, order_by: list) -> None:
+    rows = bind.execute(sa.select(pk, table.c.created_at).order_by(*order_by)).fetchall()
+    last_seq = 0
+    updates = []
+    for row_id, created_at in rows:
+        base = 0
+        if created_at is not None:
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            base = int(created_at.timestamp()) * 1_000_000_000
+        last_seq = max(base, last_seq + 1)
+        updates.append({"_id": row_id, "_seq": last_seq})
+        if len(updates) >= BATCH_SIZE:
+            bind.execute(table.update().where(pk == sa.bindparam("_id")).values(seq=sa.bindparam("_seq")), updates)
+            updates = []
+    if updates:
+        bind.execute(table.update().where(pk == sa.bindparam("_id")).values(seq=sa.bindparam("_seq")), updates)
+
+
+def upgrade() -> None:
+    for table_name in ("messages", "events", "events_archive"):
+        op.add_column(table_name, sa.Column("seq", sa.BigInteger(), nullable=True))
+
+    messages = sa.table(
+        "messages",
+        sa.column("msg_id", postgresql.UUID(as_uuid=True)),
+        sa.column("role", sa.String()),
+        sa.column("created_at", sa.DateTime(timezone=True)),
+        sa.column("seq", sa.BigInteger()),
+    )
+    events = sa.table(
+        "events",
+        sa.column("event_id", postgresql.UUID(as_uuid=True)),
+        sa.column("created_at", sa.DateTime(timezone=True)),
+        sa.column("seq", sa.BigInteger()),
+    )
+    bind = op.get_bind()
+    user_first = sa.case((messages.c.role == "user", 0), else_=1)
+    _backfill(bind, messages, messages.c.msg_id, [messages.c.created_at, user_first, messages.c.msg_id])
+    _backfill(bind, events, events.c.event_id, [events.c.created_at, events.c.event_id])
+
+    op.drop_index("ix_events_user_type_session_created", table_name="events")
+    op.create_index(
+        "ix_events_user_type_session_seq",
+        "events",
+        ["user_id", "type", "session_id", "seq"],
+    )
+    op.create_index("ix_messages_session_seq", "messages", ["session_id", "seq"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_session_seq", table_name="messages")
+    op.drop_index("ix_events_user_type_session_seq", table_name="events")
+    op.create_index(
+        "ix_events_user_type_session_created",
+        "events",
+        ["user_id", "type", "session_id", "created_at"],
+    )
+    for table_name in ("events_archive", "events", "messages"):
+        op.drop_column(table_name, "seq")
@@ -0,0 +1,43 @@
+"""add composite indexes for the hot query shapes
+
+Revision ID: 0007_add_hot_query_indexes
+Revises: 0006_add_message_event_seq
+Create Date: 2026-10-17
+
+Indexes matching the queries run on every chat turn and memory request:
+
+- messages (session_id, role, seq): last assistant message / per-role counts
+  in /chat ((session_id, seq) for ordered session reads exists since 0006);
+- memories (user_id, session_id, is_active, created_at): candidates, dedup
+  and SESSION_AUTO recap;
+- memories (user_id, is_active, created_at): PERSISTENT_* context and recap;
+- sessions (user_id, ended_at, started_at): active-session lookups.
+
+events (user_id, type) lookups are served by the leading columns of
+ix_events_user_type_session_seq (0006), so no separate index is added.
+Plain CREATE INDEX works on both SQLite and Postgres.
+"""
+from alembic import op
+
+
+revision = "0007_add_hot_query_indexes"
+down_revision = "0006_add_message_event_seq"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_session_role_seq", "messages", ["session_id", "role", "seq"]),
+    ("ix_memories_user_session_active_created", "memories", ["user_id", "session_id", "is_active", "created_at"]),
+    ("ix_memories_user_active_created", "memories", ["user_id", "is_active", "created_at"]),
+    ("ix_sessions_user_ended_started", "sessions", ["user_id", "ended_at", "started_at"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,30 @@
+"""add memory_version to users
+
+Revision ID: 0008_add_user_memory_version
+Revises: 0007_add_hot_query_indexes
+Create Date: 2026-10-17
+
+Adds `users.memory_version`, incremented in the same transaction as every
+memory insert/update/delete. Each worker's in-process memory context cache
+stamps entries with it, so a write from another worker is detected as a
+version mismatch. Existing rows start at 0.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_add_user_memory_version"
+down_revision = "0007_add_hot_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("memory_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "memory_version")
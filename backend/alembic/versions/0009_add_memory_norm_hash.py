@@ -0,0 +1,76 @@
+"""add normalized-text hash to memories
+
+Revision ID: 0009_add_memory_norm_hash
+Revises: 0008_add_user_memory_version
+Create Date: 2026-10-17
+
+Adds `memories.norm_hash` (sha256 of the normalized text) with an index on
+(user_id, session_id, norm_hash), so duplicate checks are a single indexed
+existence query instead of normalizing every memory in Python. Existing rows
+are backfilled in batches.
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0009_add_memory_norm_hash"
+down_revision = "0008_add_user_memory_version"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+memories = sa.table(
+    "memories",
+    sa.column("memory_id", postgresql.UUID(as_uuid=True)),
+    sa.column("text", sa.Text()),
+    sa.column("norm_hash", sa.String(64)),
+)
+
+
+def _norm_hash(text: str) -> str:
+    # Frozen copy of memory_manager.memory_text_hash at the time of this revision.
+    text = (text or "").strip().lower()
+    if text.startswith("user"):
+        text = text[4:].strip()
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column("memories", sa.Column("norm_hash", sa.String(64), nullable=True))
+
+    bind = op.get_bind()
+    last_memory_id = None
+    while True:
+        query = (
+            sa.select(memories.c.memory_id, memories.c.text)
+            .where(memories.c.norm_hash.is_(None))
+            .order_by(memories.c.memory_id)
+            .limit(BATCH_SIZE)
+        )
+        if last_memory_id is not None:
+            query = query.where(memories.c.memory_id > last_memory_id)
+        rows = bind.execute(query).fetchall()
+        if not rows:
+            break
+        bind.execute(
+            memories.update()
+            .where(memories.c.memory_id == sa.bindparam("_memory_id"))
+            .values(norm_hash=sa.bindparam("_norm_hash")),
+            [{"_memory_id": memory_id, "_norm_hash": _norm_hash(text)} for memory_id, text in rows],
+        )
+        last_memory_id = rows[-1][0]
+
+    op.create_index(
+        "ix_memories_user_session_norm_hash",
+        "memories",
+        ["user_id", "session_id", "norm_hash"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_memories_user_session_norm_hash", table_name="memories")
+    op.drop_column("memories", "norm_hash")
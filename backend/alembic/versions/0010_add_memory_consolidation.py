@@ -0,0 +1,58 @@
+"""add memory consolidation bookkeeping
+
+Revision ID: 0010_add_memory_consolidation
+Revises: 0009_add_memory_norm_hash
+Create Date: 2026-10-17
+
+- `memories.user_edited`: set when a participant edits a memory's text through
+  /memory; the consolidation worker never merges these rows.
+- `users.memory_consolidated_version`: the `memory_version` the worker last
+  processed, so it only revisits users whose memories changed since.
+- `memory_merge_sources`: provenance for consolidated memories, one row per
+  original (text and metadata kept, since the originals are removed).
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0010_add_memory_consolidation"
+down_revision = "0009_add_memory_norm_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "memories",
+        sa.Column("user_edited", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.add_column(
+        "users",
+        sa.Column("memory_consolidated_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "memory_merge_sources",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "memory_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("memories.memory_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("source_memory_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("session_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("phase", sa.Integer(), nullable=True),
+        sa.Column("source_created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("merge_method", sa.String(20), nullable=False),
+        sa.Column("merged_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_memory_merge_sources_memory_id", "memory_merge_sources", ["memory_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_memory_merge_sources_memory_id", table_name="memory_merge_sources")
+    op.drop_table("memory_merge_sources")
+    op.drop_column("users", "memory_consolidated_version")
+    op.drop_column("memories", "user_edited")
@@ -0,0 +1,44 @@
+"""add memory recap snapshots
+
+Revision ID: 0011_add_memory_recap_snapshots
+Revises: 0010_add_memory_consolidation
+Create Date: 2026-10-17
+
+- `memory_recap_snapshots`: serialized phase-end recap per (session, phase),
+  stamped with the user's `memory_version` it was built at.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0011_add_memory_recap_snapshots"
+down_revision = "0010_add_memory_consolidation"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "memory_recap_snapshots",
+        sa.Column(
+            "session_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("sessions.session_id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("phase", sa.Integer(), primary_key=True),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.user_id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("memory_version", sa.Integer(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("memory_recap_snapshots")
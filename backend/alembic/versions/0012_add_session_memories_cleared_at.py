@@ -0,0 +1,35 @@
+"""add sessions.memories_cleared_at for the SESSION_AUTO cleanup sweeper
+
+Revision ID: 0012_add_session_memories_cleared_at
+Revises: 0011_add_memory_recap_snapshots
+Create Date: 2026-10-17
+
+- `sessions.memories_cleared_at`: when the session's SESSION_AUTO memories were
+  deleted; NULL marks ended (or abandoned) SESSION_AUTO sessions as pending.
+  Sessions already ended are stamped with their ``ended_at``: their memories were
+  either deleted inline or deliberately kept (Qualtrics re-authentication).
+- `ix_sessions_condition_cleared_ended` serves the sweeper's pending-session scan.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_add_session_memories_cleared_at"
+down_revision = "0011_add_memory_recap_snapshots"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("sessions", sa.Column("memories_cleared_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE sessions SET memories_cleared_at = ended_at WHERE ended_at IS NOT NULL")
+    op.create_index(
+        "ix_sessions_condition_cleared_ended",
+        "sessions",
+        ["condition_id", "memories_cleared_at", "ended_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sessions_condition_cleared_ended", table_name="sessions")
+    op.drop_column("sessions", "memories_cleared_at")
@@ -0,0 +1,24 @@
+"""add an index for the idle-session expiry sweep
+
+Revision ID: 0013_add_sessions_ended_started_index
+Revises: 0012_add_session_memories_cleared_at
+Create Date: 2026-10-17
+
+- `ix_sessions_ended_started` (ended_at, started_at): the sweeper's scan for open
+  sessions, oldest first, without reading ended ones.
+"""
+from alembic import op
+
+
+revision = "0013_add_sessions_ended_started_index"
+down_revision = "0012_add_session_memories_cleared_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_sessions_ended_started", "sessions", ["ended_at", "started_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sessions_ended_started", table_name="sessions")
@@ -0,0 +1,118 @@
+"""
+Token budget for the "Context from previous conversations" block.
+
+Tokens are estimated locally (no tokenizer download): roughly four characters per
+token, never fewer than one token per word. The configured total covers the whole
+prompt, so the system prompt, the fixed guided-turn instructions and the user's
+message are reserved first; what is left is split between recent session turns and
+memories. A section that needs less than its share hands the rest to the other one.
+
+Within a section the lowest-value items go first: the oldest session turns, and the
+memories ranked last by memory_manager (least relevant, then oldest). If even the most
+valuable item of a section does not fit, it is clipped rather than dropped.
+"""
+import math
+import os
+from dataclasses import asdict, dataclass
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Share of the context budget recent turns may claim before memories get the rest.
+CONTEXT_MESSAGE_SHARE = float(os.getenv("CONTEXT_MESSAGE_SHARE", "0.5"))
+# Progress/scope instructions and chat-format overhead added around the context.
+PROMPT_OVERHEAD_TOKENS = 200
+# Per-line overhead (the "Memory: " / "User: " prefix and newline).
+LINE_OVERHEAD_TOKENS = 2
+
+_CLIP_MARKER = " …"
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(text.split()))
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Keep the head of ``text`` within ``max_tokens``."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text[: max(0, max_tokens * 4 - len(_CLIP_MARKER))].split()
+    while words and estimate_tokens(" ".join(words) + _CLIP_MARKER) > max_tokens:
+        words.pop()
+    return " ".join(words) + _CLIP_MARKER if words else ""
+
+
+@dataclass
+class ContextBudget:
+    total: int
+    system: int
+    memories: int
+    messages: int
+    memory_tokens: int = 0
+    message_tokens: int = 0
+    memories_kept: int = 0
+    memories_dropped: int = 0
+    messages_kept: int = 0
+    messages_dropped: int = 0
+    clipped: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _fit(lines: list[str], budget: int, stats: ContextBudget) -> tuple[list[str], int]:
+    """Longest prefix of ``lines`` (most valuable first) that fits ``budget`` tokens."""
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + LINE_OVERHEAD_TOKENS
+        if used + cost > budget:
+            if not kept:
+                clipped = _clip(line, budget - used - LINE_OVERHEAD_TOKENS)
+                if clipped:
+                    kept.append(clipped)
+                    used += estimate_tokens(clipped) + LINE_OVERHEAD_TOKENS
+                    stats.clipped += 1
+            break
+        kept.append(line)
+        used += cost
+    return kept, used
+
+
+def fit_context(
+    memory_lines: list[str],
+    message_lines: list[str],
+    *,
+    reserved_tokens: int,
+    total_tokens: int = CONTEXT_TOKEN_BUDGET,
+    message_share: float = CONTEXT_MESSAGE_SHARE,
+) -> tuple[list[str], ContextBudget]:
+    """
+    Choose context lines under the budget.
+
+    ``memory_lines`` are ordered most valuable first; ``message_lines`` oldest first.
+    Returns the kept lines (memories, then messages oldest first) and the budget used.
+    """
+    available = max(total_tokens - reserved_tokens, 0)
+    memory_need = sum(estimate_tokens(line) + LINE_OVERHEAD_TOKENS for line in memory_lines)
+    message_need = sum(estimate_tokens(line) + LINE_OVERHEAD_TOKENS for line in message_lines)
+    message_budget = min(message_need, max(int(available * message_share), available - memory_need))
+    budget = ContextBudget(
+        total=total_tokens,
+        system=reserved_tokens,
+        memories=available - message_budget,
+        messages=message_budget,
+    )
+
+    newest_first, budget.message_tokens = _fit(list(reversed(message_lines)), budget.messages, budget)
+    memories, budget.memory_tokens = _fit(memory_lines, budget.memories, budget)
+    budget.messages_kept = len(newest_first)
+    budget.messages_dropped = len(message_lines) - len(newest_first)
+    budget.memories_kept = len(memories)
+    budget.memories_dropped = len(memory_lines) - len(memories)
+    return memories + list(reversed(newest_first)), budget
+
+
+def reserved_prompt_tokens(system_prompt: str, user_message: str | None) -> int:
+    """Tokens the rest of the prompt needs besides the context block."""
+    return estimate_tokens(system_prompt) + estimate_tokens(user_message or "") + PROMPT_OVERHEAD_TOKENS
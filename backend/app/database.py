@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 import os
 from dotenv import load_dotenv
 
@@ -54,6 +55,71 @@ def get_db():
         db.close()
 
 
+# Session.info keys used by the turn-scoped unit of work.
+_DEFER_COMMIT_KEY = "defer_commit"
+_DEFERRED_WRITES_KEY = "deferred_writes"
+
+
+def in_unit_of_work(db) -> bool:
+    return bool(db.info.get(_DEFER_COMMIT_KEY))
+
+
+def commit_or_defer(db, *refresh):
+    """
+    Commit the session, or, inside a turn unit of work, leave the rows pending for the
+    single end-of-turn commit. Objects in ``refresh`` are refreshed afterwards; when the
+    commit is deferred they are flushed first so server defaults are populated.
+    """
+    if in_unit_of_work(db):
+        if refresh:
+            db.flush()
+    else:
+        db.commit()
+    for obj in refresh:
+        db.refresh(obj)
+
+
+def run_or_defer(db, write):
+    """Run ``write()`` now, or queue it to run just before the end-of-turn commit."""
+    if in_unit_of_work(db):
+        db.info.setdefault(_DEFERRED_WRITES_KEY, []).append(write)
+    else:
+        write()
+
+
+@contextmanager
+def turn_unit_of_work(db, enabled: bool = True):
+    """
+    Collect every row written while the block runs and commit them in one transaction
+    at the end, instead of one commit (one fsync and writer-lock acquisition on SQLite)
+    per helper call. Nothing is sent to the database until the end, so no write lock is
+    held across the LLM calls in between.
+
+    Rows written before an exception are still committed, matching eager behavior.
+    ``enabled=False`` keeps the eager per-call commits (debugging).
+    """
+    if not enabled or in_unit_of_work(db):
+        yield db
+        return
+    db.info[_DEFER_COMMIT_KEY] = True
+    completed = False
+    try:
+        yield db
+        completed = True
+    finally:
+        db.info.pop(_DEFER_COMMIT_KEY, None)
+        deferred_writes = db.info.pop(_DEFERRED_WRITES_KEY, [])
+        try:
+            for write in deferred_writes:
+                write()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if completed:
+                raise
+            print(f"[DB] unit of work commit failed after turn error: {e}")
+
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
@@ -64,9 +130,80 @@ def init_db():
             mem_cols = [r[1] for r in mem_rows]
             if "phase" not in mem_cols:
                 conn.execute(text("ALTER TABLE memories ADD COLUMN phase INTEGER"))
+            if "user_edited" not in mem_cols:
+                conn.execute(text("ALTER TABLE memories ADD COLUMN user_edited BOOLEAN NOT NULL DEFAULT 0"))
+            if "norm_hash" not in mem_cols:
+                conn.execute(text("ALTER TABLE memories ADD COLUMN norm_hash VARCHAR(64)"))
+                from .memory_manager import memory_text_hash
+
+                rows = conn.execute(text("SELECT memory_id, text FROM memories")).fetchall()
+                if rows:
+                    conn.execute(
+                        text("UPDATE memories SET norm_hash = :norm_hash WHERE memory_id = :memory_id"),
+                        [{"memory_id": r[0], "norm_hash": memory_text_hash(r[1] or "")} for r in rows],
+                    )
+
+            user_cols = [r[1] for r in conn.execute(text("PRAGMA table_info(users)")).fetchall()]
+            if "memory_version" not in user_cols:
+                conn.execute(text("ALTER TABLE users ADD COLUMN memory_version INTEGER NOT NULL DEFAULT 0"))
+            if "memory_consolidated_version" not in user_cols:
+                conn.execute(text(
+                    "ALTER TABLE users ADD COLUMN memory_consolidated_version INTEGER NOT NULL DEFAULT 0"
+                ))
 
             sess_rows = conn.execute(text("PRAGMA table_info(sessions)")).fetchall()
             sess_cols = [r[1] for r in sess_rows]
             if "condition_id" not in sess_cols:
                 conn.execute(text("ALTER TABLE sessions ADD COLUMN condition_id VARCHAR(50)"))
+            if "memories_cleared_at" not in sess_cols:
+                conn.execute(text("ALTER TABLE sessions ADD COLUMN memories_cleared_at DATETIME"))
+                # Sessions ended before the sweeper existed were cleaned inline or kept on
+                # purpose (Qualtrics re-auth); they are not pending.
+                conn.execute(text(
+                    "UPDATE sessions SET memories_cleared_at = ended_at WHERE ended_at IS NOT NULL"
+                ))
+
+            progress_rows = conn.execute(text("PRAGMA table_info(session_progress)")).fetchall()
+            progress_cols = [r[1] for r in progress_rows]
+            if "version" not in progress_cols:
+                conn.execute(text("ALTER TABLE session_progress ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+            event_rows = conn.execute(text("PRAGMA table_info(events)")).fetchall()
+            event_cols = [r[1] for r in event_rows]
+            if "session_id" not in event_cols:
+                conn.execute(text("ALTER TABLE events ADD COLUMN session_id CHAR(32)"))
+                # Backfill from the JSON payload; UUIDs are stored as 32-char hex on SQLite.
+                conn.execute(text(
+                    "UPDATE events SET session_id = "
+                    "lower(replace(json_extract(payload_json, '$.session_id'), '-', '')) "
+                    "WHERE json_valid(payload_json) "
+                    "AND json_extract(payload_json, '$.session_id') IS NOT NULL"
+                ))
+
+            # Monotonic ordering key (see models.next_sequence). Legacy rows are numbered by
+            # created_at, user before assistant within the same second, so they sort first.
+            for table, tiebreak in (
+                ("messages", "CASE role WHEN 'user' THEN 0 ELSE 1 END, rowid"),
+                ("events", "rowid"),
+            ):
+                cols = [r[1] for r in conn.execute(text(f"PRAGMA table_info({table})")).fetchall()]
+                if "seq" in cols:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN seq BIGINT"))
+                conn.execute(text(
+                    f"UPDATE {table} SET seq = ranked.seq FROM ("
+                    f"SELECT rowid AS rid, CAST(strftime('%s', created_at) AS INTEGER) * 1000000000 "
+                    f"+ ROW_NUMBER() OVER (PARTITION BY created_at ORDER BY {tiebreak}) AS seq "
+                    f"FROM {table}) AS ranked WHERE {table}.rowid = ranked.rid"
+                ))
+            archive_cols = [r[1] for r in conn.execute(text("PRAGMA table_info(events_archive)")).fetchall()]
+            if "seq" not in archive_cols:
+                conn.execute(text("ALTER TABLE events_archive ADD COLUMN seq BIGINT"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_events_user_type_session_created"))
+
+            # create_all only builds indexes for new tables; add any declared index missing
+            # from an existing one.
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
 
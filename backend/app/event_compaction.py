@@ -0,0 +1,128 @@
+"""
+Compaction of superseded ``progress_update`` events.
+
+Every guided turn appends a full progress payload, but only the latest one per session
+is ever read (and that one is materialized in ``session_progress``). Compaction keeps
+the latest event per session plus ``keep_history`` older ones and moves the rest out of
+``events``: into the ``events_archive`` table, or into a gzip-compressed JSONL file.
+
+Work is split into batches of ``batch_size`` events, each moved in its own short
+transaction, so the job can run against a live database without holding long locks.
+Events with a NULL ``session_id`` (not yet backfilled) are left alone.
+"""
+import gzip
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import delete, insert
+
+from .models import Event, EventArchive
+
+PROGRESS_EVENT = "progress_update"
+
+
+@dataclass
+class CompactionResult:
+    sessions_scanned: int = 0
+    events_archived: int = 0
+    batches: int = 0
+
+
+def _superseded_event_ids(db, user_id, session_id, keep: int) -> list:
+    rows = (
+        db.query(Event.event_id)
+        .filter(
+            Event.user_id == user_id,
+            Event.type == PROGRESS_EVENT,
+            Event.session_id == session_id,
+        )
+        .order_by(Event.seq.desc())
+        .offset(keep)
+        .all()
+    )
+    return [r[0] for r in rows]
+
+
+def _move_batch(db, event_ids: list, archive_file=None, dry_run: bool = False) -> int:
+    if dry_run:
+        return len(event_ids)
+    rows = db.query(Event).filter(Event.event_id.in_(event_ids)).all()
+    if archive_file is not None:
+        for row in rows:
+            archive_file.write(json.dumps({
+                "event_id": str(row.event_id),
+                "user_id": str(row.user_id) if row.user_id else None,
+                "type": row.type,
+                "session_id": str(row.session_id) if row.session_id else None,
+                "payload_json": row.payload_json,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "seq": row.seq,
+            }) + "\n")
+        archive_file.flush()
+    else:
+        db.execute(insert(EventArchive), [
+            {
+                "event_id": row.event_id,
+                "user_id": row.user_id,
+                "type": row.type,
+                "session_id": row.session_id,
+                "payload_json": row.payload_json,
+                "created_at": row.created_at,
+                "seq": row.seq,
+            }
+            for row in rows
+        ])
+    db.execute(delete(Event).where(Event.event_id.in_([row.event_id for row in rows])))
+    db.commit()
+    return len(rows)
+
+
+def compact_progress_events(
+    session_factory,
+    *,
+    keep_history: int = 5,
+    batch_size: int = 500,
+    archive_path: Optional[str] = None,
+    dry_run: bool = False,
+) -> CompactionResult:
+    """
+    Move superseded progress events out of ``events``.
+
+    Keeps the newest event per session plus ``keep_history`` older ones. Archived rows go
+    to ``events_archive`` unless ``archive_path`` is given, in which case they are appended
+    to that gzip JSONL file. ``dry_run`` only counts what would be moved.
+    """
+    keep = 1 + max(0, keep_history)
+    result = CompactionResult()
+    archive_file = gzip.open(archive_path, "at", encoding="utf-8") if archive_path and not dry_run else None
+    db = session_factory()
+    try:
+        sessions = (
+            db.query(Event.user_id, Event.session_id)
+            .filter(Event.type == PROGRESS_EVENT, Event.session_id.isnot(None))
+            .distinct()
+            .all()
+        )
+        db.rollback()  # release the read snapshot between batches
+        pending: list = []
+        for user_id, session_id in sessions:
+            result.sessions_scanned += 1
+            pending.extend(_superseded_event_ids(db, user_id, session_id, keep))
+            while len(pending) >= batch_size:
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                result.events_archived += _move_batch(db, batch, archive_file, dry_run)
+                result.batches += 1
+        if pending:
+            result.events_archived += _move_batch(db, pending, archive_file, dry_run)
+            result.batches += 1
+        if dry_run:
+            db.rollback()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        if archive_file is not None:
+            archive_file.close()
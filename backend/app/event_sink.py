@@ -0,0 +1,175 @@
+"""
+Buffered writer for research-instrumentation events.
+
+With EVENT_SINK_MODE=buffered, ``logging.log_event`` hands most events to a bounded
+in-memory queue instead of inserting and committing on the request path. A background
+thread drains the queue and writes batched multi-row INSERTs every EVENT_SINK_FLUSH_MS
+milliseconds or EVENT_SINK_BATCH_SIZE events, whichever comes first. Pending events are
+flushed on shutdown.
+
+Event types that request handlers read back (see DURABLE_EVENT_TYPES) are never
+buffered, so progress is durable before the response returns. When the queue is full
+the event is dropped and counted rather than blocking the request.
+
+EVENT_SINK_MODE=sync (default) keeps every event on the synchronous path.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import insert
+
+from .database import SessionLocal
+from .models import Event, next_sequence
+
+EVENT_SINK_MODE = os.getenv("EVENT_SINK_MODE", "sync").strip().lower()
+EVENT_SINK_MAX_QUEUE = int(os.getenv("EVENT_SINK_MAX_QUEUE", "10000"))
+EVENT_SINK_FLUSH_MS = int(os.getenv("EVENT_SINK_FLUSH_MS", "250"))
+EVENT_SINK_BATCH_SIZE = int(os.getenv("EVENT_SINK_BATCH_SIZE", "200"))
+
+# Read back by request handlers (progress state, Qualtrics phase tagging); always synchronous.
+DURABLE_EVENT_TYPES = frozenset({"progress_update", "qualtrics_phase_session"})
+
+
+class BufferedEventSink:
+    def __init__(
+        self,
+        max_queue: int = EVENT_SINK_MAX_QUEUE,
+        flush_ms: int = EVENT_SINK_FLUSH_MS,
+        batch_size: int = EVENT_SINK_BATCH_SIZE,
+        session_factory=SessionLocal,
+    ):
+        self.flush_interval = max(flush_ms, 1) / 1000.0
+        self.batch_size = max(batch_size, 1)
+        self._session_factory = session_factory
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max(max_queue, 1))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer thread after flushing everything still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self._flush(self._drain(limit=None))
+
+    def enqueue(
+        self,
+        event_type: str,
+        user_id: Optional[UUID],
+        session_id: Optional[UUID],
+        payload: Optional[dict],
+    ) -> bool:
+        row = {
+            "event_id": uuid.uuid4(),
+            "user_id": user_id,
+            "type": event_type,
+            "session_id": session_id,
+            "payload_json": payload,
+            # Stamp at enqueue time so ordering reflects when the event happened.
+            "created_at": datetime.now(timezone.utc),
+            "seq": next_sequence(),
+        }
+        self.start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def _drain(self, limit: Optional[int]) -> list[dict]:
+        rows: list[dict] = []
+        while limit is None or len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch: list[dict] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, rows: list[dict]):
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            db = self._session_factory()
+            try:
+                db.execute(insert(Event), chunk)
+                db.commit()
+                with self._stats_lock:
+                    self.written += len(chunk)
+                    self.batches += 1
+            except Exception as e:
+                db.rollback()
+                with self._stats_lock:
+                    self.failed += len(chunk)
+                print(f"[EventSink] batch write failed ({len(chunk)} events): {e}")
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "mode": "buffered",
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+
+event_sink = BufferedEventSink() if EVENT_SINK_MODE == "buffered" else None
+
+
+def should_buffer(event_type: str) -> bool:
+    return event_sink is not None and event_type not in DURABLE_EVENT_TYPES
+
+
+def stats() -> dict:
+    if event_sink is None:
+        return {"mode": "sync"}
+    return event_sink.stats()
+
+
+def shutdown():
+    if event_sink is not None:
+        event_sink.stop()
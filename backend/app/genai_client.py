@@ -5,22 +5,68 @@ Uses sync httpx in a thread pool because httpx.AsyncClient has a known
 DNS/SSL incompatibility with the anyio backend on this server (async
 times out while sync completes in ~2 s).
 
+GENAI_TRANSPORT=async opts into a native httpx.AsyncClient path that sidesteps it:
+the GenAI host is resolved once and cached, connections go to the address directly,
+and TLS is verified against the hostname (SNI) with an SSL context built up front.
+start_transport() self-tests that path at startup and only switches to it if a
+request completes; otherwise (and by default) calls stay on threads. In-flight async
+calls hold a socket on the event loop instead of a thread each.
+
 Model: fixed to llama4:latest for this study (see get_genai_model). Not configurable via env.
 
 Keys: set GENAI_API_KEYS=key1,key2,... or comma-separated GENAI_API_KEY.
-      Keys are chosen round-robin per API call to spread rate limits.
+      Each call leases a key slot from the KeyScheduler: the least-loaded slot by
+      in-flight calls and EWMA latency, skipping slots cooling down after a 429
+      (Retry-After, else GENAI_KEY_COOLDOWN_SEC, doubling while 429s continue) and
+      deprioritizing slots with recent errors. key_stats() reports per-slot health
+      by slot number only (/metrics).
+
+Connections: one process-wide httpx.Client with keep-alive is shared by every call
+(httpx clients are thread-safe), so a guided turn's assessment, reply and extraction
+calls reuse one TLS connection instead of each paying DNS + TCP + TLS setup. Pool size
+comes from GENAI_POOL_MAX_CONNECTIONS / GENAI_POOL_MAX_KEEPALIVE /
+GENAI_POOL_KEEPALIVE_EXPIRY. The client is created on first use, rebuilt after a
+connect failure, and closed on shutdown; pool_stats() reports connection
+reuse and connect time (/metrics).
+
+Threads: blocking upstream I/O runs on a dedicated executor of GENAI_EXECUTOR_WORKERS
+threads, not the default executor or Starlette's handler threadpool, so a burst of
+slow completions cannot starve the sync endpoints (or be starved by them).
+executor_stats() reports its queue depth and how long calls waited for a thread.
 """
 import asyncio
 import os
 import re
+import socket
+import ssl
 import threading
 import time
 import httpx
 import json
+import certifi
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
 from typing import Any, AsyncIterator, Optional
 
 
 GENAI_API_URL = "https://genai.rcac.purdue.edu/api/chat/completions"
+GENAI_TIMEOUT_SEC = 120.0
+GENAI_POOL_MAX_CONNECTIONS = int(os.getenv("GENAI_POOL_MAX_CONNECTIONS", "20"))
+GENAI_POOL_MAX_KEEPALIVE = int(os.getenv("GENAI_POOL_MAX_KEEPALIVE", "10"))
+GENAI_POOL_KEEPALIVE_EXPIRY = float(os.getenv("GENAI_POOL_KEEPALIVE_EXPIRY", "60"))
+# Threads for blocking GenAI I/O (each in-flight completion or stream holds one).
+GENAI_EXECUTOR_WORKERS = int(os.getenv("GENAI_EXECUTOR_WORKERS", "32"))
+# "thread" (default) or "async" (native AsyncClient, used only if the startup self-test passes).
+GENAI_TRANSPORT = os.getenv("GENAI_TRANSPORT", "thread").strip().lower()
+# Connection cap for the async transport (one per in-flight call; no thread each).
+GENAI_ASYNC_MAX_CONNECTIONS = int(os.getenv("GENAI_ASYNC_MAX_CONNECTIONS", "1000"))
+GENAI_DNS_TTL_SEC = float(os.getenv("GENAI_DNS_TTL_SEC", "300"))
+GENAI_SELF_TEST_TIMEOUT_SEC = float(os.getenv("GENAI_SELF_TEST_TIMEOUT_SEC", "10"))
+# Base cooldown for a key slot after a 429 without Retry-After (doubles per consecutive 429).
+GENAI_KEY_COOLDOWN_SEC = float(os.getenv("GENAI_KEY_COOLDOWN_SEC", "30"))
+# Deltas the streaming thread may read ahead of the SSE consumer.
+GENAI_STREAM_QUEUE_SIZE = int(os.getenv("GENAI_STREAM_QUEUE_SIZE", "64"))
 
 
 def _extract_assistant_content(message: Any) -> str:
@@ -103,12 +149,63 @@ def sanitize_companion_public_output(text: str) -> str:
     return t
 
 
+# Any marker sanitize_companion_public_output cuts at; text after the last one is the reply.
+_PUBLIC_OUTPUT_MARKER = re.compile(
+    r"(?is)let's produce\s*:|final response:|final answer:|assistant response:"
+)
+# Trailing characters held back while streaming, so a marker split across chunks is
+# seen before any of it reaches the client.
+_MARKER_LOOKBEHIND = 24
+
+
+class StreamSanitizer:
+    """
+    Incremental sanitize_companion_public_output for streamed replies.
+
+    ``feed`` returns the events to send for each upstream chunk: ("token", text) to
+    append, or ("reset", "") when a marker shows the text sent so far was planning and
+    the client should discard it. The last _MARKER_LOOKBEHIND characters (and trailing
+    whitespace) are held back until more text arrives. ``finish`` reconciles with the
+    full-text sanitizer, so the client ends with exactly ``text``.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.text = ""
+        self._start = 0  # where the visible reply begins in raw
+        self._scan_from = 0
+        self._sent = ""
+
+    def _catch_up(self, visible: str) -> list[tuple[str, str]]:
+        if visible.startswith(self._sent):
+            piece = visible[len(self._sent):]
+            self._sent = visible
+            return [("token", piece)] if piece else []
+        self._sent = visible
+        return [("reset", "")] + ([("token", visible)] if visible else [])
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        self.raw += chunk
+        last = None
+        for last in _PUBLIC_OUTPUT_MARKER.finditer(self.raw, self._scan_from):
+            pass
+        if last is not None:
+            self._start = last.end()
+        self._scan_from = max(self._start, len(self.raw) - _MARKER_LOOKBEHIND)
+        safe_end = len(self.raw) - _MARKER_LOOKBEHIND
+        if safe_end <= self._start:
+            return []
+        return self._catch_up(self.raw[self._start:safe_end].strip())
+
+    def finish(self) -> list[tuple[str, str]]:
+        self.text = sanitize_companion_public_output(self.raw)
+        return self._catch_up(self.text)
+
+
 # Single study model — all chat completions use this id with Purdue GenAI.
 STUDY_GENAI_MODEL = "llama4:latest"
 
 _keys_cache: list[str] | None = None
-_key_lock = threading.Lock()
-_key_rr = 0
 
 
 def get_genai_model() -> str:
@@ -139,16 +236,9 @@ def _load_api_keys() -> list[str]:
 
 
 def next_api_key() -> tuple[str, int]:
-    """Round-robin (api_key, key_slot). key_slot is 0..n-1 for logs (no secrets)."""
-    keys = _load_api_keys()
-    if len(keys) == 1:
-        return keys[0], 0
-    global _key_rr
-    with _key_lock:
-        slot = _key_rr % len(keys)
-        k = keys[slot]
-        _key_rr += 1
-        return k, slot
+    """(api_key, key_slot) the scheduler would pick now. key_slot is 0..n-1 for logs (no secrets)."""
+    slot = _key_scheduler.pick()
+    return _load_api_keys()[slot], slot
 
 
 def get_api_key() -> str:
@@ -161,18 +251,538 @@ def configured_key_count() -> int:
     return len(_load_api_keys())
 
 
+class _KeySlot:
+    """Health counters for one API key (never holds the key itself)."""
+
+    WINDOW = 20  # recent outcomes kept for the error / 429 rate
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.ewma_ms: float | None = None
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+        self.recent: deque[bool] = deque(maxlen=self.WINDOW)  # True = error or 429
+
+    def error_rate(self) -> float:
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+
+class _KeyLease:
+    """One call's hold on a key slot. record() the response, then finish() once."""
+
+    def __init__(self, scheduler: "KeyScheduler", slot: int, key: str):
+        self.scheduler = scheduler
+        self.slot = slot
+        self.key = key
+        self.started = time.perf_counter()
+        self.status: int | None = None
+        self.retry_after: str | None = None
+        self.abandoned = False
+        self._finished = False
+
+    def record(self, resp: httpx.Response):
+        self.status = resp.status_code
+        self.retry_after = resp.headers.get("retry-after")
+
+    def finish(self):
+        if not self._finished:
+            self._finished = True
+            self.scheduler._finish(self)
+
+
+class KeyScheduler:
+    """
+    Picks a key slot per call from in-flight count, EWMA latency and recent outcomes.
+
+    Slots cooling down after a 429 are skipped (if every slot is, the one whose
+    cooldown ends first is used). The rest are scored by (in_flight + 1) * relative
+    latency, inflated by the recent error rate; ties rotate, starting from a pid-based offset
+    so the uvicorn workers do not all begin on the same key. State is per process:
+    each worker learns a key's 429s from its own responses.
+    """
+
+    EWMA_ALPHA = 0.2
+    MAX_COOLDOWN_FACTOR = 8
+
+    def __init__(self, cooldown_sec: float = GENAI_KEY_COOLDOWN_SEC):
+        self.cooldown_sec = cooldown_sec
+        self._lock = threading.Lock()
+        self._slots: list[_KeySlot] = []
+        self._rr = os.getpid()
+
+    def _ensure_slots(self) -> int:
+        n = len(_load_api_keys())
+        if len(self._slots) != n:
+            self._slots = [_KeySlot() for _ in range(n)]
+        return n
+
+    def pick(self) -> int:
+        with self._lock:
+            return self._pick()
+
+    def _pick(self) -> int:
+        n = self._ensure_slots()
+        if n == 1:
+            return 0
+        now = time.monotonic()
+        ready = [i for i, slot in enumerate(self._slots) if slot.cooldown_until <= now]
+        if not ready:
+            return min(range(n), key=lambda i: self._slots[i].cooldown_until)
+        known = [self._slots[i].ewma_ms for i in ready if self._slots[i].ewma_ms is not None]
+        baseline = max(sum(known) / len(known), 1e-3) if known else 1.0
+        self._rr += 1
+
+        def score(i: int):
+            slot = self._slots[i]
+            # Latency relative to the mean, to one decimal: keys within ~10% tie and rotate.
+            latency = round(slot.ewma_ms / baseline, 1) if slot.ewma_ms is not None else 1.0
+            load = (slot.in_flight + 1) * latency * (1 + 4 * slot.error_rate())
+            return (round(load, 1), (i - self._rr) % n)
+
+        return min(ready, key=score)
+
+    def acquire(self) -> _KeyLease:
+        keys = _load_api_keys()
+        with self._lock:
+            slot = self._pick()
+            self._slots[slot].in_flight += 1
+        return _KeyLease(self, slot, keys[slot])
+
+    def _finish(self, lease: _KeyLease):
+        elapsed_ms = (time.perf_counter() - lease.started) * 1000
+        with self._lock:
+            if lease.slot >= len(self._slots):
+                return
+            slot = self._slots[lease.slot]
+            slot.in_flight = max(slot.in_flight - 1, 0)
+            if lease.abandoned and lease.status is None:
+                return  # caller gave up before a response: no outcome to learn from
+            slot.requests += 1
+            if lease.status == 429:
+                slot.rate_limited += 1
+                slot.consecutive_429 += 1
+                factor = min(2 ** (slot.consecutive_429 - 1), self.MAX_COOLDOWN_FACTOR)
+                slot.cooldown_until = time.monotonic() + (
+                    _retry_after_sec(lease.retry_after) or self.cooldown_sec * factor
+                )
+                slot.recent.append(True)
+                return
+            slot.consecutive_429 = 0
+            failed = lease.status is None or lease.status >= 400
+            slot.errors += failed
+            slot.recent.append(failed)
+            if not failed:
+                slot.ewma_ms = elapsed_ms if slot.ewma_ms is None else (
+                    self.EWMA_ALPHA * elapsed_ms + (1 - self.EWMA_ALPHA) * slot.ewma_ms
+                )
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "slot": i,
+                    "in_flight": slot.in_flight,
+                    "requests": slot.requests,
+                    "errors": slot.errors,
+                    "rate_limited": slot.rate_limited,
+                    "recent_error_rate": round(slot.error_rate(), 2),
+                    "ewma_ms": round(slot.ewma_ms, 1) if slot.ewma_ms is not None else None,
+                    "cooldown_sec": round(max(slot.cooldown_until - now, 0.0), 1),
+                }
+                for i, slot in enumerate(self._slots)
+            ]
+
+
+def _retry_after_sec(value: str | None) -> float | None:
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    try:
+        return max(float(value), 0.0) if value else None
+    except ValueError:
+        return None
+
+
+_key_scheduler = KeyScheduler()
+
+
+def key_stats() -> list[dict]:
+    return _key_scheduler.stats()
+
+
+class _PoolStats:
+    """Connection reuse and connect-time counters for the pooled client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.connect_ms_total = 0.0
+        self.connect_ms_max = 0.0
+        self.transport_errors = 0
+        self.clients_created = 0
+
+    def tracer(self):
+        """httpx ``trace`` extension for one request; records a new connection's setup time."""
+        started: dict[str, float] = {}
+
+        def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.started":
+                started["t"] = time.perf_counter()
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                if "t" in started:
+                    started["ms"] = (time.perf_counter() - started["t"]) * 1000
+
+        return trace, started
+
+    def atracer(self):
+        """tracer() for httpx.AsyncClient, which requires an async trace callback."""
+        trace, started = self.tracer()
+
+        async def atrace(event_name: str, info: dict):
+            trace(event_name, info)
+
+        return atrace, started
+
+    def record(self, started: dict):
+        with self._lock:
+            self.requests += 1
+            if "t" in started:
+                connect_ms = started.get("ms", 0.0)
+                self.new_connections += 1
+                self.connect_ms_total += connect_ms
+                self.connect_ms_max = max(self.connect_ms_max, connect_ms)
+
+    def record_error(self):
+        with self._lock:
+            self.transport_errors += 1
+
+    def record_client(self):
+        with self._lock:
+            self.clients_created += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            reused = self.requests - self.new_connections
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reuse_rate": round(reused / self.requests, 3) if self.requests else None,
+                "connect_ms_avg": (
+                    round(self.connect_ms_total / self.new_connections, 1) if self.new_connections else None
+                ),
+                "connect_ms_max": round(self.connect_ms_max, 1),
+                "transport_errors": self.transport_errors,
+                "clients_created": self.clients_created,
+            }
+
+
+_pool_stats = _PoolStats()
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    """The shared keep-alive client, created on first use (or after a reset)."""
+    global _client
+    client = _client
+    if client is not None and not client.is_closed:
+        return client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                timeout=GENAI_TIMEOUT_SEC,
+                limits=httpx.Limits(
+                    max_connections=GENAI_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=GENAI_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=GENAI_POOL_KEEPALIVE_EXPIRY,
+                ),
+            )
+            _pool_stats.record_client()
+        return _client
+
+
+def _transport_failed(client: httpx.Client, error: httpx.TransportError):
+    """
+    Count a transport error; after a connect failure, swap in a fresh client so the
+    next call re-resolves and reconnects. The old client is not closed here, since other
+    threads may still be reading responses from it; it is released once they finish.
+    """
+    global _client
+    _pool_stats.record_error()
+    if isinstance(error, httpx.ConnectError):
+        with _client_lock:
+            if _client is client:
+                _client = None
+
+
+class _AsyncTransport:
+    """
+    Native httpx.AsyncClient path with the DNS/TLS workaround.
+
+    The host is resolved with loop.getaddrinfo (cached for GENAI_DNS_TTL_SEC and dropped
+    after a connect failure), the request goes to that address with the original Host
+    header, and TLS uses the ``sni_hostname`` extension so the certificate is checked
+    against the real hostname. ``active`` is set only by a successful self_test().
+    """
+
+    def __init__(self):
+        self.active = False
+        self.self_test_result: dict | None = None
+        self._ssl: ssl.SSLContext | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._host: str | None = None
+        self._addresses: list[str] = []
+        self._resolved_at = 0.0
+        self.resolves = 0
+
+    def ssl_context(self) -> ssl.SSLContext:
+        if self._ssl is None:
+            self._ssl = ssl.create_default_context(cafile=certifi.where())
+        return self._ssl
+
+    def client(self) -> httpx.AsyncClient:
+        """The shared AsyncClient for the running loop (its connections belong to that loop)."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=GENAI_TIMEOUT_SEC,
+                verify=self.ssl_context(),
+                limits=httpx.Limits(
+                    max_connections=GENAI_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=GENAI_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=GENAI_POOL_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._loop = loop
+            _pool_stats.record_client()
+        return self._client
+
+    async def _address(self, url: httpx.URL) -> str:
+        if (
+            self._host != url.host
+            or not self._addresses
+            or time.monotonic() - self._resolved_at > GENAI_DNS_TTL_SEC
+        ):
+            port = url.port or (443 if url.scheme == "https" else 80)
+            infos = await asyncio.get_running_loop().getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+            infos.sort(key=lambda info: info[0] != socket.AF_INET)  # IPv4 first
+            self._addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            self._host, self._resolved_at = url.host, time.monotonic()
+            self.resolves += 1
+        return self._addresses[0]
+
+    async def prepare(self, url: str, headers: dict) -> tuple[httpx.URL, dict, dict]:
+        """(url, headers, extensions) addressing the cached IP while keeping Host and SNI."""
+        target = httpx.URL(url)
+        address = await self._address(target)
+        headers = {**headers, "Host": target.netloc.decode("ascii")}
+        extensions = {"sni_hostname": target.host} if target.scheme == "https" else {}
+        return target.copy_with(host=address), headers, extensions
+
+    def transport_failed(self, error: httpx.TransportError):
+        _pool_stats.record_error()
+        if isinstance(error, httpx.ConnectError):
+            self._addresses = []
+
+    async def self_test(self) -> bool:
+        """
+        One GET to the API URL through this path. Any HTTP status counts: it shows DNS,
+        TCP, TLS and HTTP all complete on the event loop, which is what failed before.
+        """
+        t0 = time.perf_counter()
+        try:
+            url, headers, extensions = await self.prepare(GENAI_API_URL, {})
+            resp = await asyncio.wait_for(
+                self.client().get(url, headers=headers, extensions=extensions),
+                GENAI_SELF_TEST_TIMEOUT_SEC,
+            )
+            self.self_test_result = {"ok": True, "status": resp.status_code}
+        except Exception as e:
+            self._addresses = []
+            self.self_test_result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.self_test_result["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        self.active = self.self_test_result["ok"]
+        return self.active
+
+    async def aclose(self):
+        self.active = False
+        client, self._client = self._client, None
+        if client is not None and self._loop is asyncio.get_running_loop():
+            await client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "configured": GENAI_TRANSPORT,
+            "in_use": "async" if self.active else "thread",
+            "self_test": self.self_test_result,
+            "host": self._host,
+            "addresses": len(self._addresses),
+            "resolves": self.resolves,
+        }
+
+
+_async_transport = _AsyncTransport()
+
+
+async def start_transport() -> str:
+    """Self-test the async transport when GENAI_TRANSPORT=async; returns the transport in use."""
+    if GENAI_TRANSPORT == "async":
+        if await _async_transport.self_test():
+            print(f"[GenAI] transport=async (self-test {_async_transport.self_test_result})")
+        else:
+            print(f"[GenAI] async transport self-test failed, using threads: {_async_transport.self_test_result}")
+    return "async" if _async_transport.active else "thread"
+
+
+def transport_stats() -> dict:
+    return _async_transport.stats()
+
+
+async def aclose():
+    """Close the async transport, then the threaded client and executor (app shutdown)."""
+    await _async_transport.aclose()
+    close()
+
+
+def close():
+    """Close the shared client and the GenAI executor (app shutdown)."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+    _executor.shutdown()
+
+
+def pool_stats() -> dict:
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "max_connections": GENAI_POOL_MAX_CONNECTIONS,
+        "max_keepalive": GENAI_POOL_MAX_KEEPALIVE,
+        **_pool_stats.stats(),
+    }
+
+
+class _GenAIExecutor:
+    """Bounded thread pool for upstream LLM calls, with queue-depth and wait-time counters."""
+
+    def __init__(self, max_workers: int = GENAI_EXECUTOR_WORKERS):
+        self.max_workers = max(max_workers, 1)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.dropped = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _get(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="genai")
+            return self._executor
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` on a GenAI thread and await its result."""
+        submitted_at = time.perf_counter()
+        state = {"started": False, "dropped": False}
+
+        def timed():
+            wait_ms = (time.perf_counter() - submitted_at) * 1000
+            with self._lock:
+                if state["dropped"]:
+                    return None
+                state["started"] = True
+                self.started += 1
+                self.wait_ms_total += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.completed += 1
+
+        executor = self._get()
+        with self._lock:
+            self.submitted += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, timed)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not state["started"]:
+                    # Caller gave up while queued; the call never runs.
+                    state["dropped"] = True
+                    self.dropped += 1
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self.started - self.completed,
+                "queue_depth": self.submitted - self.started - self.dropped,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "wait_ms_avg": round(self.wait_ms_total / self.started, 1) if self.started else None,
+                "wait_ms_max": round(self.wait_ms_max, 1),
+            }
+
+
+_executor = _GenAIExecutor()
+
+
+def executor_stats() -> dict:
+    return _executor.stats()
+
+
 def _sync_call(headers: dict, body: dict, key_slot: int = -1) -> httpx.Response:
     t0 = time.time()
-    with httpx.Client(timeout=120.0) as client:
-        resp = client.post(GENAI_API_URL, headers=headers, json=body)
-    elapsed = time.time() - t0
+    client = _get_client()
+    trace, started = _pool_stats.tracer()
+    try:
+        resp = client.post(GENAI_API_URL, headers=headers, json=body, extensions={"trace": trace})
+    except httpx.TransportError as e:
+        _transport_failed(client, e)
+        raise
+    _pool_stats.record(started)
+    _log_call(time.time() - t0, resp, body, key_slot)
+    return resp
+
+
+async def _async_call(headers: dict, body: dict, key_slot: int = -1) -> httpx.Response:
+    t0 = time.time()
+    client = _async_transport.client()
+    trace, started = _pool_stats.atracer()
+    url, headers, extensions = await _async_transport.prepare(GENAI_API_URL, headers)
+    try:
+        resp = await client.post(url, headers=headers, json=body, extensions={"trace": trace, **extensions})
+    except httpx.TransportError as e:
+        _async_transport.transport_failed(e)
+        raise
+    _pool_stats.record(started)
+    _log_call(time.time() - t0, resp, body, key_slot)
+    return resp
+
+
+def _log_call(elapsed: float, resp: httpx.Response, body: dict, key_slot: int):
     tokens = resp.json().get("usage", {}) if resp.status_code == 200 else {}
     slot_part = f"key_slot={key_slot} | " if key_slot >= 0 else ""
     print(f"[GenAI] {slot_part}{elapsed:.1f}s | status={resp.status_code} | "
           f"max_tokens={body.get('max_tokens','none')} | "
           f"prompt_tok={tokens.get('prompt_tokens','?')} "
           f"comp_tok={tokens.get('completion_tokens','?')}")
-    return resp
 
 
 async def call_genai(
@@ -181,10 +791,10 @@ async def call_genai(
     temperature: float = 0.7,
     max_tokens: Optional[int] = None
 ) -> str:
-    api_key, key_slot = next_api_key()
+    lease = _key_scheduler.acquire()
 
     headers = {
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {lease.key}",
         "Content-Type": "application/json"
     }
 
@@ -198,7 +808,17 @@ async def call_genai(
     if max_tokens:
         body["max_tokens"] = max_tokens
 
-    response = await asyncio.to_thread(_sync_call, headers, body, key_slot)
+    try:
+        if _async_transport.active:
+            response = await _async_call(headers, body, lease.slot)
+        else:
+            response = await _executor.run(_sync_call, headers, body, lease.slot)
+        lease.record(response)
+    except asyncio.CancelledError:
+        lease.abandoned = True
+        raise
+    finally:
+        lease.finish()
 
     if response.status_code != 200:
         raise Exception(f"GenAI API error: {response.status_code}, {response.text}")
@@ -242,19 +862,174 @@ async def call_genai(
     return sanitize_companion_public_output(text)
 
 
+_SSE_DONE = object()
+
+
+def _sse_piece(line: str, raw_lines: list[str]):
+    """Text carried by one line of a streamed completion ("" if none), or _SSE_DONE."""
+    if not line:
+        return ""
+    # SSE: "data: {...}" or "data:{...}"; some proxies omit space
+    if line.startswith("data:"):
+        data_str = line[5:].lstrip()
+    elif line.startswith("{"):
+        data_str = line
+    else:
+        return ""
+    if data_str.strip() == "[DONE]":
+        return _SSE_DONE
+    if len(raw_lines) < 12:
+        raw_lines.append(data_str[:400])
+    try:
+        data = json.loads(data_str)
+    except json.JSONDecodeError:
+        return ""
+    if "choices" not in data or not data["choices"]:
+        return ""
+    ch0 = data["choices"][0]
+    delta = ch0.get("delta") or {}
+    piece = _extract_delta_text(delta)
+    if not piece:
+        piece = _extract_assistant_content(ch0.get("message") or {})
+    return piece
+
+
+def _warn_if_empty(emitted: int, raw_lines: list[str]):
+    if not emitted and raw_lines:
+        print(
+            "[GenAI] warn: stream yielded no text; first chunk lines (truncated):\n  "
+            + "\n  ".join(raw_lines[:5])
+        )
+
+
+async def _async_stream(headers: dict, body: dict, lease: _KeyLease) -> AsyncIterator[str]:
+    """stream_genai on the async transport: deltas are read on the loop, no thread or queue."""
+    emitted = 0
+    raw_lines: list[str] = []
+    print(f"[GenAI] key_slot={lease.slot} | stream request (async)...")
+    client = _async_transport.client()
+    trace, started = _pool_stats.atracer()
+    url, headers, extensions = await _async_transport.prepare(GENAI_API_URL, headers)
+    try:
+        async with client.stream(
+            "POST", url, headers=headers, json=body, extensions={"trace": trace, **extensions}
+        ) as resp:
+            _pool_stats.record(started)
+            lease.record(resp)
+            if resp.status_code != 200:
+                error_text = await resp.aread()
+                raise Exception(f"GenAI API error: {resp.status_code}, {error_text.decode()}")
+            async for line in resp.aiter_lines():
+                piece = _sse_piece(line, raw_lines)
+                if piece is _SSE_DONE:
+                    break
+                if piece:
+                    emitted += 1
+                    yield piece
+    except httpx.TransportError as e:
+        _async_transport.transport_failed(e)
+        raise
+    _warn_if_empty(emitted, raw_lines)
+
+
+async def _threaded_stream(headers: dict, body: dict, lease: _KeyLease) -> AsyncIterator[str]:
+    """
+    stream_genai on the threaded transport.
+
+    The sync httpx stream runs in a worker thread that hands deltas to this coroutine
+    through an asyncio.Queue (loop.call_soon_threadsafe). The thread may run at most
+    GENAI_STREAM_QUEUE_SIZE deltas ahead of the consumer before it waits, and it stops
+    reading (closing the upstream response) once the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(GENAI_STREAM_QUEUE_SIZE)
+    cancelled = threading.Event()
+
+    def post(kind: str, value: Any = None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+        except RuntimeError:
+            # Event loop already closed: nobody is listening any more.
+            cancelled.set()
+
+    def emit(piece: str) -> bool:
+        """Queue one delta, waiting while the consumer is behind; False once it has gone away."""
+        while not slots.acquire(timeout=0.5):
+            if cancelled.is_set():
+                return False
+        if cancelled.is_set():
+            return False
+        post("chunk", piece)
+        return True
+
+    def _sync_stream():
+        emitted = 0
+        raw_lines: list[str] = []
+        print(f"[GenAI] key_slot={lease.slot} | stream request...")
+        client = _get_client()
+        trace, started = _pool_stats.tracer()
+        try:
+            with client.stream(
+                "POST", GENAI_API_URL, headers=headers, json=body, extensions={"trace": trace}
+            ) as resp:
+                _pool_stats.record(started)
+                lease.record(resp)
+                if resp.status_code != 200:
+                    error_text = resp.read()
+                    raise Exception(f"GenAI API error: {resp.status_code}, {error_text.decode()}")
+                for line in resp.iter_lines():
+                    piece = _sse_piece(line, raw_lines)
+                    if piece is _SSE_DONE:
+                        break
+                    if piece:
+                        if not emit(piece):
+                            return
+                        emitted += 1
+        except httpx.TransportError as e:
+            _transport_failed(client, e)
+            raise
+        _warn_if_empty(emitted, raw_lines)
+
+    def run():
+        try:
+            _sync_stream()
+            post("end")
+        except BaseException as e:
+            post("error", e)
+
+    # Not awaited: the worker reports through the queue and stops on its own. The
+    # local reference keeps the task alive while the generator runs.
+    worker = asyncio.ensure_future(_executor.run(run))
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                slots.release()
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                break
+    finally:
+        # Stops the thread at its next delta if we are leaving early.
+        cancelled.set()
+
+
 async def stream_genai(
     messages: list[dict],
     temperature: float = 0.7,
     max_tokens: Optional[int] = None
 ) -> AsyncIterator[str]:
     """
-    Stream responses from Purdue GenAI API.
-    Uses sync httpx in a background thread, then yields chunks.
+    Stream responses from Purdue GenAI API, yielding each delta as it arrives.
+
+    The key slot stays leased (in flight) until the stream ends or the consumer leaves.
     """
-    api_key, key_slot = next_api_key()
+    lease = _key_scheduler.acquire()
 
     headers = {
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {lease.key}",
         "Content-Type": "application/json"
     }
 
@@ -268,52 +1043,19 @@ async def stream_genai(
     if max_tokens:
         body["max_tokens"] = max_tokens
 
-    def _sync_stream():
-        chunks: list[str] = []
-        raw_lines: list[str] = []
-        print(f"[GenAI] key_slot={key_slot} | stream request...")
-        with httpx.Client(timeout=120.0) as client:
-            with client.stream("POST", GENAI_API_URL, headers=headers, json=body) as resp:
-                if resp.status_code != 200:
-                    error_text = resp.read()
-                    raise Exception(f"GenAI API error: {resp.status_code}, {error_text.decode()}")
-                for line in resp.iter_lines():
-                    if not line:
-                        continue
-                    # SSE: "data: {...}" or "data:{...}"; some proxies omit space
-                    if line.startswith("data:"):
-                        data_str = line[5:].lstrip()
-                    elif line.startswith("{"):
-                        data_str = line
-                    else:
-                        continue
-                    if data_str.strip() == "[DONE]":
-                        break
-                    if len(raw_lines) < 12:
-                        raw_lines.append(data_str[:400])
-                    try:
-                        data = json.loads(data_str)
-                    except json.JSONDecodeError:
-                        continue
-                    if "choices" not in data or not data["choices"]:
-                        continue
-                    ch0 = data["choices"][0]
-                    delta = ch0.get("delta") or {}
-                    piece = _extract_delta_text(delta)
-                    if not piece:
-                        piece = _extract_assistant_content(ch0.get("message") or {})
-                    if piece:
-                        chunks.append(piece)
-        if not chunks and raw_lines:
-            print(
-                "[GenAI] warn: stream yielded no text; first chunk lines (truncated):\n  "
-                + "\n  ".join(raw_lines[:5])
-            )
-        return chunks
-
-    chunks = await asyncio.to_thread(_sync_stream)
-    for chunk in chunks:
-        yield chunk
+    if _async_transport.active:
+        pieces = _async_stream(headers, body, lease)
+    else:
+        pieces = _threaded_stream(headers, body, lease)
+    try:
+        async with aclosing(pieces):
+            async for piece in pieces:
+                yield piece
+    except (GeneratorExit, asyncio.CancelledError):
+        lease.abandoned = True
+        raise
+    finally:
+        lease.finish()
 
 
 def __getattr__(name: str):
@@ -1,24 +1,57 @@
+from sqlalchemy import event, update
 from sqlalchemy.orm import Session
-from .models import Event
+from .database import commit_or_defer, run_or_defer
+from . import event_sink
+from .models import Event, SessionProgress
+from .progress_cache import progress_cache
 from typing import Optional
 from uuid import UUID
+import copy
 import json
 
 
+def _coerce_session_id(value) -> Optional[UUID]:
+    if value is None or isinstance(value, UUID):
+        return value
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
 def log_event(
     db: Session,
     event_type: str,
     user_id: Optional[UUID] = None,
-    payload: Optional[dict] = None
+    payload: Optional[dict] = None,
+    session_id: Optional[UUID] = None,
 ):
-    """Log an event to the events table"""
+    """
+    Log an event to the events table.
+
+    ``session_id`` fills the indexed ``events.session_id`` column; when omitted it is
+    taken from ``payload["session_id"]`` so ad-hoc session events are indexed too.
+
+    In buffered sink mode (EVENT_SINK_MODE=buffered) events other than
+    ``event_sink.DURABLE_EVENT_TYPES`` are queued and written in batches off the request path.
+    """
+    if session_id is None and payload:
+        session_id = payload.get("session_id")
+    session_id = _coerce_session_id(session_id)
+    # Snapshot the payload: buffered and deferred rows are serialized later, after callers
+    # may have mutated the dicts they passed in (e.g. the effort result during a turn).
+    payload = copy.deepcopy(payload) if payload else None
+    if event_sink.should_buffer(event_type):
+        event_sink.event_sink.enqueue(event_type, user_id, session_id, payload)
+        return
     event = Event(
         user_id=user_id,
         type=event_type,
-        payload_json=payload if payload else None
+        session_id=session_id,
+        payload_json=payload
     )
     db.add(event)
-    db.commit()
+    commit_or_defer(db)
 
 
 def log_message_sent(db: Session, user_id: UUID, session_id: UUID, message: str):
@@ -30,7 +63,8 @@ def log_message_sent(db: Session, user_id: UUID, session_id: UUID, message: str)
         {
             "session_id": str(session_id),
             "message": message[:500]  # Truncate for logging
-        }
+        },
+        session_id=session_id,
     )
 
 
@@ -43,7 +77,8 @@ def log_message_received(db: Session, user_id: UUID, session_id: UUID, response:
         {
             "session_id": str(session_id),
             "response": response[:500]  # Truncate for logging
-        }
+        },
+        session_id=session_id,
     )
 
 
@@ -103,7 +138,8 @@ def log_session_started(db: Session, user_id: UUID, session_id: UUID):
         db,
         "session_started",
         user_id,
-        {"session_id": str(session_id)}
+        {"session_id": str(session_id)},
+        session_id=session_id,
     )
 
 
@@ -113,7 +149,8 @@ def log_session_ended(db: Session, user_id: UUID, session_id: UUID):
         db,
         "session_ended",
         user_id,
-        {"session_id": str(session_id)}
+        {"session_id": str(session_id)},
+        session_id=session_id,
     )
 
 
@@ -153,18 +190,22 @@ def log_effort_check(
     session_id: UUID,
     *,
     user_message: str,
-    result: dict
+    result: dict,
+    context_budget: dict | None = None,
 ):
     """
     Log effort/relevance assessment for a user message.
     Stored in `events.payload_json` to avoid schema changes.
+    ``context_budget`` is the token budget the turn's context block was fitted to.
     """
     payload = {
         "session_id": str(session_id),
         "user_message": user_message[:500],
         "result": result,
     }
-    log_event(db, "effort_check", user_id, payload)
+    if context_budget is not None:
+        payload["context_budget"] = context_budget
+    log_event(db, "effort_check", user_id, payload, session_id=session_id)
 
 
 def log_progress_update(
@@ -216,7 +257,81 @@ def log_progress_update(
         "preferred_name": preferred_name,
         "transition_bridge": transition_bridge,
     }
-    log_event(db, "progress_update", user_id, payload)
+    # The session_progress row and the audit event are committed together.
+    run_or_defer(db, lambda: _write_session_progress(db, user_id, session_id, payload))
+    log_event(db, "progress_update", user_id, payload, session_id=session_id)
+
+
+def _seen_progress_versions(db: Session) -> dict:
+    """Progress versions this DB session (i.e. this request) has already read or written."""
+    return db.info.setdefault("progress_versions", {})
+
+
+_PENDING_PROGRESS_KEY = "pending_progress_cache"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_progress_cache(db: Session):
+    """Write committed progress through to the cache (see _write_session_progress)."""
+    for session_id, (version, user_id, payload) in db.info.pop(_PENDING_PROGRESS_KEY, {}).items():
+        progress_cache.put(session_id, version, user_id, payload)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_progress(db: Session, previous_transaction):
+    # Rolled-back versions must never be cached or treated as seen.
+    db.info.pop(_PENDING_PROGRESS_KEY, None)
+    db.info.pop("progress_versions", None)
+
+
+def _write_session_progress(db: Session, user_id: UUID, session_id: UUID, payload: dict):
+    """
+    Rewrite the materialized progress row for ``session_id`` (caller commits) and
+    write the new state through to the progress cache once that commit succeeds. A
+    failed commit leaves the cache as it was, so this worker never holds a version
+    another worker may later write with different state.
+
+    When this process holds a cached version the write is a compare-and-set UPDATE;
+    if another worker has written since, the CAS misses and we fall back to a plain
+    version increment.
+    """
+    values = {"user_id": user_id, "state_json": payload}
+    base = update(SessionProgress).where(SessionProgress.session_id == session_id)
+    new_version = None
+    cached = progress_cache.get(session_id)
+    if cached is not None:
+        new_version = db.execute(
+            base.where(SessionProgress.version == cached.version)
+            .values(version=cached.version + 1, **values)
+            .returning(SessionProgress.version)
+        ).scalar()
+        if new_version is None:
+            progress_cache.record("stale")
+    if new_version is None:
+        new_version = db.execute(
+            base.values(version=SessionProgress.version + 1, **values)
+            .returning(SessionProgress.version)
+        ).scalar()
+    if new_version is None:
+        new_version = 1
+        db.add(SessionProgress(session_id=session_id, user_id=user_id, state_json=payload, version=new_version))
+    db.info.setdefault(_PENDING_PROGRESS_KEY, {})[session_id] = (new_version, user_id, payload)
+    _seen_progress_versions(db)[session_id] = new_version
+
+
+def _latest_progress_from_events(db: Session, user_id: UUID, session_id: UUID) -> dict | None:
+    """Legacy lookup: latest progress_update event for the session (index seek on events.session_id)."""
+    event = (
+        db.query(Event)
+        .filter(
+            Event.user_id == user_id,
+            Event.type == "progress_update",
+            Event.session_id == session_id,
+        )
+        .order_by(Event.seq.desc())
+        .first()
+    )
+    return (event.payload_json or {}) if event else None
 
 
 def get_latest_progress(
@@ -229,21 +344,37 @@ def get_latest_progress(
     Returns dict with: current_phase, current_prompt_index, followups_used_for_prompt, phase_complete,
     study_complete, pending_skip_confirmation, skip_confirmation_sent.
     Returns None if no progress found.
+
+    Served from the progress cache when its version stamp still matches the row, otherwise
+    from the materialized ``session_progress`` row (primary-key lookup). Sessions whose
+    progress predates that table fall back to the latest progress_update event until
+    ``backfill_session_progress.py`` has been run.
     """
-    events = (
-        db.query(Event)
-        .filter(
-            Event.user_id == user_id,
-            Event.type == "progress_update",
-        )
-        .order_by(Event.created_at.desc())
-        .all()
-    )
-    target_session_id = str(session_id)
-    for event in events:
-        payload = event.payload_json or {}
-        if str(payload.get("session_id")) != target_session_id:
-            continue
-        return payload
-    return None
+    cached = progress_cache.get(session_id)
+    if cached is not None:
+        seen = _seen_progress_versions(db).get(session_id)
+        if seen is None:
+            seen = (
+                db.query(SessionProgress.version)
+                .filter(SessionProgress.session_id == session_id)
+                .scalar()
+            )
+        if seen == cached.version:
+            progress_cache.record("hit")
+            _seen_progress_versions(db)[session_id] = seen
+            if cached.user_id != user_id:
+                return None
+            return copy.deepcopy(cached.state)
+        progress_cache.record("stale")
+    else:
+        progress_cache.record("miss")
+
+    row = db.get(SessionProgress, session_id)
+    if row is not None:
+        progress_cache.put(session_id, row.version, row.user_id, row.state_json)
+        _seen_progress_versions(db)[session_id] = row.version
+        if row.user_id != user_id:
+            return None
+        return row.state_json
+    return _latest_progress_from_events(db, user_id, session_id)
 
@@ -71,7 +71,8 @@ async def startup_event():
     import asyncio
     async def _warmup():
         try:
-            from .genai_client import call_genai
+            from .genai_client import call_genai, start_transport
+            await start_transport()
             await call_genai(
                 [{"role": "user", "content": "Hi"}],
                 stream=False,
@@ -82,6 +83,30 @@ async def startup_event():
             print(f"GenAI warm-up: failed ({e}) — first request may be slow")
     asyncio.create_task(_warmup())
 
+    from . import memory_consolidation, session_cleanup
+
+    session_cleanup.start()
+
+    if memory_consolidation.MEMORY_CONSOLIDATION_ENABLED:
+        from .database import SessionLocal
+
+        app.state.memory_consolidation_task = asyncio.create_task(
+            memory_consolidation.consolidation_loop(SessionLocal)
+        )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and flush buffered instrumentation events before the worker exits."""
+    from . import event_sink, genai_client, session_cleanup
+
+    task = getattr(app.state, "memory_consolidation_task", None)
+    if task is not None:
+        task.cancel()
+    session_cleanup.shutdown()
+    event_sink.shutdown()
+    await genai_client.aclose()
+
 
 @app.get("/")
 def root():
@@ -96,3 +121,25 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/metrics")
+def metrics():
+    """In-process counters for this worker (caches, queues). Values are per process."""
+    from . import event_sink, genai_client, session_cleanup
+    from .memory_context_cache import memory_context_cache
+    from .memory_index import memory_index
+    from .progress_cache import progress_cache
+
+    return {
+        "pid": os.getpid(),
+        "progress_cache": progress_cache.stats(),
+        "memory_context_cache": memory_context_cache.stats(),
+        "memory_index": memory_index.stats(),
+        "event_sink": event_sink.stats(),
+        "session_cleanup": session_cleanup.stats(),
+        "genai_pool": genai_client.pool_stats(),
+        "genai_executor": genai_client.executor_stats(),
+        "genai_transport": genai_client.transport_stats(),
+        "genai_keys": genai_client.key_stats(),
+    }
+
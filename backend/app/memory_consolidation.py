@@ -0,0 +1,329 @@
+"""
+Background consolidation of PERSISTENT_* memories.
+
+Extraction can add several "User ..." rows per turn and nothing merges them, so a
+long-running participant's memory set grows without bound. The worker revisits users
+whose ``memory_version`` moved since its last pass (``memory_consolidated_version``)
+and, per user:
+
+1. groups near-duplicate active memories (MinHash clusters, memory_similarity);
+2. if the active set is still above MEMORY_ACTIVE_CEILING, rolls the oldest remaining
+   memories up into groups as well;
+3. merges each group into one memory with a single LLM call, or by a deterministic
+   rule when the model is unavailable: the distinct facts joined into one text, so
+   nothing is dropped (a near-duplicate group whose joined text does not fit is left
+   alone);
+4. replaces the originals with the merged row in one short transaction, keeping their
+   text and metadata in ``memory_merge_sources``. The merged row keeps the newest
+   source's session, so session-scoped dedup and the extractor's existing-memory list
+   still see it.
+
+Similarity never groups facts that differ in a negation, a number or a name (see
+memory_similarity), and the default threshold only groups close rewrites.
+
+Memories the participant edited (``user_edited``) and inactive candidates are never
+merged. Each group is re-checked inside its transaction, so a memory that was edited
+or deleted while the LLM call was in flight makes the group be skipped, not revived.
+SESSION_AUTO memories are deleted at session end and are left alone.
+
+The loop (``consolidation_loop``) only runs a batch when no chat turn was handled for
+MEMORY_CONSOLIDATION_IDLE_SECONDS; consolidate_memories.py runs a batch on demand.
+"""
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+
+from . import memory_manager
+from .memory_similarity import cluster, signature_cache
+from .models import Memory, MemoryMergeSource, User
+
+MEMORY_CONSOLIDATION_ENABLED = (
+    os.getenv("MEMORY_CONSOLIDATION_ENABLED", "false").strip().lower() == "true"
+)
+MEMORY_ACTIVE_CEILING = int(os.getenv("MEMORY_ACTIVE_CEILING", "200"))
+MEMORY_CONSOLIDATION_THRESHOLD = float(os.getenv("MEMORY_CONSOLIDATION_THRESHOLD", "0.7"))
+MEMORY_CONSOLIDATION_INTERVAL_SEC = float(os.getenv("MEMORY_CONSOLIDATION_INTERVAL_SEC", "300"))
+MEMORY_CONSOLIDATION_IDLE_SECONDS = float(os.getenv("MEMORY_CONSOLIDATION_IDLE_SECONDS", "60"))
+MEMORY_CONSOLIDATION_BATCH_USERS = int(os.getenv("MEMORY_CONSOLIDATION_BATCH_USERS", "20"))
+MAX_GROUP_SIZE = 8
+MAX_MEMORY_CHARS = 200
+
+PERSISTENT_CONDITIONS = ("PERSISTENT_AUTO", "PERSISTENT_USER")
+
+_last_activity = 0.0
+
+
+def note_activity():
+    """Record that a chat turn is being handled (the worker waits for idle time)."""
+    global _last_activity
+    _last_activity = time.monotonic()
+
+
+def is_idle() -> bool:
+    return time.monotonic() - _last_activity >= MEMORY_CONSOLIDATION_IDLE_SECONDS
+
+
+@dataclass
+class ConsolidationResult:
+    users_scanned: int = 0
+    groups_merged: int = 0
+    memories_merged: int = 0
+    llm_merges: int = 0
+    rule_merges: int = 0
+    groups_skipped: int = 0
+
+
+@dataclass
+class _Group:
+    rows: list
+    kind: str  # "similar" or "rollup"
+
+
+def _body(text: str) -> str:
+    text = text.strip()
+    if text.lower().startswith("user "):
+        text = text[5:].strip()
+    return text.rstrip(".!")
+
+
+def rule_merge(texts: list[str], kind: str) -> Optional[str]:
+    """
+    Deterministic merge: the distinct facts joined into one memory. None for a
+    near-duplicate group that would not fit (truncating would drop a fact); roll-ups are
+    planned to fit.
+    """
+    bodies = []
+    for text in texts:
+        body = _body(text)
+        if body and body.lower() not in (b.lower() for b in bodies):
+            bodies.append(body)
+    if len(bodies) == 1:
+        return f"User {bodies[0]}."
+    merged = "User " + "; ".join(bodies) + "."
+    if kind == "similar" and len(merged) > MAX_MEMORY_CHARS:
+        return None
+    return merged[:MAX_MEMORY_CHARS]
+
+
+async def llm_merge(texts: list[str]) -> Optional[str]:
+    """One LLM call merging ``texts``; None when the model is unavailable or the reply is unusable."""
+    from .genai_client import call_genai
+
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You merge notes about a study participant. Combine the facts below into one "
+                f"memory of at most {MAX_MEMORY_CHARS} characters that starts with \"User\". Keep "
+                "every fact, add nothing, and reply with the memory only."
+            ),
+        },
+        {"role": "user", "content": "\n".join(f"- {text}" for text in texts)},
+    ]
+    try:
+        response = await call_genai(messages, stream=False, temperature=0.1, max_tokens=120)
+    except Exception as e:
+        print(f"[Memory] consolidation LLM merge failed: {e}")
+        return None
+    for line in (response or "").strip().split("\n"):
+        line = line.strip().lstrip("-* ").strip()
+        if line.startswith("User") and len(line) <= MAX_MEMORY_CHARS:
+            return line
+    return None
+
+
+def _plan_groups(rows: list, active_count: int, threshold: float, ceiling: int) -> list[_Group]:
+    """Groups to merge for one user; ``rows`` are mergeable active memories, oldest first."""
+    groups = []
+    grouped = set()
+    if len(rows) > 1:
+        matrix = signature_cache.matrix((row.norm_hash, row.text) for row in rows)
+        for members in cluster(matrix, threshold):
+            for start in range(0, len(members), MAX_GROUP_SIZE):
+                chunk = members[start:start + MAX_GROUP_SIZE]
+                if len(chunk) > 1:
+                    groups.append(_Group([rows[i] for i in chunk], "similar"))
+                    grouped.update(chunk)
+
+    projected = active_count - sum(len(group.rows) - 1 for group in groups)
+    remaining = [row for i, row in enumerate(rows) if i not in grouped]
+    while projected > ceiling and len(remaining) > 1:
+        # Roll up the oldest memories, as many as fit one merged memory.
+        chunk = [remaining.pop(0)]
+        while (
+            remaining
+            and len(chunk) < MAX_GROUP_SIZE
+            and projected - (len(chunk) - 1) > ceiling
+            and len(rule_merge([r.text for r in chunk + remaining[:1]], "rollup")) < MAX_MEMORY_CHARS
+        ):
+            chunk.append(remaining.pop(0))
+        if len(chunk) < 2:
+            continue
+        groups.append(_Group(chunk, "rollup"))
+        projected -= len(chunk) - 1
+    return groups
+
+
+def _apply_merge(db, user_id: uuid.UUID, group: _Group, text: str, method: str) -> bool:
+    """Replace the group's memories with one merged memory; False if any original changed."""
+    ids = [row.memory_id for row in group.rows]
+    current = db.execute(
+        select(Memory.memory_id, Memory.norm_hash).where(
+            Memory.memory_id.in_(ids),
+            Memory.user_id == user_id,
+            Memory.is_active == True,
+            Memory.user_edited == False,
+        )
+    ).all()
+    expected = {row.memory_id: row.norm_hash for row in group.rows}
+    if len(current) != len(ids) or any(expected[row.memory_id] != row.norm_hash for row in current):
+        db.rollback()
+        return False
+
+    phases = [row.phase for row in group.rows if row.phase is not None]
+    created = [row.created_at for row in group.rows if row.created_at is not None]
+    # rows are oldest first; the newest source with a session owns the merged memory
+    session_id = next((row.session_id for row in reversed(group.rows) if row.session_id), None)
+    merged_id = uuid.uuid4()
+    db.execute(
+        insert(Memory).values(
+            memory_id=merged_id,
+            user_id=user_id,
+            session_id=session_id,
+            text=text[:MAX_MEMORY_CHARS],
+            norm_hash=memory_manager.memory_text_hash(text[:MAX_MEMORY_CHARS]),
+            is_active=True,
+            # Shown in recaps once every source phase has been reached
+            phase=max(phases) if phases else None,
+            created_at=max(created) if created else func.now(),
+        )
+    )
+    db.execute(
+        insert(MemoryMergeSource),
+        [
+            {
+                "memory_id": merged_id,
+                "source_memory_id": row.memory_id,
+                "text": row.text,
+                "session_id": row.session_id,
+                "phase": row.phase,
+                "source_created_at": row.created_at,
+                "merge_method": method,
+            }
+            for row in group.rows
+        ],
+    )
+    db.execute(delete(Memory).where(Memory.memory_id.in_(ids)))
+    memory_manager._memory_changed(
+        db, user_id, upserted=[(merged_id, text[:MAX_MEMORY_CHARS])], removed=ids
+    )
+    db.commit()
+    return True
+
+
+async def consolidate_user(
+    db,
+    user_id: uuid.UUID,
+    *,
+    use_llm: bool = True,
+    ceiling: int = MEMORY_ACTIVE_CEILING,
+    threshold: float = MEMORY_CONSOLIDATION_THRESHOLD,
+    result: Optional[ConsolidationResult] = None,
+) -> ConsolidationResult:
+    result = result or ConsolidationResult()
+    start_version = db.execute(select(User.memory_version).where(User.user_id == user_id)).scalar()
+    active_count = db.execute(
+        select(func.count()).select_from(Memory).where(Memory.user_id == user_id, Memory.is_active == True)
+    ).scalar()
+    rows = db.execute(
+        select(
+            Memory.memory_id,
+            Memory.norm_hash,
+            Memory.text,
+            Memory.session_id,
+            Memory.phase,
+            Memory.created_at,
+        )
+        .where(Memory.user_id == user_id, Memory.is_active == True, Memory.user_edited == False)
+        .order_by(Memory.created_at, Memory.memory_id)
+    ).all()
+    # Nothing is held open while the LLM is called
+    db.rollback()
+    result.users_scanned += 1
+
+    merges = 0
+    for group in _plan_groups(rows, active_count, threshold, ceiling):
+        texts = [row.text for row in group.rows]
+        text = await llm_merge(texts) if use_llm else None
+        method = "llm" if text else "rule"
+        text = text or rule_merge(texts, group.kind)
+        if text and _apply_merge(db, user_id, group, text, method):
+            merges += 1
+            result.groups_merged += 1
+            result.memories_merged += len(group.rows)
+            if method == "llm":
+                result.llm_merges += 1
+            else:
+                result.rule_merges += 1
+        else:
+            result.groups_skipped += 1
+
+    # Each merge bumped memory_version by one; a concurrent write leaves the user pending.
+    if start_version is not None:
+        db.execute(
+            update(User)
+            .where(User.user_id == user_id)
+            .values(memory_consolidated_version=start_version + merges)
+        )
+        db.commit()
+    return result
+
+
+async def run_consolidation_batch(
+    session_factory,
+    *,
+    max_users: int = MEMORY_CONSOLIDATION_BATCH_USERS,
+    use_llm: bool = True,
+    ceiling: int = MEMORY_ACTIVE_CEILING,
+    threshold: float = MEMORY_CONSOLIDATION_THRESHOLD,
+) -> ConsolidationResult:
+    """Consolidate up to ``max_users`` PERSISTENT_* users whose memories changed since the last pass."""
+    result = ConsolidationResult()
+    db = session_factory()
+    try:
+        user_ids = db.execute(
+            select(User.user_id)
+            .where(
+                User.condition_id.in_(PERSISTENT_CONDITIONS),
+                User.memory_version != User.memory_consolidated_version,
+            )
+            .order_by(User.user_id)
+            .limit(max_users)
+        ).scalars().all()
+        db.rollback()
+        for user_id in user_ids:
+            await consolidate_user(
+                db, user_id, use_llm=use_llm, ceiling=ceiling, threshold=threshold, result=result
+            )
+    finally:
+        db.close()
+    return result
+
+
+async def consolidation_loop(session_factory):
+    """Run a batch every MEMORY_CONSOLIDATION_INTERVAL_SEC while the worker is idle."""
+    while True:
+        await asyncio.sleep(MEMORY_CONSOLIDATION_INTERVAL_SEC)
+        if not is_idle():
+            continue
+        try:
+            result = await run_consolidation_batch(session_factory)
+            if result.groups_merged or result.groups_skipped:
+                print(f"[Memory] consolidation: {result}")
+        except Exception as e:
+            print(f"[Memory] consolidation batch failed: {e}")
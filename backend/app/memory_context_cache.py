@@ -0,0 +1,107 @@
+"""
+In-process cache of each user's rendered memory block for prompt context.
+
+Memories only change on extraction and the /memory write endpoints, yet every chat
+turn in a PERSISTENT_* condition re-reads the same rows. Entries are stamped with
+``users.memory_version``, which every memory write in memory_manager bumps in the
+same transaction, so a write from another worker shows up as a version mismatch.
+The stamp is read from the User row the request has already loaded, so checking it
+costs no extra query. Writes in this worker also drop the entry directly, and a
+TTL bounds how long an entry can be served at all.
+
+With MEMORY_RETRIEVAL=bm25 (default) the selection also depends on the user's
+message, so the entry is additionally keyed on the message's BM25 terms
+(memory_index.query_key). A turn whose message has the same terms as the user's
+previous one (a resent message, or the short "Yes!" / "yes" / "I don't know" answers
+that have no terms at all) reuses the block without scoring the index. Each user has
+one entry: the recency selection, or the last ranked one.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+
+MEMORY_CONTEXT_CACHE_SIZE = int(os.getenv("MEMORY_CONTEXT_CACHE_SIZE", "4096"))
+MEMORY_CONTEXT_CACHE_TTL = float(os.getenv("MEMORY_CONTEXT_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class CachedMemoryBlock:
+    version: int
+    limit: int
+    texts: tuple  # active memory texts, in context order
+    cached_at: float
+    query: tuple | None = None  # memory_index.query_key of a ranked selection
+
+
+class MemoryContextCache:
+    """Bounded LRU + TTL of user_id -> CachedMemoryBlock. Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = MEMORY_CONTEXT_CACHE_SIZE,
+        ttl_seconds: float = MEMORY_CONTEXT_CACHE_TTL,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[UUID, CachedMemoryBlock]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def lookup(self, user_id: UUID, version: int, limit: int, query: tuple | None = None) -> tuple | None:
+        """Return the cached texts if they match ``version``, ``limit`` and ``query``; counts the outcome."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.query != query:
+                self.misses += 1
+                return None
+            if (
+                entry.version != version
+                or entry.limit != limit
+                or now - entry.cached_at > self.ttl_seconds
+            ):
+                del self._entries[user_id]
+                self.stale += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry.texts
+
+    def put(self, user_id: UUID, version: int, limit: int, texts, query: tuple | None = None):
+        if self.max_entries == 0:
+            return
+        entry = CachedMemoryBlock(
+            version=version, limit=limit, texts=tuple(texts), cached_at=time.monotonic(), query=query
+        )
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+            }
+
+
+memory_context_cache = MemoryContextCache()
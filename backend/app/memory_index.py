@@ -0,0 +1,206 @@
+"""
+In-process BM25 index over each user's active memories, for relevance-ranked context.
+
+An index is built lazily from the database the first time a user's context needs it
+and is stamped with ``users.memory_version`` (see memory_context_cache). Once a memory
+write in this worker has committed, it is applied to the index in place and the stamp
+moves to the version that write committed; if the index was not at the version just
+before (another worker wrote in between), it is dropped and the next lookup rebuilds
+it. Uncommitted writes never touch the index.
+
+Selection is deterministic: memories are ranked by BM25 score against the query,
+ties go to the newest memory, and remaining slots are filled newest first. The chosen
+memories are returned in that order (most valuable first), so without a match the
+result is exactly the recency selection.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from uuid import UUID
+
+MEMORY_INDEX_MAX_USERS = int(os.getenv("MEMORY_INDEX_MAX_USERS", "1024"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Extracted memories all read "User ...", so "user" carries no signal.
+_STOPWORDS = frozenset(
+    """
+    a about after all also am an and any are as at be been but by can could did do does
+    for from had has have he her his how i if in into is it its just me my no not of on
+    or our she so some than that the their them then there they this to too up us was we
+    were what when where which who why will with would you your user users
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_RE.findall((text or "").lower()) if token not in _STOPWORDS]
+
+
+def query_key(query: str) -> tuple:
+    """The query's distinct terms: two queries with the same key select the same memories."""
+    return tuple(sorted(set(tokenize(query))))
+
+
+class UserMemoryIndex:
+    """BM25 postings for one user's active memories. Not thread-safe on its own."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self._texts: dict[UUID, str] = {}
+        self._order: dict[UUID, int] = {}  # higher = newer
+        self._lengths: dict[UUID, int] = {}
+        self._postings: dict[str, dict[UUID, int]] = {}
+        self._total_length = 0
+        self._next_order = 0
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def upsert(self, memory_id: UUID, text: str):
+        order = self._order.get(memory_id)
+        self.remove(memory_id)
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        terms = Counter(tokenize(text))
+        self._texts[memory_id] = text
+        self._order[memory_id] = order
+        self._lengths[memory_id] = sum(terms.values())
+        self._total_length += self._lengths[memory_id]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[memory_id] = count
+
+    def remove(self, memory_id: UUID):
+        text = self._texts.pop(memory_id, None)
+        if text is None:
+            return
+        del self._order[memory_id]
+        self._total_length -= self._lengths.pop(memory_id)
+        for term in set(tokenize(text)):
+            docs = self._postings.get(term)
+            if docs is not None:
+                docs.pop(memory_id, None)
+                if not docs:
+                    del self._postings[term]
+
+    def scores(self, query: str) -> dict[UUID, float]:
+        count = len(self._texts)
+        if not count:
+            return {}
+        avg_length = max(self._total_length / count, 1.0)
+        base_norm = BM25_K1 * (1 - BM25_B)
+        length_norm = BM25_K1 * BM25_B / avg_length
+        lengths = self._lengths
+        scores: dict[UUID, float] = {}
+        get_score = scores.get
+        for term in set(tokenize(query)):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            weight = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5)) * (BM25_K1 + 1)
+            for memory_id, tf in docs.items():
+                scores[memory_id] = get_score(memory_id, 0.0) + weight * tf / (
+                    tf + base_norm + length_norm * lengths[memory_id]
+                )
+        return scores
+
+    def top_k(self, query: str, k: int) -> list[str]:
+        """Texts of the k most relevant memories (newest fill the rest), most valuable first."""
+        if k <= 0:
+            return []
+        order = self._order
+        scores = self.scores(query)
+        chosen = heapq.nlargest(k, scores, key=lambda memory_id: (scores[memory_id], order[memory_id]))
+        if len(chosen) < k:
+            picked = set(chosen)
+            chosen += heapq.nlargest(
+                k - len(chosen),
+                (memory_id for memory_id in order if memory_id not in picked),
+                key=order.__getitem__,
+            )
+        return [self._texts[memory_id] for memory_id in chosen]
+
+
+class MemoryIndexRegistry:
+    """Bounded LRU of user_id -> UserMemoryIndex. Thread-safe."""
+
+    def __init__(self, max_users: int = MEMORY_INDEX_MAX_USERS):
+        self.max_users = max(0, max_users)
+        self._indexes: "OrderedDict[UUID, UserMemoryIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.updates = 0
+
+    def top_k(self, user_id: UUID, version: int, query: str, k: int, load_rows) -> list[str]:
+        """
+        Select memories for ``query`` from the user's index at ``version``, building it
+        from ``load_rows()`` -> [(memory_id, text)] oldest first when missing or stale.
+        """
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(user_id)
+                self.hits += 1
+                return index.top_k(query, k)
+
+        # Load outside the lock; concurrent builders for one user just race to store.
+        index = UserMemoryIndex(version)
+        for memory_id, text in load_rows():
+            index.upsert(memory_id, text)
+        with self._lock:
+            self.builds += 1
+            if self.max_users:
+                self._indexes[user_id] = index
+                self._indexes.move_to_end(user_id)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+            return index.top_k(query, k)
+
+    def apply(self, user_id: UUID, version: int, upserted=(), removed=()):
+        """
+        Apply one committed local memory write that moved users.memory_version to
+        ``version``: ``upserted`` are (memory_id, text) now active, ``removed`` are memory
+        ids no longer active. An index not at ``version - 1`` is dropped instead.
+        """
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            if index.version != version - 1:
+                del self._indexes[user_id]
+                return
+            for memory_id in removed:
+                index.remove(memory_id)
+            for memory_id, text in upserted:
+                index.upsert(memory_id, text)
+            index.version = version
+            self.updates += 1
+
+    def invalidate(self, user_id: UUID):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._indexes),
+                "max_users": self.max_users,
+                "memories": sum(len(index) for index in self._indexes.values()),
+                "hits": self.hits,
+                "builds": self.builds,
+                "updates": self.updates,
+            }
+
+
+memory_index = MemoryIndexRegistry()
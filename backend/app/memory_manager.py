@@ -1,9 +1,29 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
-from .models import Memory, Session as SessionModel, Message
-from typing import List, Optional
+from sqlalchemy import event
+from sqlalchemy import String, cast, desc, func, insert, literal, null, or_, select, union_all, update
+from .context_budget import ContextBudget, fit_context, reserved_prompt_tokens
+from .database import commit_or_defer, run_or_defer
+from . import prompt_store
+from .memory_context_cache import memory_context_cache
+from .memory_index import memory_index, query_key
+from .memory_similarity import (
+    MEMORY_NEAR_DUP_THRESHOLD,
+    near_duplicate_mask,
+    signature_cache,
+    signatures,
+)
+from .models import Memory, Session as SessionModel, Message, User
+from dataclasses import dataclass, replace
+import hashlib
+import os
+import uuid
+from typing import List, Optional, Tuple
 from uuid import UUID
 
+# "bm25" ranks memories against the user's message for strategies that allow it;
+# "recency" always injects the newest memories.
+MEMORY_RETRIEVAL = os.getenv("MEMORY_RETRIEVAL", "bm25").strip().lower()
+
 
 def _ensure_uuid(value: Optional[UUID]) -> Optional[UUID]:
     if value is None:
@@ -13,81 +33,168 @@ def _ensure_uuid(value: Optional[UUID]) -> Optional[UUID]:
     return UUID(str(value))
 
 
-def get_context(user_id: UUID, session_id: UUID, condition: str, db: Session) -> str:
+@dataclass(frozen=True)
+class ContextStrategy:
+    """How many memories and recent session messages a condition puts in the prompt context."""
+    memory_limit: int
+    message_limit: int
+    # Pick memories by relevance to the user's message (memory_index) instead of recency
+    rank_by_relevance: bool = False
+
+
+CONTEXT_STRATEGIES = {
+    # Recent messages from the current session only
+    "SESSION_AUTO": ContextStrategy(memory_limit=0, message_limit=10),
+    # All active memories for the user plus recent session messages
+    "PERSISTENT_AUTO": ContextStrategy(memory_limit=20, message_limit=5, rank_by_relevance=True),
+    # User-approved persistent memories plus recent session messages
+    "PERSISTENT_USER": ContextStrategy(memory_limit=20, message_limit=5, rank_by_relevance=True),
+}
+
+# Row kinds in the combined context query; memories are listed before messages.
+_CONTEXT_MEMORY = 0
+_CONTEXT_MESSAGE = 1
+
+
+def _context_query(user_id: UUID, session_id: UUID, strategy: ContextStrategy):
+    """
+    One statement returning (kind, role, text, rank) rows for the context block,
+    or None when the strategy reads nothing.
+
+    Each part keeps its own ORDER BY/LIMIT inside a subquery; rank is the 1-based
+    position newest first. The parts are combined with UNION ALL so the whole
+    context costs a single round-trip.
+    """
+    parts = []
+    if strategy.memory_limit:
+        memories = (
+            select(
+                literal(_CONTEXT_MEMORY).label("kind"),
+                cast(null(), String).label("role"),
+                Memory.text.label("text"),
+                func.row_number().over(order_by=desc(Memory.created_at)).label("rank"),
+            )
+            .where(Memory.user_id == user_id, Memory.is_active == True)
+            .order_by(desc(Memory.created_at))
+            .limit(strategy.memory_limit)
+            .subquery()
+        )
+        parts.append(select(memories))
+    if strategy.message_limit:
+        messages = (
+            select(
+                literal(_CONTEXT_MESSAGE).label("kind"),
+                Message.role.label("role"),
+                Message.content.label("text"),
+                func.row_number().over(order_by=desc(Message.seq)).label("rank"),
+            )
+            .where(Message.session_id == session_id)
+            .order_by(desc(Message.seq))
+            .limit(strategy.message_limit)
+            .subquery()
+        )
+        parts.append(select(messages))
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else union_all(*parts)
+
+
+def _active_memory_rows(user_id: UUID, db: Session):
+    """(memory_id, text) of the user's active memories, oldest first, for memory_index."""
+    return db.execute(
+        select(Memory.memory_id, Memory.text)
+        .where(Memory.user_id == user_id, Memory.is_active == True)
+        .order_by(Memory.created_at, Memory.memory_id)
+    ).all()
+
+
+def build_context(
+    user_id: UUID,
+    session_id: UUID,
+    condition: str,
+    db: Session,
+    query_text: Optional[str] = None,
+    reserved_tokens: Optional[int] = None,
+) -> Tuple[str, Optional[ContextBudget]]:
     """
-    Get context based on condition:
+    Build the context block based on condition (see CONTEXT_STRATEGIES):
     - SESSION_AUTO: Recent messages from current session
     - PERSISTENT_AUTO: All active memories for user
     - PERSISTENT_USER: User-approved persistent memories
+
+    With ``query_text`` (the user's message), relevance-ranked strategies pick the
+    memories that best match it; otherwise the newest memories are used.
+
+    The block is fitted to the token budget (see context_budget) after reserving
+    ``reserved_tokens`` for the rest of the prompt (by default the guided system prompt
+    plus ``query_text``). Returns the text and the budget, or None for unknown conditions.
     """
+    strategy = CONTEXT_STRATEGIES.get(condition)
+    if strategy is None:
+        return "", None
+
     normalized_user_id = _ensure_uuid(user_id)
-    normalized_session_id = _ensure_uuid(session_id)
+    cached_memories = None
+    memory_version = None
+    if strategy.memory_limit:
+        # The request has already loaded the user, so this is an identity-map hit.
+        user = db.get(User, normalized_user_id)
+        if user is not None and user.memory_version is not None:
+            memory_version = user.memory_version
+            ranked = bool(strategy.rank_by_relevance and MEMORY_RETRIEVAL == "bm25" and query_text)
+            # A ranked selection is cached under the message's terms, a recency one without.
+            terms = query_key(query_text) if ranked else None
+            cached_memories = memory_context_cache.lookup(
+                normalized_user_id, memory_version, strategy.memory_limit, terms
+            )
+            if cached_memories is None and ranked:
+                cached_memories = memory_index.top_k(
+                    normalized_user_id,
+                    memory_version,
+                    query_text,
+                    strategy.memory_limit,
+                    lambda: _active_memory_rows(normalized_user_id, db),
+                )
+                memory_context_cache.put(
+                    normalized_user_id, memory_version, strategy.memory_limit, cached_memories, terms
+                )
+    query_strategy = strategy if cached_memories is None else replace(strategy, memory_limit=0)
+
+    query = _context_query(normalized_user_id, _ensure_uuid(session_id), query_strategy)
+    rows = db.execute(query).all() if query is not None else []
+    # Memories newest first, then messages oldest first
+    rows.sort(key=lambda row: (row.kind, row.rank if row.kind == _CONTEXT_MEMORY else -row.rank))
+
+    if cached_memories is None:
+        memory_texts = [row.text for row in rows if row.kind == _CONTEXT_MEMORY]
+        if memory_version is not None:
+            memory_context_cache.put(
+                normalized_user_id, memory_version, strategy.memory_limit, memory_texts
+            )
+    else:
+        memory_texts = list(cached_memories)
 
-    context_parts = []
-    
-    if condition == "SESSION_AUTO":
-        # Get recent messages from current session (last 10)
-        messages = db.query(Message).filter(
-            Message.session_id == normalized_session_id
-        ).order_by(desc(Message.created_at)).limit(10).all()
-        messages.reverse()  # Oldest first
-        
-        for msg in messages:
-            context_parts.append(f"{msg.role.capitalize()}: {msg.content}")
-    
-    elif condition == "PERSISTENT_AUTO":
-        # Get all active memories for user
-        memories = db.query(Memory).filter(
-            Memory.user_id == normalized_user_id,
-            Memory.is_active == True
-        ).order_by(desc(Memory.created_at)).limit(20).all()
-        
-        for memory in memories:
-            context_parts.append(f"Memory: {memory.text}")
-        
-        # Include recent messages from current session
-        messages = db.query(Message).filter(
-            Message.session_id == normalized_session_id
-        ).order_by(desc(Message.created_at)).limit(5).all()
-        messages.reverse()
-        
-        for msg in messages:
-            context_parts.append(f"{msg.role.capitalize()}: {msg.content}")
-    
-    elif condition == "PERSISTENT_USER":
-        # Get user-approved persistent memories
-        memories = db.query(Memory).filter(
-            Memory.user_id == normalized_user_id,
-            Memory.is_active == True
-        ).order_by(desc(Memory.created_at)).limit(20).all()
-        
-        for memory in memories:
-            context_parts.append(f"Memory: {memory.text}")
-        
-        # Include recent messages from current session
-        messages = db.query(Message).filter(
-            Message.session_id == normalized_session_id
-        ).order_by(desc(Message.created_at)).limit(5).all()
-        messages.reverse()
-        
-        for msg in messages:
-            context_parts.append(f"{msg.role.capitalize()}: {msg.content}")
-    
-    # Limit total context size (approximately 1000 chars for memories, 6000 total)
-    context_text = "\n".join(context_parts)
-    if len(context_text) > 6000:
-        # Truncate while preserving structure
-        lines = context_parts
-        truncated = []
-        char_count = 0
-        for line in lines:
-            if char_count + len(line) > 6000:
-                break
-            truncated.append(line)
-            char_count += len(line) + 1  # +1 for newline
-        context_text = "\n".join(truncated)
-    
-    return context_text
+    if reserved_tokens is None:
+        reserved_tokens = reserved_prompt_tokens(
+            prompt_store.get_config().get("guided_system_prompt", ""), query_text
+        )
+    lines, budget = fit_context(
+        [f"Memory: {text}" for text in memory_texts],
+        [f"{row.role.capitalize()}: {row.text}" for row in rows if row.kind == _CONTEXT_MESSAGE],
+        reserved_tokens=reserved_tokens,
+    )
+    return "\n".join(lines), budget
+
+
+def get_context(
+    user_id: UUID,
+    session_id: UUID,
+    condition: str,
+    db: Session,
+    query_text: Optional[str] = None,
+) -> str:
+    """Context block only; see build_context."""
+    return build_context(user_id, session_id, condition, db, query_text=query_text)[0]
 
 
 def get_all_existing_memories(user_id: UUID, session_id: Optional[UUID], db: Session) -> List[str]:
@@ -135,6 +242,11 @@ def _normalize_memory_text(text: str) -> str:
     return " ".join(text.split())
 
 
+def memory_text_hash(text: str) -> str:
+    """Hash of the normalized text, stored in Memory.norm_hash for duplicate checks"""
+    return hashlib.sha256(_normalize_memory_text(text).encode("utf-8")).hexdigest()
+
+
 def check_memory_duplicate(
     new_memory_text: str,
     user_id: UUID,
@@ -143,38 +255,24 @@ def check_memory_duplicate(
 ) -> bool:
     """
     Check if a memory is a duplicate of an existing memory.
-    Uses simple exact match after normalization.
+    Uses simple exact match after normalization, as one indexed existence query on norm_hash.
     
     Returns True if duplicate exists, False otherwise.
     """
     normalized_user_id = _ensure_uuid(user_id)
     normalized_session_id = _ensure_uuid(session_id)
     
-    # Normalize the new memory text
-    normalized_new = _normalize_memory_text(new_memory_text)
-    
-    # Get all existing memories (both active and inactive)
+    # Check existing memories (both active and inactive)
     # For session modes, check only within current session
     # For persistent modes, check across all user memories
+    query = select(Memory.memory_id).where(
+        Memory.user_id == normalized_user_id,
+        Memory.norm_hash == memory_text_hash(new_memory_text),
+    )
     if normalized_session_id:
-        # Session mode: check only within this session
-        existing_memories = db.query(Memory).filter(
-            Memory.user_id == normalized_user_id,
-            Memory.session_id == normalized_session_id
-        ).all()
-    else:
-        # Persistent mode: check across all user memories
-        existing_memories = db.query(Memory).filter(
-            Memory.user_id == normalized_user_id
-        ).all()
-    
-    # Check for exact match
-    for existing_memory in existing_memories:
-        normalized_existing = _normalize_memory_text(existing_memory.text)
-        if normalized_new == normalized_existing:
-            return True
-    
-    return False
+        query = query.where(Memory.session_id == normalized_session_id)
+
+    return db.execute(select(query.exists())).scalar()
 
 
 def get_memory_recap(
@@ -216,6 +314,49 @@ def get_memory_recap(
     return q.order_by(desc(Memory.created_at)).all()
 
 
+_PENDING_INDEX_KEY = "pending_memory_index"
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_index_changes(db: Session):
+    for user_id, version, change in db.info.pop(_PENDING_INDEX_KEY, []):
+        if change is None:
+            memory_index.invalidate(user_id)
+        else:
+            memory_index.apply(user_id, version, *change)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_index_changes(db: Session, previous_transaction):
+    db.info.pop(_PENDING_INDEX_KEY, None)
+
+
+def _bump_memory_version(db: Session, user_id: UUID, change):
+    version = db.execute(
+        update(User)
+        .where(User.user_id == user_id)
+        .values(memory_version=User.memory_version + 1)
+        .returning(User.memory_version)
+    ).scalar()
+    if version is not None:
+        db.info.setdefault(_PENDING_INDEX_KEY, []).append((user_id, version, change))
+
+
+def _memory_changed(db: Session, user_id: UUID, upserted=(), removed=(), reindex: bool = False):
+    """
+    Bump the user's memory_version (the cross-worker cache token) in the same
+    transaction as the memory write and drop this worker's cached memory block. Once
+    the transaction commits, the change is applied to the user's memory_index at the
+    committed version: ``upserted`` are (memory_id, text) now active, ``removed`` ids
+    are no longer active; ``reindex`` drops the index.
+    """
+    memory_context_cache.invalidate(user_id)
+    if reindex:
+        memory_index.invalidate(user_id)
+    change = None if reindex else (list(upserted), list(removed))
+    run_or_defer(db, lambda: _bump_memory_version(db, user_id, change))
+
+
 def create_memory_candidate(
     user_id: UUID,
     session_id: Optional[UUID],
@@ -229,23 +370,112 @@ def create_memory_candidate(
     normalized_session_id = _ensure_uuid(session_id)
 
     memory = Memory(
+        memory_id=uuid.uuid4(),  # known before flush, for memory_index
         user_id=normalized_user_id,
         session_id=normalized_session_id,
         text=text[:200],  # Enforce 200 char limit
+        norm_hash=memory_text_hash(text[:200]),
         is_active=is_active,
         phase=phase if phase in (1, 2, 3) else None,
     )
     db.add(memory)
-    db.commit()
-    db.refresh(memory)
+    _memory_changed(
+        db, normalized_user_id, upserted=[(memory.memory_id, memory.text)] if is_active else ()
+    )
+    commit_or_defer(db, memory)
     return memory
 
 
+def ingest_candidates(
+    user_id: UUID,
+    session_id: Optional[UUID],
+    texts: List[str],
+    db: Session,
+    phase: Optional[int] = None,
+    active: bool = False,
+    near_dup_threshold: Optional[float] = None,
+) -> List[Memory]:
+    """
+    Store a batch of extracted memory texts, skipping duplicates of existing memories
+    (same scope as check_memory_duplicate) and of earlier texts in the batch.
+
+    Besides exact matches on normalized text, texts whose MinHash similarity to a
+    memory in scope (or an earlier kept text) reaches ``near_dup_threshold`` (default
+    MEMORY_NEAR_DUP_THRESHOLD, which is 0: off) are skipped; see memory_similarity.
+
+    Costs one query for the existing memories in scope and one multi-row
+    INSERT ... RETURNING, committed together (deferred to the end of the turn inside
+    turn_unit_of_work). The returned rows are detached from ``db`` so reading them does
+    not reload each row after the commit.
+    """
+    normalized_user_id = _ensure_uuid(user_id)
+    normalized_session_id = _ensure_uuid(session_id)
+    if near_dup_threshold is None:
+        near_dup_threshold = MEMORY_NEAR_DUP_THRESHOLD
+
+    # Dedupe within the batch, keyed like check_memory_duplicate
+    pending = {}
+    for text in texts:
+        pending.setdefault(memory_text_hash(text), text)
+    if not pending:
+        return []
+
+    if near_dup_threshold > 0:
+        query = select(Memory.norm_hash, Memory.text).where(Memory.user_id == normalized_user_id)
+    else:
+        query = select(Memory.norm_hash, Memory.text).where(
+            Memory.user_id == normalized_user_id,
+            Memory.norm_hash.in_(list(pending)),
+        )
+    if normalized_session_id:
+        query = query.where(Memory.session_id == normalized_session_id)
+    existing = db.execute(query).all()
+    for existing_hash, _ in existing:
+        pending.pop(existing_hash, None)
+    if not pending:
+        return []
+
+    if near_dup_threshold > 0:
+        duplicate = near_duplicate_mask(
+            signatures(pending.values()), signature_cache.matrix(existing), near_dup_threshold
+        )
+        pending = {
+            norm_hash: text
+            for (norm_hash, text), is_duplicate in zip(pending.items(), duplicate)
+            if not is_duplicate
+        }
+        if not pending:
+            return []
+
+    rows = [
+        {
+            "user_id": normalized_user_id,
+            "session_id": normalized_session_id,
+            "text": text[:200],  # Enforce 200 char limit
+            "norm_hash": memory_text_hash(text[:200]),
+            "is_active": active,
+            "phase": phase if phase in (1, 2, 3) else None,
+        }
+        for text in pending.values()
+    ]
+    memories = db.scalars(insert(Memory).returning(Memory), rows).all()
+    for memory in memories:
+        db.expunge(memory)
+    _memory_changed(
+        db,
+        normalized_user_id,
+        upserted=[(memory.memory_id, memory.text) for memory in memories] if active else (),
+    )
+    commit_or_defer(db)
+    return memories
+
+
 def approve_memory(memory_id: UUID, db: Session) -> Memory:
     """Approve a memory candidate (set is_active=True)"""
     memory = db.query(Memory).filter(Memory.memory_id == memory_id).first()
     if memory:
         memory.is_active = True
+        _memory_changed(db, memory.user_id, upserted=[(memory.memory_id, memory.text)])
         db.commit()
         db.refresh(memory)
     return memory
@@ -256,6 +486,7 @@ def delete_memory(memory_id: UUID, db: Session) -> bool:
     memory = db.query(Memory).filter(Memory.memory_id == memory_id).first()
     if memory:
         db.delete(memory)
+        _memory_changed(db, memory.user_id, removed=[memory.memory_id])
         db.commit()
         return True
     return False
@@ -266,9 +497,16 @@ def update_memory(memory_id: UUID, text: Optional[str], is_active: Optional[bool
     memory = db.query(Memory).filter(Memory.memory_id == memory_id).first()
     if memory:
         if text is not None:
+            if text[:200] != memory.text:
+                memory.user_edited = True
             memory.text = text[:200]  # Enforce 200 char limit
+            memory.norm_hash = memory_text_hash(memory.text)
         if is_active is not None:
             memory.is_active = is_active
+        if memory.is_active:
+            _memory_changed(db, memory.user_id, upserted=[(memory.memory_id, memory.text)])
+        else:
+            _memory_changed(db, memory.user_id, removed=[memory.memory_id])
         db.commit()
         db.refresh(memory)
     return memory
@@ -277,6 +515,16 @@ def update_memory(memory_id: UUID, text: Optional[str], is_active: Optional[bool
 def cleanup_session_memories(session_id: UUID, db: Session):
     """Delete all memories associated with a session (for ephemeral modes)"""
     normalized_session_id = _ensure_uuid(session_id)
+    user_id = db.query(SessionModel.user_id).filter(
+        SessionModel.session_id == normalized_session_id
+    ).scalar()
     db.query(Memory).filter(Memory.session_id == normalized_session_id).delete()
+    if user_id is not None:
+        _memory_changed(db, user_id, reindex=True)
+    db.execute(
+        update(SessionModel)
+        .where(SessionModel.session_id == normalized_session_id)
+        .values(memories_cleared_at=func.now())
+    )
     db.commit()
 
@@ -0,0 +1,88 @@
+"""
+Precomputed phase-end memory recaps.
+
+The recap screen (GET /memory/recap) is remounted on every Qualtrics iframe reload,
+and reloads cluster at phase boundaries. The recap for (session, phase) is stored as
+the serialized response body in ``memory_recap_snapshots``, stamped with the user's
+``memory_version``. Any memory write for the user bumps that version, so a snapshot is
+served only while the user's memories are unchanged; a stale or missing snapshot is
+rebuilt from ``memory_manager.get_memory_recap`` on the next read.
+
+Snapshots are written when a phase completes (after the last turn's memory
+extraction, and again on /chat/advance) and lazily on a miss.
+"""
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import memory_manager, schemas
+from .models import MemoryRecapSnapshot, User
+
+_recap_adapter = TypeAdapter(List[schemas.MemoryResponse])
+
+
+def get_snapshot(db: Session, user_id: UUID, session_id: UUID, phase: int) -> Optional[bytes]:
+    """Serialized recap if a snapshot exists and the user's memories have not changed since."""
+    payload = db.execute(
+        select(MemoryRecapSnapshot.payload)
+        .join(User, User.user_id == MemoryRecapSnapshot.user_id)
+        .where(
+            MemoryRecapSnapshot.session_id == session_id,
+            MemoryRecapSnapshot.phase == phase,
+            MemoryRecapSnapshot.user_id == user_id,
+            MemoryRecapSnapshot.memory_version == User.memory_version,
+        )
+    ).scalar()
+    return payload.encode("utf-8") if payload is not None else None
+
+
+def build_snapshot(
+    db: Session,
+    user_id: UUID,
+    session_id: UUID,
+    phase: int,
+    condition_id: str,
+    memory_version: Optional[int] = None,
+) -> bytes:
+    """
+    Compute the recap, store it for (session, phase) and return the serialized body.
+
+    ``memory_version`` is the version the recap was read at; it is looked up when not
+    given. Commits; a concurrent writer storing the same key first is not an error.
+    """
+    if memory_version is None:
+        memory_version = db.execute(
+            select(User.memory_version).where(User.user_id == user_id)
+        ).scalar() or 0
+    rows = memory_manager.get_memory_recap(user_id, session_id, phase, condition_id, db)
+    body = _recap_adapter.dump_json([schemas.MemoryResponse.model_validate(row) for row in rows])
+    values = {"user_id": user_id, "memory_version": memory_version, "payload": body.decode("utf-8")}
+    try:
+        updated = db.execute(
+            update(MemoryRecapSnapshot)
+            .where(MemoryRecapSnapshot.session_id == session_id, MemoryRecapSnapshot.phase == phase)
+            .values(**values)
+        ).rowcount
+        if not updated:
+            db.add(MemoryRecapSnapshot(session_id=session_id, phase=phase, **values))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    return body
+
+
+def snapshot_phase_end(db: Session, user_id: UUID, session_id: UUID, phase: Optional[int], condition_id: str):
+    """Best-effort snapshot when ``phase`` completes; failures only cost a rebuild on read."""
+    if phase not in (1, 2, 3):
+        return
+    try:
+        if get_snapshot(db, user_id, session_id, phase) is not None:
+            return
+        build_snapshot(db, user_id, session_id, phase, condition_id)
+    except Exception as e:
+        db.rollback()
+        print(f"[Memory] recap snapshot failed: {e}")
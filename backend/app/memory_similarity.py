@@ -0,0 +1,214 @@
+"""
+Near-duplicate detection for memories with MinHash signatures held in NumPy arrays.
+
+A memory's shingles are the character trigrams of the words of its normalized text
+(lowercased, punctuation dropped, "n't" spelled "not"; only "user" and articles are
+skipped). Every shingle is prefixed with the text's guard key: whether it is negated,
+its words with a negating prefix (un-, dis-, in-, ...), its numbers and its names
+(capitalised words after the first). "User has no kids", "User is unhappy", "two
+sisters" or "a sister named Hanna" therefore share no shingles with "User has kids",
+"User is happy", "three sisters" or "a sister named Anna", however similar the rest of
+the wording. The guard is deliberately coarse: a name or prefixed word on only one
+side also keeps two texts apart.
+
+Each text gets a fixed-length MinHash signature; the fraction of equal positions
+between two signatures estimates the Jaccard similarity of their shingle sets.
+Comparing a candidate with all of a user's memories is one vectorized comparison
+against the signature matrix.
+
+The similarity is lexical: rewrites that keep most words ("User has a dog named
+Rex" / "User has a dog called Rex") score high, paraphrases that change the words
+("loves Thanksgiving" / "favorite holiday is Thanksgiving") do not. Facts that differ
+in another short lowercase word ("likes tea" / "likes yoga") can still score fairly
+high, so near-duplicate skipping at ingestion is opt-in (MEMORY_NEAR_DUP_THRESHOLD).
+"""
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# Ingestion drops candidates at least this similar to an existing memory; 0 (default) disables.
+MEMORY_NEAR_DUP_THRESHOLD = float(os.getenv("MEMORY_NEAR_DUP_THRESHOLD", "0"))
+
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+# Signatures are compared across workers and runs, so the permutations are fixed.
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20261017)
+_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)[:, None]
+_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)[:, None]
+
+_SIGNATURE_CACHE_SIZE = 50000
+
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_NOT_RE = re.compile(r"n['\u2019]t\b", re.IGNORECASE)
+_SKIPPED = frozenset(("user", "a", "an", "the"))
+_NEGATIONS = frozenset("no not never none nobody nothing neither nor without cannot".split())
+_NUMBER_WORDS = frozenset(
+    """
+    zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen
+    fifteen sixteen seventeen eighteen nineteen twenty thirty forty fifty sixty seventy
+    eighty ninety hundred thousand million first second third fourth fifth sixth seventh
+    eighth ninth tenth once twice both single dozen
+    """.split()
+)
+# "unhappy", "dislikes", "inactive", "nonsmoker": the prefix flips the word's meaning
+_NEGATING_PREFIX_RE = re.compile(r"(?:un|dis|non|in|im|ir|il)[a-z]{3,}")
+
+
+def _tokens(text: str) -> list[str]:
+    """Words of ``text`` with their case kept and "n't" spelled "not"."""
+    return _WORD_RE.findall(_NOT_RE.sub(" not", text or ""))
+
+
+def guard_key(tokens: list[str]) -> str:
+    """Negation, prefix-negated words, numbers and names of a fact; texts with different keys never match."""
+    words = [token.lower() for token in tokens]
+    negated = any(w in _NEGATIONS for w in words)
+    prefixed = sorted({w for w in words if _NEGATING_PREFIX_RE.fullmatch(w)})
+    numbers = sorted({w for w in words if w in _NUMBER_WORDS or any(c.isdigit() for c in w)})
+    names = sorted({
+        token.lower()
+        for token in tokens[1:]
+        if len(token) > 1 and token[0].isupper() and token.lower() not in _SKIPPED
+    })
+    return " ".join((["not"] if negated else []) + prefixed + numbers + names)
+
+
+def shingles(text: str) -> set[str]:
+    tokens = _tokens(text)
+    key = guard_key(tokens)
+    words = [token.lower() for token in tokens]
+    grams = set()
+    for word in words:
+        if word in _SKIPPED:
+            continue
+        padded = f" {word} "
+        grams.update(
+            f"{key}|{padded[i:i + SHINGLE_SIZE]}" for i in range(len(padded) - SHINGLE_SIZE + 1)
+        )
+    if not grams:
+        # No words at all: fall back to the raw text so it only matches itself.
+        grams.add((text or "").strip().lower())
+    return grams
+
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of the text's shingles."""
+    hashes = np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in shingles(text)), dtype=np.uint64
+    )
+    return ((_A * hashes[None, :] + _B) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def signatures(texts) -> np.ndarray:
+    """Signature matrix with one row per text."""
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    return np.vstack([signature(text) for text in texts])
+
+
+class SignatureCache:
+    """Bounded LRU of norm_hash -> signature, so stored memories are hashed once per worker."""
+
+    def __init__(self, max_entries: int = _SIGNATURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, rows) -> np.ndarray:
+        """Signature matrix for ``rows`` of (norm_hash, text)."""
+        rows = list(rows)
+        found = []
+        with self._lock:
+            for norm_hash, _ in rows:
+                sig = self._entries.get(norm_hash) if norm_hash else None
+                if sig is not None:
+                    self._entries.move_to_end(norm_hash)
+                found.append(sig)
+        missing = [i for i, sig in enumerate(found) if sig is None]
+        for i in missing:
+            found[i] = signature(rows[i][1])
+        with self._lock:
+            for i in missing:
+                if rows[i][0]:
+                    self._entries[rows[i][0]] = found[i]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return np.vstack(found) if found else np.empty((0, NUM_PERM), dtype=np.uint32)
+
+
+signature_cache = SignatureCache()
+
+
+def similarity(sig: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of one signature against every row of ``matrix``."""
+    if matrix.shape[0] == 0:
+        return np.empty(0)
+    return (matrix == sig[None, :]).mean(axis=1)
+
+
+def near_duplicate_mask(candidates: np.ndarray, existing: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    For each candidate signature, whether it is at least ``threshold`` similar to an
+    existing signature or to an earlier candidate that is kept.
+    """
+    count = candidates.shape[0]
+    duplicate = np.zeros(count, dtype=bool)
+    if count == 0:
+        return duplicate
+    if existing.shape[0]:
+        # (candidates, existing) similarities in one broadcast comparison
+        scores = (candidates[:, None, :] == existing[None, :, :]).mean(axis=2)
+        duplicate |= (scores >= threshold).any(axis=1)
+    within = (candidates[:, None, :] == candidates[None, :, :]).mean(axis=2)
+    for i in range(1, count):
+        if not duplicate[i]:
+            earlier = within[i, :i] >= threshold
+            duplicate[i] = bool((earlier & ~duplicate[:i]).any())
+    return duplicate
+
+
+def cluster(matrix: np.ndarray, threshold: float, bands: int = 32) -> list[list[int]]:
+    """
+    Group rows whose signatures are at least ``threshold`` similar (transitively).
+
+    Locality-sensitive hashing over ``bands`` bands proposes candidate pairs; each pair
+    is confirmed on the full signature. Returns groups of two or more row indexes.
+    """
+    count = matrix.shape[0]
+    parent = list(range(count))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows_per_band = max(1, NUM_PERM // bands)
+    checked = set()
+    for start in range(0, NUM_PERM, rows_per_band):
+        buckets: dict[bytes, list[int]] = {}
+        band = np.ascontiguousarray(matrix[:, start:start + rows_per_band])
+        for i in range(count):
+            buckets.setdefault(band[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            for i, a in enumerate(members):
+                # Confirm against every later bucket member in one comparison.
+                others = [b for b in members[i + 1:] if (a, b) not in checked and find(a) != find(b)]
+                if not others:
+                    continue
+                checked.update((a, b) for b in others)
+                for b, score in zip(others, similarity(matrix[a], matrix[others])):
+                    if score >= threshold:
+                        parent[find(b)] = find(a)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1]
@@ -1,10 +1,29 @@
-from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey, JSON, Integer
+from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey, JSON, Integer, BigInteger, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
+import threading
+import time
 import uuid
 from .database import Base
 
+_sequence_lock = threading.Lock()
+_last_sequence = 0
+
+
+def next_sequence() -> int:
+    """
+    Strictly increasing ordering key for messages and events.
+
+    Nanoseconds since the epoch, bumped by one on ties, so rows written in the same
+    commit (user + assistant message) still get distinct, insertion-ordered values.
+    Monotonic within a process; across workers it follows the shared wall clock.
+    """
+    global _last_sequence
+    with _sequence_lock:
+        _last_sequence = max(time.time_ns(), _last_sequence + 1)
+        return _last_sequence
+
 
 class User(Base):
     __tablename__ = "users"
@@ -14,6 +33,10 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     condition_id = Column(String(50), nullable=False)  # SESSION_AUTO, PERSISTENT_AUTO, PERSISTENT_USER
     qualtrics_id = Column(String(255), unique=True, nullable=True, index=True)  # Qualtrics Response ID for Qualtrics participants
+    # Bumped on every memory write; stamps the per-worker memory context cache
+    memory_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # memory_version the consolidation worker last processed (see memory_consolidation)
+    memory_consolidated_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -33,12 +56,25 @@ class Session(Base):
     # is gated on the condition the session ran under, not whatever the user was switched to later.
     # Nullable so legacy session rows (pre-migration) keep working with a runtime fallback.
     condition_id = Column(String(50), nullable=True)
+    # When the SESSION_AUTO memory sweeper last cleared this session (see session_cleanup),
+    # or when it was ended without cleanup (Qualtrics re-auth, pre-sweeper rows);
+    # NULL = pending once the session has ended or been abandoned.
+    memories_cleared_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
     user = relationship("User", back_populates="sessions")
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
     memories = relationship("Memory", back_populates="session")
 
+    __table_args__ = (
+        # Active-session lookups: user_id + ended_at IS NULL, newest first.
+        Index("ix_sessions_user_ended_started", "user_id", "ended_at", "started_at"),
+        # SESSION_AUTO cleanup sweeper: sessions not cleared yet, oldest ended first.
+        Index("ix_sessions_condition_cleared_ended", "condition_id", "memories_cleared_at", "ended_at"),
+        # Idle-session expiry: open sessions, oldest first.
+        Index("ix_sessions_ended_started", "ended_at", "started_at"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -48,10 +84,19 @@ class Message(Base):
     role = Column(String(20), nullable=False)  # "user" or "assistant"
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Ordering key: created_at has one-second resolution on SQLite, so rows from the same
+    # commit tie. Nullable only for rows predating the column (backfilled by migration).
+    seq = Column(BigInteger, nullable=True, default=next_sequence)
 
     # Relationships
     session = relationship("Session", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_session_seq", "session_id", "seq"),
+        # last_assistant and per-role counts in /chat.
+        Index("ix_messages_session_role_seq", "session_id", "role", "seq"),
+    )
+
 
 class Memory(Base):
     __tablename__ = "memories"
@@ -63,6 +108,10 @@ class Memory(Base):
     # Study phase (1–3) when the memory was created; NULL for legacy rows or manual creates without phase.
     phase = Column(Integer, nullable=True)
     is_active = Column(Boolean, default=False, nullable=False)  # False = candidate, True = approved
+    # sha256 of memory_manager._normalize_memory_text(text); kept in sync by memory_manager
+    norm_hash = Column(String(64), nullable=True)
+    # Text changed by the participant through /memory; consolidation never merges these
+    user_edited = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -70,6 +119,48 @@ class Memory(Base):
     user = relationship("User", back_populates="memories")
     session = relationship("Session", back_populates="memories")
 
+    __table_args__ = (
+        # Session-scoped reads (candidates, dedup, SESSION_AUTO recap), newest first.
+        Index("ix_memories_user_session_active_created", "user_id", "session_id", "is_active", "created_at"),
+        # User-wide active memories (PERSISTENT_* context and recap), newest first.
+        Index("ix_memories_user_active_created", "user_id", "is_active", "created_at"),
+        # Duplicate checks on normalized text.
+        Index("ix_memories_user_session_norm_hash", "user_id", "session_id", "norm_hash"),
+    )
+
+
+class MemoryMergeSource(Base):
+    """
+    Provenance of a consolidated memory: one row per original memory merged into it.
+    The originals are removed from ``memories``, so their text and metadata are kept here.
+    """
+    __tablename__ = "memory_merge_sources"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    memory_id = Column(UUID(as_uuid=True), ForeignKey("memories.memory_id", ondelete="CASCADE"), nullable=False, index=True)
+    source_memory_id = Column(UUID(as_uuid=True), nullable=False)
+    text = Column(Text, nullable=False)
+    session_id = Column(UUID(as_uuid=True), nullable=True)
+    phase = Column(Integer, nullable=True)
+    source_created_at = Column(DateTime(timezone=True), nullable=True)
+    merge_method = Column(String(20), nullable=False)  # "llm" or "rule"
+    merged_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class MemoryRecapSnapshot(Base):
+    """
+    Serialized phase-end recap (GET /memory/recap body) for one session and phase.
+    Valid while ``memory_version`` matches the user's; see memory_recap.
+    """
+    __tablename__ = "memory_recap_snapshots"
+
+    session_id = Column(UUID(as_uuid=True), ForeignKey("sessions.session_id", ondelete="CASCADE"), primary_key=True)
+    phase = Column(Integer, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    memory_version = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON list of MemoryResponse
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class Event(Base):
     __tablename__ = "events"
@@ -77,12 +168,55 @@ class Event(Base):
     event_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True)
     type = Column(String(50), nullable=False)  # message_sent, memory_approved, etc.
+    # Copy of payload_json["session_id"] for session-scoped events, promoted to a column so
+    # "latest event of type X for session Y" is an index seek. NULL for events without a session.
+    session_id = Column(UUID(as_uuid=True), nullable=True)
     payload_json = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    seq = Column(BigInteger, nullable=True, default=next_sequence)  # Ordering key; see Message.seq
 
     # Relationships
     user = relationship("User", back_populates="events")
 
+    __table_args__ = (
+        Index("ix_events_user_type_session_seq", "user_id", "type", "session_id", "seq"),
+    )
+
+
+class EventArchive(Base):
+    """
+    Cold storage for events removed from ``events`` by compaction (compact_progress_events.py).
+    Same columns as Event, without foreign keys, so archived rows survive user/session deletes.
+    """
+    __tablename__ = "events_archive"
+
+    event_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    type = Column(String(50), nullable=False)
+    session_id = Column(UUID(as_uuid=True), nullable=True)
+    payload_json = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    seq = Column(BigInteger, nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SessionProgress(Base):
+    """
+    Latest single-block progress state for a session (one row per session).
+
+    Materialized from ``progress_update`` events so progress reads are a primary-key
+    lookup. The events table stays the append-only audit log; this row is rewritten
+    on every progress update and can be rebuilt from events (backfill_session_progress.py).
+    """
+    __tablename__ = "session_progress"
+
+    session_id = Column(UUID(as_uuid=True), ForeignKey("sessions.session_id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    state_json = Column(JSON, nullable=False)  # Same shape as the progress_update event payload
+    # Bumped on every write; lets per-process progress caches detect writes from other workers.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class SurveyResponse(Base):
     __tablename__ = "survey_responses"
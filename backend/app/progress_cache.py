@@ -0,0 +1,88 @@
+"""
+In-process write-through cache for single-block progress state.
+
+Entries are keyed by session and stamped with the ``session_progress.version`` they
+were read or written at. Every write bumps the version in the database, so an entry
+cached by this worker is detected as stale as soon as another worker has written:
+
+- reads compare the cached stamp with the row's current version (a single-column
+  primary-key probe) and skip loading/decoding the state when they match; a probe is
+  skipped entirely when the same DB session already saw that version;
+- writes compare-and-set on the cached version, so the common case is one UPDATE
+  with no preceding SELECT.
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+
+PROGRESS_CACHE_SIZE = int(os.getenv("PROGRESS_CACHE_SIZE", "4096"))
+
+
+@dataclass(frozen=True)
+class CachedProgress:
+    version: int
+    user_id: UUID
+    state: dict
+
+
+class ProgressCache:
+    """Bounded LRU of session_id -> CachedProgress. Thread-safe; values are deep-copied."""
+
+    def __init__(self, max_entries: int = PROGRESS_CACHE_SIZE):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[UUID, CachedProgress]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, session_id: UUID) -> CachedProgress | None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id: UUID, version: int, user_id: UUID, state: dict):
+        if self.max_entries == 0:
+            return
+        entry = CachedProgress(version=version, user_id=user_id, state=copy.deepcopy(state))
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: UUID):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def record(self, outcome: str):
+        """Count a lookup outcome: "hit", "miss" or "stale"."""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "stale":
+                self.stale += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+            }
+
+
+progress_cache = ProgressCache()
@@ -0,0 +1,82 @@
+"""
+Read-only projections for the hot list endpoints.
+
+The message and memory lists (/session/{id}/messages, /memory/{user_id},
+/memory/candidates/..., and the candidates returned with every /chat turn) never
+modify what they load. Loading ORM objects for them costs identity-map tracking,
+instance state and a ``model_validate`` per row. Here only the response columns are
+selected into tuple-backed rows (NamedTuple), and the list is serialized to JSON
+in one ``pydantic_core.to_json`` call. The output is byte-for-byte what the
+``schemas.*Response`` models produce, so the routes keep their ``response_model``
+for the API docs and return the body directly.
+"""
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+from uuid import UUID
+
+from pydantic_core import to_json
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session
+
+from .models import Memory, Message
+
+
+class MemoryView(NamedTuple):
+    """Columns of schemas.MemoryResponse, in field order."""
+    memory_id: UUID
+    user_id: UUID
+    session_id: Optional[UUID]
+    text: str
+    phase: Optional[int]
+    is_active: bool
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+
+class MessageView(NamedTuple):
+    """Columns of schemas.MessageResponse, in field order."""
+    msg_id: UUID
+    session_id: UUID
+    role: str
+    content: str
+    created_at: datetime
+
+
+_MEMORY_COLUMNS = [getattr(Memory, field) for field in MemoryView._fields]
+_MESSAGE_COLUMNS = [getattr(Message, field) for field in MessageView._fields]
+
+
+def memories(db: Session, user_id: UUID, session_id: Optional[UUID] = None) -> List[MemoryView]:
+    """All of a user's memories (optionally one session's), newest first."""
+    query = select(*_MEMORY_COLUMNS).where(Memory.user_id == user_id)
+    if session_id:
+        query = query.where(Memory.session_id == session_id)
+    rows = db.execute(query.order_by(desc(Memory.created_at))).all()
+    return [MemoryView._make(row) for row in rows]
+
+
+def memory_candidates(db: Session, user_id: UUID, session_id: UUID) -> List[MemoryView]:
+    """Inactive candidates for a session, newest first (memory_manager.get_memory_candidates)."""
+    rows = db.execute(
+        select(*_MEMORY_COLUMNS)
+        .where(
+            Memory.user_id == user_id,
+            Memory.session_id == session_id,
+            Memory.is_active == False,
+        )
+        .order_by(desc(Memory.created_at))
+    ).all()
+    return [MemoryView._make(row) for row in rows]
+
+
+def session_messages(db: Session, session_id: UUID) -> List[MessageView]:
+    """A session's messages in conversation order."""
+    rows = db.execute(
+        select(*_MESSAGE_COLUMNS).where(Message.session_id == session_id).order_by(Message.seq)
+    ).all()
+    return [MessageView._make(row) for row in rows]
+
+
+def dump_json(rows) -> bytes:
+    """JSON array of view rows as objects, formatted like the pydantic response models."""
+    return to_json([row._asdict() for row in rows])
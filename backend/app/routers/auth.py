@@ -28,14 +28,17 @@ def _opening_for_phase_with_order(phase: int, orders: dict[str, list[int]]) -> s
     return prompt_builder.get_phase_opening_message_for_question(phase, prompts[order[0]])
 
 
-def _extract_session_phase_map(db: Session, user_id: UUID) -> dict[str, int]:
+def _extract_session_phase_map(db: Session, user_id: UUID, session_ids: list[UUID]) -> dict[str, int]:
+    if not session_ids:
+        return {}
     events = (
         db.query(models.Event)
         .filter(
             models.Event.user_id == user_id,
             models.Event.type == QUALTRICS_PHASE_EVENT,
+            models.Event.session_id.in_(session_ids),
         )
-        .order_by(models.Event.created_at.asc())
+        .order_by(models.Event.seq.asc())
         .all()
     )
     session_phase_map: dict[str, int] = {}
@@ -65,7 +68,9 @@ def _find_active_session_for_phase(db: Session, user_id: UUID, phase: int) -> Se
         .order_by(SessionModel.started_at.desc())
         .all()
     )
-    session_phase_map = _extract_session_phase_map(db, user_id)
+    session_phase_map = _extract_session_phase_map(
+        db, user_id, [active.session_id for active in active_sessions]
+    )
     for active in active_sessions:
         if session_phase_map.get(str(active.session_id)) == phase:
             return active
@@ -78,6 +83,7 @@ def _tag_session_with_phase(db: Session, user_id: UUID, session_id: UUID, phase:
         QUALTRICS_PHASE_EVENT,
         user_id,
         {"session_id": str(session_id), "phase": phase},
+        session_id=session_id,
     )
 
 
@@ -296,6 +302,9 @@ def qualtrics_authenticate(
         if new_session and active.session_id == new_session.session_id:
             continue
         active.ended_at = datetime.utcnow()
+        # Re-authentication keeps the session's memories; stamp it so the
+        # SESSION_AUTO sweeper does not treat it as pending.
+        active.memories_cleared_at = active.ended_at
         db.commit()
         logging.log_session_ended(db, user.user_id, active.session_id)
 
@@ -334,6 +343,7 @@ def qualtrics_authenticate(
             "phase": phase,
             "resumed_session": resumed_session,
         },
+        session_id=new_session.session_id,
     )
     
     return schemas.QualtricsAuthenticateResponse(
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session as DBSession
-from ..database import get_db, SessionLocal
-from .. import schemas, models, memory_manager, prompt_builder, logging
+from ..database import get_db, SessionLocal, commit_or_defer, turn_unit_of_work
+from .. import schemas, models, memory_manager, memory_consolidation, memory_recap, prompt_builder, read_models, logging
 from ..models import Message, Session as SessionModel
-from ..genai_client import call_genai, sanitize_companion_public_output, stream_genai
+from ..genai_client import StreamSanitizer, call_genai, stream_genai
 from uuid import UUID
 import asyncio
 import os
@@ -31,6 +31,8 @@ GUIDED_DEBUG_LOGS = (os.getenv("GUIDED_DEBUG_LOGS", "false").strip().lower() ==
 SKIP_RECONCILIATION_ENABLED = (
     os.getenv("SKIP_RECONCILIATION_ENABLED", "true").strip().lower() == "true"
 )
+# Debugging aid: commit after every log/insert inside /chat instead of once per turn.
+CHAT_EAGER_COMMITS = (os.getenv("CHAT_EAGER_COMMITS", "false").strip().lower() == "true")
 
 
 def _is_short_valid_answer(user_message: str, effort_result: dict | None) -> bool:
@@ -56,6 +58,7 @@ async def _run_memory_extraction_limited(
     user_msg: str,
     cond: str,
     memory_phase: int | None,
+    recap_phase: int | None = None,
 ):
     acquired = False
     try:
@@ -71,25 +74,26 @@ async def _run_memory_extraction_limited(
         memory_candidates_text = await prompt_builder.extract_memories_from_conversation(
             user_msg, existing_memories
         )
-        for candidate_text in memory_candidates_text:
-            if not memory_manager.check_memory_duplicate(candidate_text, user_id, session_id, bg_db):
-                # Auto-activate extracted memories for every condition. For
-                # SESSION_AUTO and PERSISTENT_AUTO this matches prior behavior.
-                # For PERSISTENT_USER this implements the 4/21 feedback ("memory
-                # could be auto-saved, with the option for users to select which
-                # memories to delete") and resolves the 5/7 desync between the
-                # end-of-phase recap (active-only) and the Memory tab (all):
-                # both views now agree because every extracted memory starts
-                # active and the user can delete what they don't want.
-                auto_activate = cond in [
-                    "SESSION_AUTO",
-                    "PERSISTENT_AUTO",
-                    "PERSISTENT_USER",
-                ]
-                memory_manager.create_memory_candidate(
-                    user_id, session_id, candidate_text, bg_db, is_active=auto_activate,
-                    phase=memory_phase,
-                )
+        # Auto-activate extracted memories for every condition. For
+        # SESSION_AUTO and PERSISTENT_AUTO this matches prior behavior.
+        # For PERSISTENT_USER this implements the 4/21 feedback ("memory
+        # could be auto-saved, with the option for users to select which
+        # memories to delete") and resolves the 5/7 desync between the
+        # end-of-phase recap (active-only) and the Memory tab (all):
+        # both views now agree because every extracted memory starts
+        # active and the user can delete what they don't want.
+        auto_activate = cond in [
+            "SESSION_AUTO",
+            "PERSISTENT_AUTO",
+            "PERSISTENT_USER",
+        ]
+        # Duplicates (existing or within the batch) are dropped in one query
+        memory_manager.ingest_candidates(
+            user_id, session_id, memory_candidates_text, bg_db,
+            phase=memory_phase, active=auto_activate,
+        )
+        # The turn completed a phase: snapshot the recap now that its memories are in.
+        memory_recap.snapshot_phase_end(bg_db, user_id, session_id, recap_phase, cond)
     except Exception as e:
         # Avoid recursive DB pressure by not writing another event when pool is saturated.
         print(f"[Chat] bg extraction error: {e}")
@@ -187,6 +191,7 @@ def advance_phase(
         raise HTTPException(status_code=400, detail="No next phase available")
 
     # Advance to next phase and reset prompt/followup tracking
+    completed_phase = current_phase
     next_phase = current_phase + 1
     current_phase = next_phase
     current_prompt_index = 0
@@ -231,6 +236,12 @@ def advance_phase(
     db.commit()
     logging.log_message_received(db, request.user_id, request.session_id, opening_message)
 
+    user = db.get(models.User, request.user_id)
+    if user is not None:
+        memory_recap.snapshot_phase_end(
+            db, request.user_id, request.session_id, completed_phase, user.condition_id
+        )
+
     return schemas.AdvancePhaseResponse(
         phase_status=schemas.PhaseStatus(
             phase=current_phase,
@@ -254,15 +265,13 @@ def _resolve_session_phase(db: DBSession, user_id: UUID, session_id: UUID, expli
         .filter(
             models.Event.user_id == user_id,
             models.Event.type == QUALTRICS_PHASE_EVENT,
+            models.Event.session_id == session_id,
         )
-        .order_by(models.Event.created_at.desc())
+        .order_by(models.Event.seq.desc())
         .all()
     )
-    target_session_id = str(session_id)
     for event in phase_events:
         payload = event.payload_json or {}
-        if str(payload.get("session_id")) != target_session_id:
-            continue
         phase = payload.get("phase")
         try:
             phase_int = int(phase)
@@ -336,7 +345,7 @@ def _update_progress_state(
     preferred_name: str | None = None,
     transition_bridge: bool = False,
 ):
-    """Update progress state and log it."""
+    """Update progress state: rewrite the session_progress row and append the audit event."""
     logging.log_progress_update(
         db,
         user_id,
@@ -359,6 +368,14 @@ def _update_progress_state(
 @router.post("", response_model=schemas.ChatResponse)
 async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
     """Handle chat message and return response"""
+    memory_consolidation.note_activity()
+    # All rows written during the turn (events, progress, messages, memories) are
+    # committed together when the turn finishes; see database.turn_unit_of_work.
+    with turn_unit_of_work(db, enabled=not CHAT_EAGER_COMMITS):
+        return await _chat_turn(request, db)
+
+
+async def _chat_turn(request: schemas.ChatRequest, db: DBSession):
     if _chat_request_semaphore.locked():
         raise HTTPException(
             status_code=503,
@@ -382,10 +399,13 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
     condition = user.condition_id
     
     # Get context based on condition
-    context = memory_manager.get_context(request.user_id, request.session_id, condition, db)
+    context, context_budget = memory_manager.build_context(
+        request.user_id, request.session_id, condition, db, query_text=request.message
+    )
     
     # Determine mode: single-block (no explicit phase) or legacy phase-specific
     is_single_block_mode = request.phase is None
+    completed_phase = None  # set when this turn completes a phase (recap snapshot)
     
     if is_single_block_mode:
         # Single-block mode: use progress state
@@ -468,7 +488,7 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
             content=opening_text,
         )
         db.add(assistant_message_row)
-        db.commit()
+        commit_or_defer(db)
         logging.log_message_received(
             db, request.user_id, request.session_id, opening_text
         )
@@ -518,14 +538,10 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
 
         phase_prompts_for_status = prompt_builder.get_phase_prompts(current_phase)
         total_prompts_for_status = len(phase_prompts_for_status)
-        all_candidates = memory_manager.get_memory_candidates(
-            request.user_id, request.session_id, db
-        )
+        all_candidates = read_models.memory_candidates(db, request.user_id, request.session_id)
         return {
             "response": opening_text,
-            "memory_candidates": [
-                schemas.MemoryResponse.model_validate(m) for m in all_candidates
-            ],
+            "memory_candidates": [m._asdict() for m in all_candidates],
             "phase_status": {
                 "phase": current_phase,
                 "prompts_answered": min(current_prompt_index, total_prompts_for_status),
@@ -541,7 +557,7 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
     last_assistant = (
         db.query(Message)
         .filter(Message.session_id == request.session_id, Message.role == "assistant")
-        .order_by(Message.created_at.desc())
+        .order_by(Message.seq.desc())
         .first()
     )
     
@@ -605,6 +621,7 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
                 request.session_id,
                 user_message=request.message,
                 result=effort_result,
+                context_budget=context_budget.as_dict() if context_budget else None,
             )
     
     # Handle progress state updates for single-block mode
@@ -741,6 +758,7 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
                 # Check if phase is complete
                 if current_prompt_index >= total_prompts:
                     phase_complete = True
+                    completed_phase = current_phase
                     if skip_transition:
                         followup_override = prompt_builder.build_skip_transition_message(None)
                     # IMPORTANT (single-block Qualtrics flow):
@@ -771,7 +789,9 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
                     "assessment_outcome": (effort_result or {}).get("assessment_outcome"),
                     "user_skip": bool((effort_result or {}).get("user_skip")),
                     "needs_followup": bool((effort_result or {}).get("needs_followup")),
+                    "context_budget": context_budget.as_dict() if context_budget else None,
                 },
+                session_id=request.session_id,
             )
 
         # Issue 2 — research instrumentation only.
@@ -962,7 +982,7 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
         content=response_text
     )
     db.add(assistant_message)
-    db.commit()
+    commit_or_defer(db)
     
     # Log message received
     logging.log_message_received(db, request.user_id, request.session_id, response_text)
@@ -980,10 +1000,11 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
                 request.message,
                 condition,
                 extraction_phase,
+                recap_phase=completed_phase,
             )
         )
 
-    all_candidates = memory_manager.get_memory_candidates(request.user_id, request.session_id, db)
+    all_candidates = read_models.memory_candidates(db, request.user_id, request.session_id)
 
     print(
         f"[Chat] TOTAL: {time.time()-t_start:.1f}s | "
@@ -992,14 +1013,30 @@ async def chat(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
 
     return {
         "response": response_text,
-        "memory_candidates": [schemas.MemoryResponse.model_validate(m) for m in all_candidates],
+        "memory_candidates": [m._asdict() for m in all_candidates],
         "phase_status": phase_status,
     }
 
 
+def _stream_events(events: list[tuple[str, str]]):
+    """SSE payloads for StreamSanitizer events."""
+    for kind, text in events:
+        if kind == "reset":
+            yield {"data": json.dumps({"reset": True})}
+        else:
+            yield {"data": json.dumps({"token": text})}
+
+
 @router.post("/stream")
 async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_db)):
-    """Stream chat response using Server-Sent Events"""
+    """
+    Stream chat response using Server-Sent Events.
+
+    Events: {"token": text} appends to the reply as it is generated; {"reset": true}
+    discards what was streamed so far (model planning detected); {"done": true,
+    "candidates": [...]} ends the turn; {"error": ...} on failure.
+    """
+    memory_consolidation.note_activity()
     # Verify user and session
     user = db.query(models.User).filter(models.User.user_id == request.user_id).first()
     if not user:
@@ -1011,7 +1048,9 @@ async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_
     
     # Get context and build messages
     condition = user.condition_id
-    context = memory_manager.get_context(request.user_id, request.session_id, condition, db)
+    context, context_budget = memory_manager.build_context(
+        request.user_id, request.session_id, condition, db, query_text=request.message
+    )
     
     # Log message sent
     logging.log_message_sent(db, request.user_id, request.session_id, request.message)
@@ -1020,7 +1059,7 @@ async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_
     last_assistant = (
         db.query(Message)
         .filter(Message.session_id == request.session_id, Message.role == "assistant")
-        .order_by(Message.created_at.desc())
+        .order_by(Message.seq.desc())
         .first()
     )
     followup_override, effort_result = await prompt_builder.maybe_build_followup_override(
@@ -1034,6 +1073,7 @@ async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_
             request.session_id,
             user_message=request.message,
             result=effort_result,
+            context_budget=context_budget.as_dict() if context_budget else None,
         )
 
     messages = None
@@ -1047,13 +1087,15 @@ async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_
                 response_text = followup_override
                 yield {"data": json.dumps({"token": response_text})}
             else:
-                # Stream from GenAI, then sanitize (reasoning models may emit planning in content).
-                raw = ""
+                # Forward deltas as they arrive, sanitized incrementally (reasoning models may
+                # emit planning before the reply; "reset" tells the client to drop it).
+                sanitizer = StreamSanitizer()
                 async for chunk in stream_genai(messages):
-                    raw += chunk
-                response_text = sanitize_companion_public_output(raw)
-                if response_text:
-                    yield {"data": json.dumps({"token": response_text})}
+                    for event in _stream_events(sanitizer.feed(chunk)):
+                        yield event
+                for event in _stream_events(sanitizer.finish()):
+                    yield event
+                response_text = sanitizer.text
             
             # Save messages to database
             user_message = Message(
@@ -1096,40 +1138,32 @@ async def chat_stream(request: schemas.ChatRequest, db: DBSession = Depends(get_
                     existing_memories
                 )
                 
-                # Filter out duplicates and create memory candidates
-                for candidate_text in memory_candidates_text:
-                    # Check if this is a duplicate
-                    if not memory_manager.check_memory_duplicate(
-                        candidate_text,
-                        request.user_id,
-                        request.session_id,
-                        db
-                    ):
-                        # Auto-activate for all conditions (see non-stream path
-                        # for rationale: 4/21 feedback + 5/7 recap/tab desync).
-                        auto_activate = condition in [
-                            "SESSION_AUTO",
-                            "PERSISTENT_AUTO",
-                            "PERSISTENT_USER",
-                        ]
-                        # Not a duplicate, create the candidate
-                        memory = memory_manager.create_memory_candidate(
-                            request.user_id,
-                            request.session_id,
-                            candidate_text,
-                            db,
-                            is_active=auto_activate,
-                            phase=stream_memory_phase,
-                        )
-                        if auto_activate:
-                            logging.log_memory_approved(db, request.user_id, memory.memory_id)
-                        else:
-                            logging.log_memory_created(db, request.user_id, memory.memory_id)
+                # Auto-activate for all conditions (see non-stream path
+                # for rationale: 4/21 feedback + 5/7 recap/tab desync).
+                auto_activate = condition in [
+                    "SESSION_AUTO",
+                    "PERSISTENT_AUTO",
+                    "PERSISTENT_USER",
+                ]
+                # Filter out duplicates and create memory candidates in one batch
+                memories = memory_manager.ingest_candidates(
+                    request.user_id,
+                    request.session_id,
+                    memory_candidates_text,
+                    db,
+                    phase=stream_memory_phase,
+                    active=auto_activate,
+                )
+                for memory in memories:
+                    if auto_activate:
+                        logging.log_memory_approved(db, request.user_id, memory.memory_id)
+                    else:
+                        logging.log_memory_created(db, request.user_id, memory.memory_id)
             except Exception as e:
                 logging.log_error(db, "error_memory_extraction", request.user_id, str(e))
             
             # Send final candidates
-            all_candidates = memory_manager.get_memory_candidates(request.user_id, request.session_id, db)
+            all_candidates = read_models.memory_candidates(db, request.user_id, request.session_id)
             yield {"data": json.dumps({"done": True, "candidates": [{"memory_id": str(m.memory_id), "text": m.text} for m in all_candidates]})}
             
         except Exception as e:
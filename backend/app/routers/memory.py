@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from ..database import get_db
-from .. import schemas, models, memory_manager, logging
+from .. import schemas, models, memory_manager, memory_recap, read_models, logging
 from ..models import Memory
 from uuid import UUID
 from typing import List
@@ -22,7 +22,13 @@ def get_memory_recap(
     SESSION_AUTO: current session, ``phase == until_phase`` (NULL phase excluded).
 
     PERSISTENT_AUTO / PERSISTENT_USER: user-wide, ``phase <= until_phase`` or ``phase`` NULL (legacy).
+
+    Served from the (session, phase) snapshot while the user's memories are unchanged.
     """
+    snapshot = memory_recap.get_snapshot(db, user_id, session_id, until_phase)
+    if snapshot is not None:
+        return Response(content=snapshot, media_type="application/json")
+
     user = db.query(models.User).filter(models.User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -31,29 +37,24 @@ def get_memory_recap(
     if not study_session or study_session.user_id != user_id:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    rows = memory_manager.get_memory_recap(
-        user_id, session_id, until_phase, user.condition_id, db
+    body = memory_recap.build_snapshot(
+        db, user_id, session_id, until_phase, user.condition_id, user.memory_version
     )
-    return rows
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/{user_id}", response_model=List[schemas.MemoryResponse])
 def get_memories(user_id: UUID, session_id: UUID = None, db: Session = Depends(get_db)):
     """Get all memories for a user, optionally filtered by session"""
-    query = db.query(Memory).filter(Memory.user_id == user_id)
-    
-    if session_id:
-        query = query.filter(Memory.session_id == session_id)
-    
-    memories = query.order_by(Memory.created_at.desc()).all()
-    return memories
+    rows = read_models.memories(db, user_id, session_id)
+    return Response(content=read_models.dump_json(rows), media_type="application/json")
 
 
 @router.get("/candidates/{user_id}/{session_id}", response_model=List[schemas.MemoryResponse])
 def get_memory_candidates(user_id: UUID, session_id: UUID, db: Session = Depends(get_db)):
     """Get inactive memory candidates for a session"""
-    candidates = memory_manager.get_memory_candidates(user_id, session_id, db)
-    return candidates
+    rows = read_models.memory_candidates(db, user_id, session_id)
+    return Response(content=read_models.dump_json(rows), media_type="application/json")
 
 
 @router.post("", response_model=schemas.MemoryResponse, status_code=201)
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from ..database import get_db
-from .. import schemas, models, logging, memory_manager
-from ..models import Session as SessionModel, Message
+from .. import schemas, models, logging, read_models, session_cleanup
+from ..models import Session as SessionModel
 from uuid import UUID, uuid4
 from datetime import datetime
 from typing import List
@@ -33,9 +33,9 @@ def create_session(session_data: schemas.SessionCreate, db: Session = Depends(ge
         # Cleanup session memories if in ephemeral mode. Use the condition the session
         # was started under (snapshot stored on the session row) and fall back to the
         # user's current condition for legacy rows where condition_id is NULL.
+        # The sweeper deletes them off the request path (session_cleanup).
         session_condition = active_session.condition_id or user.condition_id
-        if session_condition in ["SESSION_AUTO"]:
-            memory_manager.cleanup_session_memories(active_session.session_id, db)
+        session_cleanup.session_ended(db, active_session, session_condition)
 
     # Create new session
     new_session = SessionModel(
@@ -73,10 +73,8 @@ def get_user_sessions(user_id: UUID, db: Session = Depends(get_db)):
 @router.get("/{session_id}/messages", response_model=List[schemas.MessageResponse])
 def get_session_messages(session_id: UUID, db: Session = Depends(get_db)):
     """Get all messages for a session"""
-    messages = db.query(Message).filter(
-        Message.session_id == session_id
-    ).order_by(Message.created_at).all()
-    return messages
+    rows = read_models.session_messages(db, session_id)
+    return Response(content=read_models.dump_json(rows), media_type="application/json")
 
 
 @router.post("/{session_id}/end", response_model=schemas.SessionResponse)
@@ -98,8 +96,7 @@ def end_session(session_id: UUID, db: Session = Depends(get_db)):
     # the session row; fall back to the user's current condition for legacy rows.
     user = db.query(models.User).filter(models.User.user_id == session.user_id).first()
     session_condition = session.condition_id or (user.condition_id if user else None)
-    if session_condition in ["SESSION_AUTO"]:
-        memory_manager.cleanup_session_memories(session_id, db)
+    session_cleanup.session_ended(db, session, session_condition)
 
     return session
 
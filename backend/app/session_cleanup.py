@@ -0,0 +1,371 @@
+"""
+Background session sweeper: idle-session expiry and deferred SESSION_AUTO memory cleanup.
+
+SESSION_AUTO memories only live for their session. Ending a session used to delete
+them with one DELETE on the request path (create_session, end_session), which on
+SQLite holds the writer lock while the participant waits. With
+SESSION_CLEANUP_MODE=deferred (default) the request only marks the session and wakes
+a background thread, which:
+
+- deletes the memories of ended SESSION_AUTO sessions in chunks of
+  SESSION_CLEANUP_CHUNK rows, one short transaction per chunk, and stamps
+  ``sessions.memories_cleared_at`` when a session is done;
+- also cleans SESSION_AUTO sessions that were never ended but have been idle (no
+  message) for SESSION_ABANDONED_TTL_SEC.
+
+The sessions table is the work queue: a SESSION_AUTO session with
+``memories_cleared_at`` NULL is pending, so nothing is lost on restart. Sessions
+ended by Qualtrics re-authentication keep their memories, as before, and are
+stamped when ended so they are never pending. Ending a
+session resets the stamp, so a session cleaned while abandoned and later resumed is
+cleaned again. The sweeper runs every SESSION_CLEANUP_INTERVAL_SEC and whenever a
+session is ended; ``stats()`` reports its lag (how long the oldest ended session
+waited) on /metrics.
+
+SESSION_CLEANUP_MODE=sync keeps the delete on the request path.
+
+Sessions were otherwise only ended by /session/{id}/end, a new session or Qualtrics
+re-authentication, so ``ended_at IS NULL`` rows piled up and slowed the active-session
+lookups. With SESSION_IDLE_TTL_SEC set (off by default), each sweep also ends sessions
+whose last message (or start, without messages) is older than the TTL: one bulk UPDATE
+per batch of SESSION_EXPIRY_BATCH sessions, with the batch's ``session_ended`` events
+inserted in the same transaction. Expired SESSION_AUTO sessions are then cleaned like
+any ended one. Sessions of Qualtrics participants are never expired: re-authentication
+resumes their open session, with its progress and memories, however long they were away.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from .database import SessionLocal
+from .models import Event, Memory, Message, Session as SessionModel, User, next_sequence
+
+SESSION_CLEANUP_MODE = os.getenv("SESSION_CLEANUP_MODE", "deferred").strip().lower()
+SESSION_CLEANUP_INTERVAL_SEC = float(os.getenv("SESSION_CLEANUP_INTERVAL_SEC", "30"))
+SESSION_CLEANUP_CHUNK = int(os.getenv("SESSION_CLEANUP_CHUNK", "500"))
+SESSION_CLEANUP_BATCH_SESSIONS = int(os.getenv("SESSION_CLEANUP_BATCH_SESSIONS", "50"))
+SESSION_ABANDONED_TTL_SEC = float(os.getenv("SESSION_ABANDONED_TTL_SEC", "86400"))
+# Open sessions idle longer than this are ended by the sweeper; 0 (default) disables expiry.
+SESSION_IDLE_TTL_SEC = float(os.getenv("SESSION_IDLE_TTL_SEC", "0"))
+SESSION_EXPIRY_BATCH = int(os.getenv("SESSION_EXPIRY_BATCH", "200"))
+
+EPHEMERAL_CONDITION = "SESSION_AUTO"
+
+
+def _session_auto():
+    """Sessions that ran under SESSION_AUTO (user's condition for legacy rows without a snapshot)."""
+    return or_(
+        SessionModel.condition_id == EPHEMERAL_CONDITION,
+        and_(SessionModel.condition_id.is_(None), User.condition_id == EPHEMERAL_CONDITION),
+    )
+
+
+def pending_ended_sessions(db, limit: int):
+    """(session_id, user_id, ended_at) of ended SESSION_AUTO sessions not cleaned yet, oldest first."""
+    return db.execute(
+        select(SessionModel.session_id, SessionModel.user_id, SessionModel.ended_at)
+        .join(User, User.user_id == SessionModel.user_id)
+        .where(
+            SessionModel.memories_cleared_at.is_(None),
+            SessionModel.ended_at.is_not(None),
+            _session_auto(),
+        )
+        .order_by(SessionModel.ended_at)
+        .limit(limit)
+    ).all()
+
+
+def _last_activity():
+    """Time of the session's last message, or its start when it has none."""
+    return func.coalesce(
+        select(func.max(Message.created_at))
+        .where(Message.session_id == SessionModel.session_id)
+        .scalar_subquery(),
+        SessionModel.started_at,
+    )
+
+
+def abandoned_sessions(db, idle_before: datetime, limit: int):
+    """(session_id, user_id) of open SESSION_AUTO sessions with no activity since ``idle_before``."""
+    return db.execute(
+        select(SessionModel.session_id, SessionModel.user_id)
+        .join(User, User.user_id == SessionModel.user_id)
+        .where(
+            SessionModel.memories_cleared_at.is_(None),
+            SessionModel.ended_at.is_(None),
+            _session_auto(),
+            _last_activity() < idle_before,
+        )
+        .order_by(SessionModel.started_at)
+        .limit(limit)
+    ).all()
+
+
+def expire_idle_sessions(db, idle_before: datetime, limit: int = SESSION_EXPIRY_BATCH) -> list:
+    """
+    End up to ``limit`` open sessions with no activity since ``idle_before`` in one
+    UPDATE, and log their ``session_ended`` events in one INSERT. Sessions of Qualtrics
+    participants are skipped (qualtrics_authenticate resumes them). Returns the
+    (session_id, user_id) rows ended. Commits.
+    """
+    ids = db.execute(
+        select(SessionModel.session_id)
+        .join(User, User.user_id == SessionModel.user_id)
+        .where(
+            SessionModel.ended_at.is_(None),
+            User.qualtrics_id.is_(None),
+            _last_activity() < idle_before,
+        )
+        .order_by(SessionModel.started_at)
+        .limit(limit)
+    ).scalars().all()
+    if not ids:
+        db.rollback()
+        return []
+    now = datetime.utcnow()
+    # ended_at IS NULL again: a session ended concurrently keeps its own ending and event.
+    ended = db.execute(
+        update(SessionModel)
+        .where(SessionModel.session_id.in_(ids), SessionModel.ended_at.is_(None))
+        .values(ended_at=now, memories_cleared_at=None)
+        .returning(SessionModel.session_id, SessionModel.user_id)
+    ).all()
+    if ended:
+        db.execute(
+            insert(Event),
+            [
+                {
+                    "event_id": uuid.uuid4(),
+                    "user_id": row.user_id,
+                    "type": "session_ended",
+                    "session_id": row.session_id,
+                    "payload_json": {"session_id": str(row.session_id), "reason": "idle_timeout"},
+                    "created_at": now,
+                    "seq": next_sequence(),
+                }
+                for row in ended
+            ],
+        )
+    db.commit()
+    return ended
+
+
+def clear_session(db, session_id: UUID, user_id: UUID, chunk_size: int = SESSION_CLEANUP_CHUNK) -> int:
+    """Delete the session's memories in chunks (one commit each) and stamp the session. Returns rows deleted."""
+    from . import memory_manager
+
+    deleted = 0
+    while True:
+        ids = db.execute(
+            select(Memory.memory_id)
+            .where(Memory.user_id == user_id, Memory.session_id == session_id)
+            .limit(chunk_size)
+        ).scalars().all()
+        if ids:
+            db.execute(delete(Memory).where(Memory.memory_id.in_(ids)))
+            memory_manager._memory_changed(db, user_id, reindex=True)
+            deleted += len(ids)
+        if len(ids) < chunk_size:
+            db.execute(
+                update(SessionModel)
+                .where(SessionModel.session_id == session_id)
+                .values(memories_cleared_at=datetime.utcnow())
+            )
+            db.commit()
+            return deleted
+        db.commit()
+
+
+class SessionCleanupSweeper:
+    def __init__(
+        self,
+        interval_sec: float = SESSION_CLEANUP_INTERVAL_SEC,
+        batch_sessions: int = SESSION_CLEANUP_BATCH_SESSIONS,
+        abandoned_ttl_sec: float = SESSION_ABANDONED_TTL_SEC,
+        idle_ttl_sec: float = SESSION_IDLE_TTL_SEC,
+        expiry_batch: int = SESSION_EXPIRY_BATCH,
+        session_factory=SessionLocal,
+    ):
+        self.interval = max(interval_sec, 0.1)
+        self.batch_sessions = max(batch_sessions, 1)
+        self.abandoned_ttl = abandoned_ttl_sec
+        self.idle_ttl = idle_ttl_sec
+        self.expiry_batch = max(expiry_batch, 1)
+        self._session_factory = session_factory
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sweeps = 0
+        self.sessions_expired = 0
+        self.sessions_cleaned = 0
+        self.abandoned_cleaned = 0
+        self.memories_deleted = 0
+        self.failed = 0
+        self.lag_seconds = 0.0
+        self.pending = 0
+        self._last_sweep: Optional[float] = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-cleanup", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.sweep_once()
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += 1
+                print(f"[SessionCleanup] sweep failed: {e}")
+
+    def sweep_once(self) -> int:
+        """Expire idle sessions, then clean pending sessions until none are left; returns memories deleted."""
+        deleted = 0
+        db = self._session_factory()
+        try:
+            if self.idle_ttl > 0:
+                idle_before = datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+                while not self._stop.is_set():
+                    ended = expire_idle_sessions(db, idle_before, self.expiry_batch)
+                    with self._stats_lock:
+                        self.sessions_expired += len(ended)
+                    if len(ended) < self.expiry_batch:
+                        break
+
+            first = True
+            while not self._stop.is_set():
+                pending = pending_ended_sessions(db, self.batch_sessions)
+                if first:
+                    lag = 0.0
+                    if pending:
+                        waited = datetime.utcnow() - pending[0].ended_at.replace(tzinfo=None)
+                        lag = max(waited.total_seconds(), 0.0)
+                    with self._stats_lock:
+                        self.lag_seconds = lag
+                    first = False
+                db.rollback()
+                for row in pending:
+                    count = clear_session(db, row.session_id, row.user_id)
+                    deleted += count
+                    with self._stats_lock:
+                        self.sessions_cleaned += 1
+                        self.memories_deleted += count
+                if len(pending) < self.batch_sessions:
+                    break
+
+            if self.abandoned_ttl > 0:
+                idle_before = datetime.utcnow() - timedelta(seconds=self.abandoned_ttl)
+                abandoned = abandoned_sessions(db, idle_before, self.batch_sessions)
+                db.rollback()
+                for row in abandoned:
+                    count = clear_session(db, row.session_id, row.user_id)
+                    deleted += count
+                    with self._stats_lock:
+                        self.abandoned_cleaned += 1
+                        self.memories_deleted += count
+
+            remaining = db.execute(
+                select(func.count())
+                .select_from(SessionModel)
+                .join(User, User.user_id == SessionModel.user_id)
+                .where(
+                    SessionModel.memories_cleared_at.is_(None),
+                    SessionModel.ended_at.is_not(None),
+                    _session_auto(),
+                )
+            ).scalar()
+            db.rollback()
+            with self._stats_lock:
+                self.sweeps += 1
+                self.pending = remaining or 0
+                self._last_sweep = time.monotonic()
+        finally:
+            db.close()
+        return deleted
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "mode": SESSION_CLEANUP_MODE,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "sweeps": self.sweeps,
+                # Age of the oldest ended session still waiting when the last sweep began.
+                "lag_seconds": round(self.lag_seconds, 1),
+                "pending": self.pending,
+                "last_sweep_seconds_ago": (
+                    round(time.monotonic() - self._last_sweep, 1) if self._last_sweep is not None else None
+                ),
+                "sessions_expired": self.sessions_expired,
+                "sessions_cleaned": self.sessions_cleaned,
+                "abandoned_cleaned": self.abandoned_cleaned,
+                "memories_deleted": self.memories_deleted,
+                "failed": self.failed,
+            }
+
+
+sweeper = (
+    SessionCleanupSweeper()
+    if SESSION_CLEANUP_MODE == "deferred" or SESSION_IDLE_TTL_SEC > 0
+    else None
+)
+
+
+def session_ended(db, session: SessionModel, condition_id: Optional[str]):
+    """
+    Handle SESSION_AUTO memory cleanup for a session that was just ended (``ended_at``
+    set, not yet committed). Deferred mode re-arms the session for the sweeper; sync
+    mode deletes its memories now. Commits.
+    """
+    if condition_id != EPHEMERAL_CONDITION:
+        return
+    if sweeper is None or SESSION_CLEANUP_MODE != "deferred":
+        from . import memory_manager
+
+        memory_manager.cleanup_session_memories(session.session_id, db)
+        return
+    session.memories_cleared_at = None
+    db.commit()
+    sweeper.wake()
+
+
+def start():
+    if sweeper is not None:
+        sweeper.start()
+
+
+def stats() -> dict:
+    if sweeper is None:
+        return {"mode": "sync"}
+    return sweeper.stats()
+
+
+def shutdown():
+    if sweeper is not None:
+        sweeper.stop()
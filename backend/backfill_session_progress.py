@@ -0,0 +1,65 @@
+"""
+Rebuild the ``session_progress`` table from ``progress_update`` events.
+
+The events table is the append-only audit log; ``session_progress`` holds only the
+latest payload per session. Run this once after deploying the table (and any time
+the materialized rows need to be rebuilt):
+
+    python backfill_session_progress.py
+"""
+from app.database import SessionLocal, init_db
+from app.models import Event, Session as SessionModel, SessionProgress
+from uuid import UUID
+
+BATCH_SIZE = 1000
+
+
+def backfill_session_progress() -> None:
+    init_db()
+    db = SessionLocal()
+    try:
+        existing_sessions = {row[0] for row in db.query(SessionModel.session_id).all()}
+
+        # Walk events oldest-first so the last payload seen per session wins. seq is the
+        # write order (created_at has one-second resolution, so several turns can tie).
+        latest: dict[UUID, tuple[UUID, dict]] = {}
+        events = (
+            db.query(Event.user_id, Event.payload_json)
+            .filter(Event.type == "progress_update")
+            .order_by(Event.seq.asc(), Event.created_at.asc())
+            .yield_per(BATCH_SIZE)
+        )
+        for user_id, payload in events:
+            payload = payload or {}
+            try:
+                session_id = UUID(str(payload.get("session_id")))
+            except ValueError:
+                continue
+            if session_id not in existing_sessions or user_id is None:
+                continue
+            latest[session_id] = (user_id, payload)
+
+        written = 0
+        for session_id, (user_id, payload) in latest.items():
+            row = db.get(SessionProgress, session_id)
+            if row is None:
+                db.add(SessionProgress(session_id=session_id, user_id=user_id, state_json=payload))
+            else:
+                row.user_id = user_id
+                row.state_json = payload
+                # Bump the version so cached copies in running workers are treated as stale.
+                row.version = (row.version or 0) + 1
+            written += 1
+            if written % BATCH_SIZE == 0:
+                db.commit()
+        db.commit()
+        print(f"Rebuilt session_progress for {written} sessions.")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    backfill_session_progress()
@@ -0,0 +1,74 @@
+"""
+Report near-duplicate memories that could be merged.
+
+Clusters each user's memories by MinHash similarity (app.memory_similarity) and
+prints how many rows could be merged, per user and in total. Read-only.
+
+    python cluster_memories.py
+    python cluster_memories.py --threshold 0.6 --show 5
+    python cluster_memories.py --user-id <uuid> --active-only
+"""
+import argparse
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.database import SessionLocal, init_db
+from app.memory_similarity import MEMORY_NEAR_DUP_THRESHOLD, cluster, signature_cache
+from app.models import Memory, User
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threshold", type=float, default=MEMORY_NEAR_DUP_THRESHOLD or 0.8,
+                        help="estimated Jaccard similarity at which two memories count as duplicates "
+                             "(default: MEMORY_NEAR_DUP_THRESHOLD, or 0.8 when that is off)")
+    parser.add_argument("--user-id", type=UUID, default=None, help="only this user")
+    parser.add_argument("--active-only", action="store_true", help="ignore inactive candidates")
+    parser.add_argument("--show", type=int, default=0, help="print up to N example clusters per user")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        users = select(User.user_id, User.username, User.condition_id).order_by(User.created_at)
+        if args.user_id:
+            users = users.where(User.user_id == args.user_id)
+
+        total_memories = total_clusters = total_mergeable = 0
+        for user_id, username, condition_id in db.execute(users).all():
+            query = (
+                select(Memory.norm_hash, Memory.text)
+                .where(Memory.user_id == user_id)
+                .order_by(Memory.created_at)
+            )
+            if args.active_only:
+                query = query.where(Memory.is_active == True)
+            rows = db.execute(query).all()
+            if len(rows) < 2:
+                total_memories += len(rows)
+                continue
+
+            groups = cluster(signature_cache.matrix(rows), args.threshold)
+            mergeable = sum(len(group) - 1 for group in groups)
+            total_memories += len(rows)
+            total_clusters += len(groups)
+            total_mergeable += mergeable
+            if groups:
+                print(f"{username} ({condition_id}): {len(rows)} memories, "
+                      f"{len(groups)} clusters, {mergeable} mergeable")
+                for group in sorted(groups, key=len, reverse=True)[:args.show]:
+                    for index in group:
+                        print(f"    - {rows[index].text}")
+                    print()
+    finally:
+        db.close()
+
+    print(
+        f"{total_memories} memories, {total_clusters} near-duplicate clusters, "
+        f"{total_mergeable} rows could be merged at threshold {args.threshold}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Archive superseded progress_update events.
+
+Keeps the latest progress event per session plus --keep-history older ones and moves
+the rest to the events_archive table (or to a gzip JSONL file with --jsonl). Runs in
+short batched transactions, so it is safe against a live database; schedule it from
+cron if needed.
+
+    python compact_progress_events.py --keep-history 5
+    python compact_progress_events.py --jsonl archive/progress-2026-10.jsonl.gz
+    python compact_progress_events.py --dry-run
+"""
+import argparse
+
+from app.database import SessionLocal, init_db
+from app.event_compaction import compact_progress_events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keep-history", type=int, default=5,
+                        help="older progress events to keep per session besides the latest")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="events moved per transaction")
+    parser.add_argument("--jsonl", default=None,
+                        help="append archived events to this gzip JSONL file instead of events_archive")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    args = parser.parse_args()
+
+    init_db()
+    result = compact_progress_events(
+        SessionLocal,
+        keep_history=args.keep_history,
+        batch_size=args.batch_size,
+        archive_path=args.jsonl,
+        dry_run=args.dry_run,
+    )
+    action = "Would archive" if args.dry_run else "Archived"
+    print(
+        f"{action} {result.events_archived} progress events from "
+        f"{result.sessions_scanned} sessions in {result.batches} batches."
+    )
+
+
+if __name__ == "__main__":
+    main()
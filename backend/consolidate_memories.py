@@ -0,0 +1,53 @@
+"""
+Consolidate PERSISTENT_* memories now instead of waiting for the idle-time worker.
+
+Merges near-duplicate memories, and rolls up the oldest ones for users above the
+active-memory ceiling, for users whose memories changed since the last pass. The
+originals are kept in memory_merge_sources. See app/memory_consolidation.py.
+
+    python consolidate_memories.py
+    python consolidate_memories.py --max-users 500 --no-llm
+    python consolidate_memories.py --ceiling 100 --threshold 0.8
+"""
+import argparse
+import asyncio
+
+from app.database import SessionLocal, init_db
+from app.memory_consolidation import (
+    MEMORY_ACTIVE_CEILING,
+    MEMORY_CONSOLIDATION_BATCH_USERS,
+    MEMORY_CONSOLIDATION_THRESHOLD,
+    run_consolidation_batch,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-users", type=int, default=MEMORY_CONSOLIDATION_BATCH_USERS,
+                        help="users processed in this run")
+    parser.add_argument("--ceiling", type=int, default=MEMORY_ACTIVE_CEILING,
+                        help="active memories per user to stay under")
+    parser.add_argument("--threshold", type=float, default=MEMORY_CONSOLIDATION_THRESHOLD,
+                        help="MinHash similarity at which memories are grouped")
+    parser.add_argument("--no-llm", action="store_true", help="merge with deterministic rules only")
+    args = parser.parse_args()
+
+    init_db()
+    result = asyncio.run(
+        run_consolidation_batch(
+            SessionLocal,
+            max_users=args.max_users,
+            use_llm=not args.no_llm,
+            ceiling=args.ceiling,
+            threshold=args.threshold,
+        )
+    )
+    print(
+        f"Scanned {result.users_scanned} users: merged {result.memories_merged} memories into "
+        f"{result.groups_merged} ({result.llm_merges} by LLM, {result.rule_merges} by rule), "
+        f"skipped {result.groups_skipped} groups that changed meanwhile."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark the GenAI transports: sync httpx on the GenAI executor (one thread per
+in-flight call) against the native async transport (GENAI_TRANSPORT=async).
+
+Starts a local stand-in for the chat completions endpoint that answers every POST
+after --delay seconds (simulating generation time), then fires N concurrent
+call_genai() requests through each transport and reports wall time, latency and
+the peak number of threads in the process. No network or API key needed.
+
+    python scripts/bench_genai_transport.py
+    python scripts/bench_genai_transport.py --concurrency 50 200 500 --delay 0.5
+    python scripts/bench_genai_transport.py --workers 32   # threads capped like production
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("GENAI_API_KEYS", "bench-key")
+
+from app import genai_client  # noqa: E402
+
+_BODY = json.dumps({"choices": [{"message": {"content": "Hello"}}], "usage": {}}).encode()
+_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n" % len(_BODY)
+) + _BODY
+
+
+def _start_server(delay: float) -> int:
+    """Keep-alive HTTP/1.1 stand-in on its own loop and thread; returns the port."""
+    ready: dict = {}
+    started = threading.Event()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        await reader.readexactly(int(line.split(b":", 1)[1]))
+                await asyncio.sleep(delay)
+                writer.write(_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=4096)
+        ready["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait()
+    return ready["port"]
+
+
+def _configure(url: str, concurrency: int, workers: int | None):
+    """Fresh clients, executor and counters sized for this run."""
+    genai_client.close()
+    genai_client.GENAI_API_URL = url
+    genai_client.GENAI_POOL_MAX_CONNECTIONS = concurrency
+    genai_client.GENAI_POOL_MAX_KEEPALIVE = concurrency
+    genai_client.GENAI_ASYNC_MAX_CONNECTIONS = concurrency
+    genai_client._executor = genai_client._GenAIExecutor(workers or concurrency)
+    genai_client._async_transport = genai_client._AsyncTransport()
+    genai_client._pool_stats = genai_client._PoolStats()
+
+
+async def _run(transport: str, concurrency: int) -> dict:
+    genai_client.GENAI_TRANSPORT = transport
+    if await genai_client.start_transport() != transport:
+        raise SystemExit(f"{transport} transport unavailable: {genai_client.transport_stats()}")
+
+    peak_threads = threading.active_count()
+    done = asyncio.Event()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    async def one() -> float:
+        t0 = time.perf_counter()
+        await genai_client.call_genai([{"role": "user", "content": "hi"}])
+        return (time.perf_counter() - t0) * 1000
+
+    sampler = asyncio.create_task(sample_threads())
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    done.set()
+    await sampler
+    await genai_client.aclose()
+
+    latencies.sort()
+    return {
+        "wall_s": round(wall, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "peak_threads": peak_threads,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark threaded vs async GenAI transport")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 500],
+                        help="concurrent upstream calls per run")
+    parser.add_argument("--delay", type=float, default=0.5, help="stand-in server response delay (s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="GenAI executor threads for the threaded runs (default: one per call)")
+    args = parser.parse_args()
+
+    # Client and server sockets for the largest run, plus headroom.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 2 * max(args.concurrency) + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    url = f"http://127.0.0.1:{_start_server(args.delay)}/api/chat/completions"
+    print(f"stand-in delay {args.delay}s; threads = GenAI executor workers "
+          f"({args.workers or 'one per call'}), async = native AsyncClient")
+    for concurrency in args.concurrency:
+        results = {}
+        for transport in ("thread", "async"):
+            _configure(url, concurrency, args.workers)
+            with contextlib.redirect_stdout(io.StringIO()):  # per-call [GenAI] log lines
+                results[transport] = asyncio.run(_run(transport, concurrency))
+        for transport, r in results.items():
+            print(
+                f"{concurrency:>5} {transport:<6}  wall {r['wall_s']:>6} s  p50 {r['p50_ms']:>8} ms  "
+                f"p95 {r['p95_ms']:>8} ms  peak threads {r['peak_threads']:>4}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
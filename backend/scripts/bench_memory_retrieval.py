@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark relevance-ranked memory selection (app.memory_index) per user.
+
+Builds a synthetic index of N memories and times the lazy build, top-k selection
+for chat-like queries, and incremental upserts. No database or server needed.
+
+    python scripts/bench_memory_retrieval.py
+    python scripts/bench_memory_retrieval.py --sizes 1000 10000 --queries 500 --k 20
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.memory_index import UserMemoryIndex  # noqa: E402
+
+VOCAB = (
+    "dog cat hiking tea coffee nurse teacher lisbon ohio cello guitar sister brother "
+    "garden soccer marathon novel painting chess cooking pasta sushi beach mountain "
+    "college engineer startup volunteer grandmother wedding travel japan music jazz"
+).split()
+
+
+def _memory_text(rng: random.Random) -> str:
+    return "User " + " ".join(rng.choice(VOCAB) for _ in range(rng.randint(3, 9)))
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def bench(size: int, queries: int, k: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    rows = [(uuid.uuid4(), _memory_text(rng)) for _ in range(size)]
+
+    start = time.perf_counter()
+    index = UserMemoryIndex(version=0)
+    for memory_id, text in rows:
+        index.upsert(memory_id, text)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    query_texts = [" ".join(rng.choice(VOCAB) for _ in range(rng.randint(4, 20))) for _ in range(queries)]
+    select_ms = []
+    for query in query_texts:
+        start = time.perf_counter()
+        first = index.top_k(query, k)
+        select_ms.append((time.perf_counter() - start) * 1000)
+        assert first == index.top_k(query, k), "selection must be deterministic"
+
+    upsert_ms = []
+    for memory_id, _ in rng.sample(rows, min(100, size)):
+        start = time.perf_counter()
+        index.upsert(memory_id, _memory_text(rng))
+        upsert_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "memories": size,
+        "build_ms": round(build_ms, 2),
+        "select_p50_ms": round(statistics.median(select_ms), 3),
+        "select_p95_ms": round(_percentile(select_ms, 0.95), 3),
+        "upsert_p50_ms": round(statistics.median(upsert_ms), 4),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark per-user BM25 memory selection")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="memories per user to benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="selections timed per size")
+    parser.add_argument("--k", type=int, default=20, help="memories selected per query")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        result = bench(size, args.queries, args.k, args.seed)
+        print(
+            f"{result['memories']:>6} memories  build {result['build_ms']:>8} ms  "
+            f"select p50 {result['select_p50_ms']} ms / p95 {result['select_p95_ms']} ms  "
+            f"upsert p50 {result['upsert_p50_ms']} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
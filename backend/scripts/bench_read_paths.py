@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot list endpoints' read paths: ORM objects + per-row model_validate
+(the previous implementation) against the column projections in app.read_models.
+
+Fills an in-memory SQLite database with one session holding N messages and N
+memories, then times building the JSON body for the session's messages and the
+user's memories, and measures allocations with tracemalloc. No server needed.
+
+    python scripts/bench_read_paths.py
+    python scripts/bench_read_paths.py --sizes 1000 10000 --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import read_models, schemas  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import Memory, Message, Session as StudySession, User, next_sequence  # noqa: E402
+
+_memories_adapter = TypeAdapter(List[schemas.MemoryResponse])
+_messages_adapter = TypeAdapter(List[schemas.MessageResponse])
+
+
+def _seed(size: int):
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user_id, session_id = uuid.uuid4(), uuid.uuid4()
+    db.add(User(user_id=user_id, username="bench", password_hash="x", condition_id="PERSISTENT_USER"))
+    db.add(StudySession(session_id=session_id, user_id=user_id))
+    db.flush()
+    db.execute(insert(Message), [
+        {
+            "msg_id": uuid.uuid4(),
+            "session_id": session_id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i} about a perfect day with family, a long hike and dinner after.",
+            "seq": next_sequence(),
+        }
+        for i in range(size)
+    ])
+    db.execute(insert(Memory), [
+        {
+            "memory_id": uuid.uuid4(),
+            "user_id": user_id,
+            "session_id": session_id,
+            "text": f"User remembers detail number {i} about their weekend plans",
+            "phase": 1 + i % 3,
+            "is_active": i % 4 != 0,
+        }
+        for i in range(size)
+    ])
+    db.commit()
+    db.close()
+    return sessionmaker(bind=engine), user_id, session_id
+
+
+def _orm_messages(db, user_id, session_id) -> bytes:
+    rows = db.query(Message).filter(Message.session_id == session_id).order_by(Message.seq).all()
+    return _messages_adapter.dump_json([schemas.MessageResponse.model_validate(m) for m in rows])
+
+
+def _orm_memories(db, user_id, session_id) -> bytes:
+    rows = db.query(Memory).filter(Memory.user_id == user_id).order_by(Memory.created_at.desc()).all()
+    return _memories_adapter.dump_json([schemas.MemoryResponse.model_validate(m) for m in rows])
+
+
+def _projected_messages(db, user_id, session_id) -> bytes:
+    return read_models.dump_json(read_models.session_messages(db, session_id))
+
+
+def _projected_memories(db, user_id, session_id) -> bytes:
+    return read_models.dump_json(read_models.memories(db, user_id))
+
+
+def _measure(session_factory, fn, user_id, session_id, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        db = session_factory()
+        start = time.perf_counter()
+        body = fn(db, user_id, session_id)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.close()
+
+    db = session_factory()
+    tracemalloc.start()
+    fn(db, user_id, session_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "body": body,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ORM vs projected read paths for list endpoints")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="messages and memories per session")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per path")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        session_factory, user_id, session_id = _seed(size)
+        for name, orm_fn, projected_fn in (
+            ("messages", _orm_messages, _projected_messages),
+            ("memories", _orm_memories, _projected_memories),
+        ):
+            orm = _measure(session_factory, orm_fn, user_id, session_id, args.repeat)
+            projected = _measure(session_factory, projected_fn, user_id, session_id, args.repeat)
+            assert orm["body"] == projected["body"], f"{name}: projected JSON differs from the ORM path"
+            print(
+                f"{size:>6} {name:<8}  orm p50 {orm['p50_ms']:>8} ms, peak {orm['peak_kib']:>8} KiB  |  "
+                f"projected p50 {projected['p50_ms']:>8} ms, peak {projected['peak_kib']:>8} KiB  "
+                f"({orm['p50_ms'] / max(projected['p50_ms'], 1e-6):.1f}x faster)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,32 @@
+"""Unit tests for the context token budget (no running server required)."""
+import unittest
+
+from app.context_budget import estimate_tokens, fit_context
+
+
+class ContextBudgetTests(unittest.TestCase):
+    def test_drops_oldest_turns_and_lowest_ranked_memories_first(self):
+        memories = [f"Memory: fact {i} " + "word " * 20 for i in range(10)]
+        messages = [f"User: turn {i} " + "word " * 20 for i in range(10)]
+        lines, budget = fit_context(memories, messages, reserved_tokens=100, total_tokens=400)
+        kept_memories = [line for line in lines if line.startswith("Memory:")]
+        kept_messages = [line for line in lines if line.startswith("User:")]
+        self.assertEqual(kept_memories, memories[: len(kept_memories)])
+        self.assertEqual(kept_messages, messages[-len(kept_messages):])
+        self.assertEqual(budget.memories + budget.messages, 300)
+        self.assertLessEqual(budget.memory_tokens, budget.memories)
+        self.assertLessEqual(budget.message_tokens, budget.messages)
+        self.assertGreater(budget.memories_dropped, 0)
+        self.assertGreater(budget.messages_dropped, 0)
+
+    def test_unused_share_goes_to_the_other_section(self):
+        messages = ["User: hi"]
+        memories = [f"Memory: fact {i} " + "word " * 20 for i in range(10)]
+        lines, budget = fit_context(memories, messages, reserved_tokens=0, total_tokens=1000)
+        self.assertEqual(budget.messages, estimate_tokens("User: hi") + 2)
+        self.assertEqual(budget.memories_dropped, 0)
+        self.assertEqual(lines[-1], "User: hi")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Unit tests for progress event compaction (no running server required)."""
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.event_compaction import compact_progress_events
+from app.models import Event, EventArchive
+
+
+class EventCompactionTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        for i in range(10):
+            self.db.add(Event(
+                user_id=self.uid,
+                type="progress_update",
+                session_id=self.sid,
+                payload_json={"session_id": str(self.sid), "current_prompt_index": i},
+                created_at=start + timedelta(seconds=i),
+            ))
+        self.db.add(Event(user_id=self.uid, type="message_sent", session_id=self.sid, created_at=start))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _remaining_indexes(self):
+        rows = self.db.query(Event).filter(Event.type == "progress_update").all()
+        return sorted(r.payload_json["current_prompt_index"] for r in rows)
+
+    def test_keeps_latest_plus_history_and_archives_rest(self):
+        result = compact_progress_events(self.Session, keep_history=2, batch_size=3)
+        self.assertEqual(result.events_archived, 7)
+        self.assertEqual(result.batches, 3)
+        self.assertEqual(self._remaining_indexes(), [7, 8, 9])
+        self.assertEqual(self.db.query(EventArchive).count(), 7)
+        self.assertEqual(self.db.query(Event).filter(Event.type == "message_sent").count(), 1)
+
+    def test_dry_run_moves_nothing(self):
+        result = compact_progress_events(self.Session, keep_history=0, dry_run=True)
+        self.assertEqual(result.events_archived, 9)
+        self.assertEqual(len(self._remaining_indexes()), 10)
+
+    def test_jsonl_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.jsonl.gz")
+            compact_progress_events(self.Session, keep_history=0, archive_path=path)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 9)
+        self.assertEqual(self._remaining_indexes(), [9])
+        self.assertEqual(self.db.query(EventArchive).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
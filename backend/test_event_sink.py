@@ -0,0 +1,54 @@
+"""Unit tests for the buffered event sink (no running server required)."""
+import unittest
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.event_sink import BufferedEventSink
+from app.models import Event
+
+
+class BufferedEventSinkTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def test_stop_flushes_pending_events_in_batches(self):
+        sink = BufferedEventSink(
+            max_queue=100, flush_ms=60_000, batch_size=4, session_factory=self.Session
+        )
+        sid = uuid.uuid4()
+        for i in range(10):
+            self.assertTrue(sink.enqueue("message_sent", None, sid, {"i": i}))
+        sink.stop()
+        db = self.Session()
+        try:
+            rows = db.query(Event).filter(Event.session_id == sid).all()
+        finally:
+            db.close()
+        self.assertEqual(sorted(r.payload_json["i"] for r in rows), list(range(10)))
+        stats = sink.stats()
+        self.assertEqual(stats["written"], 10)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreaterEqual(stats["batches"], 3)
+
+    def test_full_queue_drops_and_counts(self):
+        sink = BufferedEventSink(
+            max_queue=2, flush_ms=60_000, batch_size=100, session_factory=self.Session
+        )
+        sink.start = lambda: None  # keep the writer idle so the queue fills up
+        results = [sink.enqueue("effort_check", None, None, None) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(sink.stats()["dropped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
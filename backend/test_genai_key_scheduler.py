@@ -0,0 +1,102 @@
+"""Unit tests for the GenAI key scheduler (no network required)."""
+import json
+import time
+import unittest
+from unittest import mock
+
+import httpx
+
+from app import genai_client
+
+KEYS = ["secret-a", "secret-b", "secret-c"]
+
+
+def _response(status: int, retry_after: str | None = None) -> httpx.Response:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    return httpx.Response(status, headers=headers)
+
+
+class KeySchedulerTests(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(genai_client, "_keys_cache", list(KEYS))
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.scheduler = genai_client.KeyScheduler(cooldown_sec=10)
+
+    def _complete(self, slot_ms: dict[int, float]):
+        """Finish one successful call per slot with the given latency."""
+        for slot, ms in slot_ms.items():
+            lease = genai_client._KeyLease(self.scheduler, slot, KEYS[slot])
+            self.scheduler._slots[slot].in_flight += 1
+            lease.started -= ms / 1000
+            lease.record(_response(200))
+            lease.finish()
+
+    def test_concurrent_calls_spread_across_keys(self):
+        leases = [self.scheduler.acquire() for _ in range(3)]
+        self.assertEqual(sorted(lease.slot for lease in leases), [0, 1, 2])
+        self.assertEqual([s["in_flight"] for s in self.scheduler.stats()], [1, 1, 1])
+        for lease in leases:
+            lease.finish()
+        self.assertEqual([s["in_flight"] for s in self.scheduler.stats()], [0, 0, 0])
+
+    def test_slow_key_gets_fewer_calls(self):
+        self.scheduler.pick()  # create slots
+        self._complete({0: 2000, 1: 100, 2: 100})
+        picks = [self.scheduler.pick() for _ in range(6)]
+        self.assertNotIn(0, picks)
+        self.assertEqual(set(picks), {1, 2})  # equal keys still rotate
+
+    def test_rate_limited_key_cools_down(self):
+        lease = self.scheduler.acquire()
+        lease.record(_response(429, retry_after="60"))
+        lease.finish()
+        limited = lease.slot
+        self.assertNotIn(limited, [self.scheduler.acquire().slot for _ in range(4)])
+        stats = self.scheduler.stats()[limited]
+        self.assertEqual((stats["rate_limited"], stats["recent_error_rate"]), (1, 1.0))
+        self.assertGreater(stats["cooldown_sec"], 55)
+
+    def test_repeated_429s_double_the_cooldown(self):
+        self.scheduler.pick()
+        for _ in range(2):
+            lease = genai_client._KeyLease(self.scheduler, 0, KEYS[0])
+            lease.record(_response(429))
+            lease.finish()
+        self.assertAlmostEqual(self.scheduler.stats()[0]["cooldown_sec"], 20, delta=1)
+
+    def test_all_keys_cooling_uses_the_first_to_recover(self):
+        self.scheduler.pick()
+        for slot, wait in ((0, "30"), (1, "5"), (2, "60")):
+            lease = genai_client._KeyLease(self.scheduler, slot, KEYS[slot])
+            lease.record(_response(429, retry_after=wait))
+            lease.finish()
+        self.assertEqual(self.scheduler.pick(), 1)
+
+    def test_abandoned_call_is_not_an_outcome(self):
+        lease = self.scheduler.acquire()
+        lease.abandoned = True
+        lease.finish()
+        lease.finish()
+        stats = self.scheduler.stats()[lease.slot]
+        self.assertEqual((stats["in_flight"], stats["requests"], stats["errors"]), (0, 0, 0))
+
+    def test_errors_are_counted_and_stats_hold_no_secrets(self):
+        lease = self.scheduler.acquire()
+        lease.finish()  # no response: transport error
+        stats = self.scheduler.stats()
+        self.assertEqual(stats[lease.slot]["errors"], 1)
+        dumped = json.dumps(stats)
+        for key in KEYS:
+            self.assertNotIn(key, dumped)
+
+    def test_cooldown_expires(self):
+        lease = self.scheduler.acquire()
+        lease.record(_response(429, retry_after="0.05"))
+        lease.finish()
+        time.sleep(0.1)
+        self.assertEqual(self.scheduler.stats()[lease.slot]["cooldown_sec"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
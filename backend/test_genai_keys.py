@@ -22,11 +22,11 @@ async def main():
     n = configured_key_count()
     print(f"Configured keys: {n}")
     print(f"Model: {get_genai_model()}")
-    print("Round-robin slots (4 calls):")
+    print("Scheduler picks (4 calls, no load):")
     for i in range(4):
         _, slot = next_api_key()
         print(f"  call {i + 1} -> key_slot={slot}")
-    # Tiny live call to RCAC (uses next key in sequence)
+    # Tiny live call to RCAC (uses the scheduler's pick)
     print("Live ping (1 GenAI call)...")
     # Some models may use the whole small budget before visible assistant text;
     # use enough headroom for a one-word reply after internal reasoning.
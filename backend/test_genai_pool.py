@@ -0,0 +1,169 @@
+"""Unit tests for the pooled GenAI HTTP client against a local server (no network required)."""
+import asyncio
+import json
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+os.environ.setdefault("GENAI_API_KEYS", "test-key")
+
+from app import genai_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("stream"):
+            payload = (
+                'data: {"choices":[{"delta":{"content":"Hel"}}]}\n\n'
+                'data: {"choices":[{"delta":{"content":"lo"}}]}\n\n'
+                "data: [DONE]\n\n"
+            ).encode()
+        else:
+            payload = json.dumps({"choices": [{"message": {"content": "Hello"}}], "usage": {}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class GenAIPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+        url = f"http://127.0.0.1:{self.port}/api/chat/completions"
+        self.patches = [
+            mock.patch.object(genai_client, "GENAI_API_URL", url),
+            mock.patch.object(genai_client, "_pool_stats", genai_client._PoolStats()),
+            mock.patch.object(genai_client, "_async_transport", genai_client._AsyncTransport()),
+            mock.patch.object(genai_client, "_executor", genai_client._GenAIExecutor()),
+            mock.patch.object(genai_client, "_key_scheduler", genai_client.KeyScheduler()),
+        ]
+        for patch in self.patches:
+            patch.start()
+        genai_client.close()
+
+    def tearDown(self):
+        genai_client.close()
+        for patch in self.patches:
+            patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_calls_reuse_one_connection(self):
+        async def turn():
+            replies = [await genai_client.call_genai([{"role": "user", "content": "hi"}]) for _ in range(3)]
+            streamed = [chunk async for chunk in genai_client.stream_genai([{"role": "user", "content": "hi"}])]
+            return replies, streamed
+
+        replies, streamed = asyncio.run(turn())
+        self.assertEqual(replies, ["Hello"] * 3)
+        self.assertEqual(streamed, ["Hel", "lo"])
+        stats = genai_client.pool_stats()
+        self.assertTrue(stats["open"])
+        self.assertEqual((stats["requests"], stats["new_connections"], stats["clients_created"]), (4, 1, 1))
+        self.assertEqual(stats["reuse_rate"], 0.75)
+        self.assertIsNotNone(stats["connect_ms_avg"])
+        keys = genai_client.key_stats()
+        self.assertEqual(sum(slot["requests"] for slot in keys), 4)
+        self.assertEqual(sum(slot["in_flight"] for slot in keys), 0)
+
+        genai_client.close()
+        self.assertFalse(genai_client.pool_stats()["open"])
+
+    def test_connect_failure_rebuilds_the_client(self):
+        dead_url = "http://127.0.0.1:9/api/chat/completions"
+        with mock.patch.object(genai_client, "GENAI_API_URL", dead_url):
+            with self.assertRaises(Exception):
+                asyncio.run(genai_client.call_genai([{"role": "user", "content": "hi"}]))
+        self.assertFalse(genai_client.pool_stats()["open"])
+        self.assertEqual(asyncio.run(genai_client.call_genai([{"role": "user", "content": "hi"}])), "Hello")
+        stats = genai_client.pool_stats()
+        self.assertEqual((stats["transport_errors"], stats["clients_created"]), (1, 2))
+
+    def test_async_transport_after_self_test(self):
+        url = f"http://localhost:{self.port}/api/chat/completions"
+
+        async def turn():
+            transport = await genai_client.start_transport()
+            reply = await genai_client.call_genai([{"role": "user", "content": "hi"}])
+            streamed = [chunk async for chunk in genai_client.stream_genai([{"role": "user", "content": "hi"}])]
+            await genai_client.aclose()
+            return transport, reply, streamed
+
+        with mock.patch.object(genai_client, "GENAI_API_URL", url), \
+                mock.patch.object(genai_client, "GENAI_TRANSPORT", "async"):
+            transport, reply, streamed = asyncio.run(turn())
+            stats = genai_client.transport_stats()
+        self.assertEqual((transport, reply, streamed), ("async", "Hello", ["Hel", "lo"]))
+        self.assertTrue(stats["self_test"]["ok"])
+        self.assertEqual((stats["host"], stats["resolves"]), ("localhost", 1))
+        self.assertEqual(genai_client.executor_stats()["submitted"], 0)
+        self.assertEqual(genai_client.pool_stats()["requests"], 2)
+
+    def test_failed_self_test_falls_back_to_threads(self):
+        dead_url = "http://127.0.0.1:9/api/chat/completions"
+        with mock.patch.object(genai_client, "GENAI_API_URL", dead_url), \
+                mock.patch.object(genai_client, "GENAI_TRANSPORT", "async"):
+            self.assertEqual(asyncio.run(genai_client.start_transport()), "thread")
+        stats = genai_client.transport_stats()
+        self.assertEqual((stats["in_use"], stats["self_test"]["ok"]), ("thread", False))
+        self.assertEqual(asyncio.run(genai_client.call_genai([{"role": "user", "content": "hi"}])), "Hello")
+
+
+class GenAIExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = genai_client._GenAIExecutor(max_workers=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_calls_queue_behind_the_worker_limit(self):
+        release = threading.Event()
+
+        async def scenario():
+            first = asyncio.ensure_future(self.executor.run(release.wait, 5))
+            second = asyncio.ensure_future(self.executor.run(lambda: "queued"))
+            await asyncio.sleep(0.05)
+            during = self.executor.stats()
+            release.set()
+            return during, await first, await second
+
+        during, first, second = asyncio.run(scenario())
+        self.assertEqual((during["active"], during["queue_depth"]), (1, 1))
+        self.assertEqual((first, second), (True, "queued"))
+        stats = self.executor.stats()
+        self.assertEqual((stats["submitted"], stats["completed"], stats["queue_depth"]), (2, 2, 0))
+        self.assertGreaterEqual(stats["wait_ms_max"], 40)
+
+    def test_cancelled_queued_call_never_runs(self):
+        release = threading.Event()
+        ran = []
+
+        async def scenario():
+            first = asyncio.ensure_future(self.executor.run(release.wait, 5))
+            queued = asyncio.ensure_future(self.executor.run(ran.append, "x"))
+            await asyncio.sleep(0.05)
+            queued.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            await first
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+        self.assertEqual(ran, [])
+        stats = self.executor.stats()
+        self.assertEqual((stats["dropped"], stats["completed"], stats["queue_depth"]), (1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""Unit tests for incremental GenAI streaming and sanitizing (local server, no network required)."""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+os.environ.setdefault("GENAI_API_KEYS", "test-key")
+
+from app import genai_client
+from app.genai_client import StreamSanitizer, sanitize_companion_public_output
+
+
+class _SlowStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pieces = [f"word{i} " for i in range(20)]
+    delay = 0.05
+    written = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in self.pieces + [None]:
+                data = "[DONE]" if piece is None else json.dumps({"choices": [{"delta": {"content": piece}}]})
+                event = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+                type(self).written += 1
+                time.sleep(self.delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class StreamBridgeTests(unittest.TestCase):
+    def setUp(self):
+        _SlowStreamHandler.written = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowStreamHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{self.server.server_address[1]}/api/chat/completions"
+        self.patch = mock.patch.object(genai_client, "GENAI_API_URL", url)
+        self.patch.start()
+        genai_client.close()
+
+    def tearDown(self):
+        genai_client.close()
+        self.patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_deltas_arrive_before_the_upstream_finishes(self):
+        async def consume():
+            start = time.perf_counter()
+            arrivals = []
+            async for chunk in genai_client.stream_genai([{"role": "user", "content": "hi"}]):
+                arrivals.append((time.perf_counter() - start, chunk))
+            return arrivals
+
+        arrivals = asyncio.run(consume())
+        self.assertEqual("".join(chunk for _, chunk in arrivals), "".join(_SlowStreamHandler.pieces))
+        # 20 pieces, 50 ms apart: the first must not wait for the whole response
+        self.assertLess(arrivals[0][0], arrivals[-1][0] / 2)
+
+    def test_consumer_leaving_early_stops_the_reader(self):
+        async def consume_two():
+            stream = genai_client.stream_genai([{"role": "user", "content": "hi"}])
+            taken = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return taken
+
+        with mock.patch.object(genai_client, "GENAI_STREAM_QUEUE_SIZE", 1):
+            self.assertEqual(asyncio.run(consume_two()), ["word0 ", "word1 "])
+        time.sleep(0.5)
+        self.assertLess(_SlowStreamHandler.written, len(_SlowStreamHandler.pieces))
+
+
+class StreamSanitizerTests(unittest.TestCase):
+    CASES = [
+        "Hello there, how are you today? I hope the weekend went well.",
+        "Plan: greet warmly and ask about the hike. Let's produce: Hi Sam! How was the hike?",
+        "Draft one. Final answer: That sounds lovely, tell me more.",
+        "Let's produce:   ",
+        "  padded reply with trailing space   ",
+    ]
+
+    def _client_view(self, text: str, rng: random.Random) -> str:
+        sanitizer = StreamSanitizer()
+        shown = ""
+        events = []
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 8)
+            events += sanitizer.feed(text[position:position + size])
+            position += size
+        events += sanitizer.finish()
+        for kind, piece in events:
+            if kind == "reset":
+                shown = ""
+            else:
+                shown += piece
+        self.assertEqual(sanitizer.text, sanitize_companion_public_output(text))
+        return shown
+
+    def test_streamed_text_matches_full_sanitizer(self):
+        rng = random.Random(5)
+        for text in self.CASES:
+            for _ in range(20):
+                self.assertEqual(self._client_view(text, rng), sanitize_companion_public_output(text))
+
+    def test_text_is_released_before_the_end(self):
+        sanitizer = StreamSanitizer()
+        events = sanitizer.feed("This is a long enough reply to pass the look-behind window. ")
+        self.assertEqual(events, [("token", "This is a long enough reply to pass")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""Unit tests for background memory consolidation (no running server required)."""
+import asyncio
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Memory, MemoryMergeSource, User
+from app import memory_consolidation, memory_manager
+from app.memory_context_cache import memory_context_cache
+from app.memory_index import memory_index
+
+
+class MemoryConsolidationTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        memory_context_cache.clear()
+        memory_index.clear()
+        self.uid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="PERSISTENT_USER",
+            )
+        )
+        self.db.commit()
+        self.base = datetime(2025, 1, 1)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _add(self, text: str, minute: int, **kwargs) -> Memory:
+        memory = memory_manager.create_memory_candidate(self.uid, None, text, self.db, is_active=True)
+        memory.created_at = self.base + timedelta(minutes=minute)
+        for key, value in kwargs.items():
+            setattr(memory, key, value)
+        self.db.commit()
+        return memory
+
+    def _run(self, **kwargs):
+        kwargs.setdefault("use_llm", False)
+        return asyncio.run(memory_consolidation.run_consolidation_batch(self.Session, **kwargs))
+
+    def _active_texts(self):
+        self.db.expire_all()
+        return sorted(
+            m.text for m in self.db.query(Memory).filter(Memory.user_id == self.uid, Memory.is_active == True)
+        )
+
+    def test_near_duplicates_are_merged_with_provenance(self):
+        first_session, second_session = uuid.uuid4(), uuid.uuid4()
+        first_id = self._add("User has a dog named Rex", 0, phase=1, session_id=first_session).memory_id
+        self._add("User has a pet dog named Rex", 1, phase=2, session_id=second_session)
+        self._add("User works as a nurse", 2)
+        result = self._run()
+        self.assertEqual((result.groups_merged, result.memories_merged, result.rule_merges), (1, 2, 1))
+        self.assertEqual(
+            self._active_texts(),
+            ["User has a dog named Rex; has a pet dog named Rex.", "User works as a nurse"],
+        )
+        merged = self.db.query(Memory).filter(Memory.text.like("%pet dog%")).one()
+        self.assertEqual(merged.phase, 2)
+        # Still visible to the session-scoped dedup and extractor context
+        self.assertEqual(merged.session_id, second_session)
+        self.assertIn(
+            merged.text, memory_manager.get_all_existing_memories(self.uid, second_session, self.db)
+        )
+        sources = self.db.query(MemoryMergeSource).filter(MemoryMergeSource.memory_id == merged.memory_id).all()
+        self.assertEqual(len(sources), 2)
+        self.assertIn(first_id, {source.source_memory_id for source in sources})
+        # Nothing changed since, so the next batch skips the user
+        self.assertEqual(self._run().users_scanned, 0)
+
+    def test_user_edited_memories_are_never_merged(self):
+        memory = self._add("User has a dog named Rex", 0)
+        memory_manager.update_memory(memory.memory_id, "User has a dog named Rex!", None, self.db)
+        self._add("User has a dog named Rex", 1)
+        self.assertEqual(self._run().groups_merged, 0)
+        self.assertEqual(len(self._active_texts()), 2)
+
+    def test_ceiling_rolls_up_oldest_memories(self):
+        for i, text in enumerate(["likes tea", "plays chess", "lives in Ohio", "owns a bike", "speaks French"]):
+            self._add(f"User {text}", i)
+        result = self._run(ceiling=3)
+        self.assertEqual(len(self._active_texts()), 3)
+        self.assertIn("User likes tea; plays chess; lives in Ohio.", self._active_texts())
+        self.assertEqual(result.memories_merged, 3)
+
+    def test_group_is_skipped_if_a_memory_is_deleted_during_the_llm_call(self):
+        doomed_id = self._add("User has a dog named Rex", 0).memory_id
+        self._add("User has a pet dog named Rex", 1)
+
+        async def delete_then_merge(texts):
+            other = self.Session()
+            memory_manager.delete_memory(doomed_id, other)
+            other.close()
+            return "User has a dog named Rex, age five."
+
+        with mock.patch.object(memory_consolidation, "llm_merge", delete_then_merge):
+            result = self._run(use_llm=True)
+        self.assertEqual((result.groups_merged, result.groups_skipped), (0, 1))
+        self.assertEqual(self._active_texts(), ["User has a pet dog named Rex"])
+
+    def test_llm_merge_text_is_used(self):
+        self._add("User has a dog named Rex", 0)
+        self._add("User has a pet dog named Rex", 1)
+
+        async def fake_merge(texts):
+            return "User has a five-year-old dog named Rex."
+
+        with mock.patch.object(memory_consolidation, "llm_merge", fake_merge):
+            result = self._run(use_llm=True)
+        self.assertEqual(result.llm_merges, 1)
+        self.assertEqual(self._active_texts(), ["User has a five-year-old dog named Rex."])
+
+    def test_contradicting_or_loosely_similar_facts_are_not_merged(self):
+        self._add("User has two sisters", 0)
+        self._add("User has three sisters", 1)
+        self._add("User is married", 2)
+        self._add("User is not married", 3)
+        self._add("User lives in Ohio", 4)
+        self._add("User lives in Iowa", 5)
+        self._add("User is happy with their job", 6)
+        self._add("User is unhappy with their job", 7)
+        self._add("User has a sister named Anna", 8)
+        self._add("User has a sister named Hanna", 9)
+        self.assertEqual(self._run().groups_merged, 0)
+        self.assertEqual(len(self._active_texts()), 10)
+
+    def test_rule_merge_keeps_every_fact(self):
+        texts = ["User has a dog named Rex", "User has a dog named Rex!", "User has a pet dog named Rex"]
+        self.assertEqual(
+            memory_consolidation.rule_merge(texts, "similar"),
+            "User has a dog named Rex; has a pet dog named Rex.",
+        )
+        long_facts = [f"User has a dog named Rex who {'really ' * 12}likes {food}" for food in ("bones", "toys")]
+        self.assertIsNone(memory_consolidation.rule_merge(long_facts, "similar"))
+
+
+if __name__ == "__main__":
+    unittest.main()
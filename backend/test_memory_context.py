@@ -0,0 +1,144 @@
+"""Unit tests for memory_manager.get_context (no running server required)."""
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Memory, Message, User, Session as StudySession
+from app import memory_manager
+from app.context_budget import estimate_tokens
+from app.memory_context_cache import memory_context_cache
+
+
+class MemoryContextTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        memory_context_cache.clear()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="PERSISTENT_AUTO",
+            )
+        )
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        base = datetime(2025, 1, 1)
+        for i in range(3):
+            self.db.add(
+                Memory(
+                    user_id=self.uid,
+                    session_id=self.sid,
+                    text=f"fact {i}",
+                    is_active=i != 1,
+                    created_at=base + timedelta(minutes=i),
+                )
+            )
+        for i in range(12):
+            role = "user" if i % 2 == 0 else "assistant"
+            self.db.add(Message(session_id=self.sid, role=role, content=f"msg {i}"))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_persistent_context_lists_memories_then_recent_messages(self):
+        context = memory_manager.get_context(self.uid, self.sid, "PERSISTENT_USER", self.db)
+        self.assertEqual(
+            context.split("\n"),
+            [
+                "Memory: fact 2",
+                "Memory: fact 0",
+                "Assistant: msg 7",
+                "User: msg 8",
+                "Assistant: msg 9",
+                "User: msg 10",
+                "Assistant: msg 11",
+            ],
+        )
+
+    def test_session_context_has_last_ten_messages_only(self):
+        lines = memory_manager.get_context(self.uid, self.sid, "SESSION_AUTO", self.db).split("\n")
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(lines[0], "User: msg 2")
+        self.assertEqual(lines[-1], "Assistant: msg 11")
+        self.assertEqual(memory_manager.get_context(self.uid, self.sid, "UNKNOWN", self.db), "")
+
+    def test_context_is_one_round_trip_and_fits_the_token_budget(self):
+        self.db.add(Memory(user_id=self.uid, session_id=self.sid, text="x " * 5000, is_active=True))
+        self.db.commit()
+        self.user = self.db.get(User, self.uid)  # /chat holds the loaded user
+        statements = []
+        capture = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", capture)
+        try:
+            context, budget = memory_manager.build_context(
+                self.uid, self.sid, "PERSISTENT_AUTO", self.db, reserved_tokens=500
+            )
+        finally:
+            event.remove(self.engine, "before_cursor_execute", capture)
+        self.assertEqual(len(statements), 1)
+        lines = context.split("\n")
+        # Recent turns survive; the oversized newest memory is clipped and older ones dropped
+        self.assertEqual(lines[-5:], ["Assistant: msg 7", "User: msg 8", "Assistant: msg 9", "User: msg 10", "Assistant: msg 11"])
+        self.assertTrue(lines[0].startswith("Memory: x x") and lines[0].endswith(" …"))
+        self.assertEqual(len(lines), 6)
+        self.assertEqual((budget.messages_kept, budget.memories_kept, budget.memories_dropped), (5, 1, 2))
+        self.assertLessEqual(budget.memory_tokens + budget.message_tokens, budget.total - budget.system)
+        self.assertLessEqual(estimate_tokens(context), 1500)
+
+    def _context_with_statements(self):
+        self.user = self.db.get(User, self.uid)  # /chat holds the loaded user
+        statements = []
+        capture = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", capture)
+        try:
+            context = memory_manager.get_context(self.uid, self.sid, "PERSISTENT_AUTO", self.db)
+        finally:
+            event.remove(self.engine, "before_cursor_execute", capture)
+        return context, statements
+
+    def test_memory_block_is_cached_until_a_memory_write(self):
+        first, _ = self._context_with_statements()
+        hits = memory_context_cache.stats()["hits"]
+        second, statements = self._context_with_statements()
+        self.assertEqual(first, second)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn("memories", statements[0])
+        self.assertEqual(memory_context_cache.stats()["hits"], hits + 1)
+
+        memory = memory_manager.create_memory_candidate(
+            self.uid, self.sid, "likes hiking", self.db, is_active=True
+        )
+        self.assertIn("Memory: likes hiking", self._context_with_statements()[0])
+        memory_manager.update_memory(memory.memory_id, "likes climbing", None, self.db)
+        self.assertIn("Memory: likes climbing", self._context_with_statements()[0])
+        memory_manager.delete_memory(memory.memory_id, self.db)
+        self.assertNotIn("climbing", self._context_with_statements()[0])
+
+    def test_write_from_another_worker_invalidates_by_version(self):
+        self._context_with_statements()
+        other = self.Session()
+        memory_manager.create_memory_candidate(
+            self.uid, self.sid, "owns a cat", other, is_active=True
+        )
+        other.close()
+        # Simulate the other worker: this process never saw the write locally.
+        memory_context_cache.put(self.uid, 0, 20, ["fact 2", "fact 0"])
+        self.db.expire_all()
+        self.assertIn("Memory: owns a cat", self._context_with_statements()[0])
+        self.assertEqual(memory_context_cache.stats()["stale"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""Unit tests for memory deduplication on normalized text (no running server required)."""
+import unittest
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import User, Session as StudySession
+from app import memory_manager, memory_similarity
+from app.memory_context_cache import memory_context_cache
+
+
+class MemoryDedupTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        memory_context_cache.clear()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.other_sid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="SESSION_AUTO",
+            )
+        )
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        self.db.add(StudySession(session_id=self.other_sid, user_id=self.uid))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_duplicate_matches_normalized_text_within_scope(self):
+        memory_manager.create_memory_candidate(self.uid, self.sid, "User  Likes   TEA", self.db)
+        self.assertTrue(memory_manager.check_memory_duplicate("likes tea", self.uid, self.sid, self.db))
+        self.assertFalse(memory_manager.check_memory_duplicate("likes coffee", self.uid, self.sid, self.db))
+        # Session modes only look within the session; persistent modes look user-wide.
+        self.assertFalse(memory_manager.check_memory_duplicate("likes tea", self.uid, self.other_sid, self.db))
+        self.assertTrue(memory_manager.check_memory_duplicate("likes tea", self.uid, None, self.db))
+
+    def test_update_keeps_hash_in_sync(self):
+        memory = memory_manager.create_memory_candidate(self.uid, self.sid, "likes tea", self.db)
+        memory_manager.update_memory(memory.memory_id, "User likes coffee", None, self.db)
+        self.assertFalse(memory_manager.check_memory_duplicate("likes tea", self.uid, self.sid, self.db))
+        self.assertTrue(memory_manager.check_memory_duplicate("likes coffee", self.uid, self.sid, self.db))
+
+    def test_ingest_candidates_dedupes_batch_and_existing_rows(self):
+        memory_manager.create_memory_candidate(self.uid, self.sid, "likes tea", self.db)
+        created = memory_manager.ingest_candidates(
+            self.uid,
+            self.sid,
+            ["User likes tea", "has a dog", "User has a dog", "lives in Ohio"],
+            self.db,
+            phase=2,
+            active=True,
+        )
+        self.assertEqual([m.text for m in created], ["has a dog", "lives in Ohio"])
+        self.assertTrue(all(m.is_active and m.phase == 2 and m.memory_id for m in created))
+        self.assertTrue(memory_manager.check_memory_duplicate("lives in ohio", self.uid, self.sid, self.db))
+        self.assertEqual(len(memory_manager.get_all_existing_memories(self.uid, self.sid, self.db)), 3)
+        self.assertEqual(memory_manager.ingest_candidates(self.uid, self.sid, ["has a dog"], self.db), [])
+
+    def test_ingest_candidates_skips_near_duplicates(self):
+        memory_manager.create_memory_candidate(self.uid, self.sid, "User has a dog named Rex", self.db)
+        created = memory_manager.ingest_candidates(
+            self.uid,
+            self.sid,
+            ["User has a dog named Rex!", "User plays the violin", "User plays violin"],
+            self.db,
+            near_dup_threshold=0.7,
+        )
+        self.assertEqual([m.text for m in created], ["User plays the violin"])
+        created = memory_manager.ingest_candidates(
+            self.uid, self.sid, ["User plays violin"], self.db, near_dup_threshold=0
+        )
+        self.assertEqual(len(created), 1)
+
+    def test_cluster_groups_near_duplicates(self):
+        texts = [
+            "User has a dog named Rex",
+            "User likes tea",
+            "User has a dog named Rex.",
+            "User works as a nurse",
+            "User has a dog named Rex!!",
+        ]
+        matrix = memory_similarity.signatures(texts)
+        self.assertEqual(memory_similarity.similarity(matrix[0], matrix).round(2).tolist()[2], 1.0)
+        self.assertEqual(memory_similarity.cluster(matrix, 0.8), [[0, 2, 4]])
+
+    def test_negated_and_number_changed_facts_are_not_duplicates(self):
+        pairs = [
+            ("User is married", "User is not married"),
+            ("User has a dog", "User does not have a dog"),
+            ("User has kids", "User has no kids"),
+            ("User doesn't eat meat", "User eats meat"),
+            ("User has two sisters", "User has three sisters"),
+            ("User is 25 years old", "User is 26 years old"),
+        ]
+        for a, b in pairs:
+            matrix = memory_similarity.signatures([a, b])
+            self.assertLess(memory_similarity.similarity(matrix[0], matrix)[1], 0.1, (a, b))
+
+        memory_manager.create_memory_candidate(self.uid, self.sid, "User is married", self.db)
+        memory_manager.create_memory_candidate(self.uid, self.sid, "User has two sisters", self.db)
+        created = memory_manager.ingest_candidates(
+            self.uid, self.sid, ["User is not married", "User has three sisters"], self.db,
+            near_dup_threshold=0.8,
+        )
+        self.assertEqual([m.text for m in created], ["User is not married", "User has three sisters"])
+
+    def test_prefix_negated_and_renamed_facts_are_not_duplicates(self):
+        pairs = [
+            ("User is happy with their job", "User is unhappy with their job"),
+            ("User likes tea", "User dislikes tea"),
+            ("User has a sister named Anna", "User has a sister named Hanna"),
+            ("User lives in Ohio", "User lives in Iowa"),
+        ]
+        for a, b in pairs:
+            matrix = memory_similarity.signatures([a, b])
+            self.assertLess(memory_similarity.similarity(matrix[0], matrix)[1], 0.1, (a, b))
+            memory_manager.create_memory_candidate(self.uid, self.sid, a, self.db)
+        created = memory_manager.ingest_candidates(
+            self.uid, self.sid, [b for _, b in pairs], self.db, near_dup_threshold=0.8
+        )
+        self.assertEqual([m.text for m in created], [b for _, b in pairs])
+
+    def test_near_duplicate_skipping_is_off_by_default(self):
+        self.assertEqual(memory_similarity.MEMORY_NEAR_DUP_THRESHOLD, 0)
+        memory_manager.create_memory_candidate(self.uid, self.sid, "User has a dog named Rex", self.db)
+        created = memory_manager.ingest_candidates(
+            self.uid, self.sid, ["User has a pet dog named Rex"], self.db
+        )
+        self.assertEqual(len(created), 1)
+
+    def test_same_guard_key_still_matches(self):
+        matrix = memory_similarity.signatures(["User doesn't have kids", "User does not have kids"])
+        self.assertEqual(memory_similarity.similarity(matrix[0], matrix)[1], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
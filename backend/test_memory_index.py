@@ -0,0 +1,151 @@
+"""Unit tests for the per-user BM25 memory index (no running server required)."""
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, turn_unit_of_work
+from app.models import Memory, User, Session as StudySession
+from app import memory_manager
+from app.memory_context_cache import memory_context_cache
+from app.memory_index import UserMemoryIndex, memory_index
+
+
+class UserMemoryIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = UserMemoryIndex(version=0)
+        self.ids = [uuid.uuid4() for _ in range(4)]
+        for memory_id, text in zip(
+            self.ids,
+            ["User has a dog named Rex", "User likes hiking", "User works as a nurse", "User likes tea"],
+        ):
+            self.index.upsert(memory_id, text)
+
+    def test_top_k_prefers_relevance_then_recency(self):
+        self.assertEqual(self.index.top_k("I took my dog out today", 2), ["User has a dog named Rex", "User likes tea"])
+        # No match: plain recency, identical to the SQL path
+        self.assertEqual(self.index.top_k("hello", 2), ["User likes tea", "User works as a nurse"])
+        self.assertEqual(len(self.index.top_k("dog", 10)), 4)
+
+    def test_incremental_update_and_remove(self):
+        self.index.upsert(self.ids[1], "User likes swimming")
+        self.index.remove(self.ids[0])
+        self.assertEqual(self.index.top_k("swimming dog", 1), ["User likes swimming"])
+        self.assertNotIn("User has a dog named Rex", self.index.top_k("dog", 10))
+        self.assertEqual(self.index.scores("hiking"), {})
+
+
+class RelevanceContextTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        memory_context_cache.clear()
+        memory_index.clear()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="PERSISTENT_AUTO",
+            )
+        )
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        base = datetime(2025, 1, 1)
+        self.db.add(Memory(user_id=self.uid, text="User grew up in Lisbon", is_active=True, created_at=base))
+        for i in range(25):
+            self.db.add(
+                Memory(
+                    user_id=self.uid,
+                    text=f"User fact number {i}",
+                    is_active=True,
+                    created_at=base + timedelta(minutes=i + 1),
+                )
+            )
+        self.db.commit()
+        self.user = self.db.get(User, self.uid)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _memory_lines(self, query_text):
+        context = memory_manager.get_context(
+            self.uid, self.sid, "PERSISTENT_AUTO", self.db, query_text=query_text
+        )
+        return [line for line in context.split("\n") if line.startswith("Memory: ")]
+
+    def test_relevant_old_memory_is_selected(self):
+        lines = self._memory_lines("I miss Lisbon")
+        self.assertEqual(len(lines), 20)
+        self.assertEqual(lines[0], "Memory: User grew up in Lisbon")
+        self.assertEqual(lines[1], "Memory: User fact number 24")
+        self.assertNotIn("Memory: User fact number 5", lines)
+        # Without a match the selection equals recency selection
+        self.assertEqual(self._memory_lines("hello"), self._memory_lines(None))
+
+    def test_local_writes_update_the_index_in_place(self):
+        self._memory_lines("Lisbon")
+        memory = memory_manager.create_memory_candidate(
+            self.uid, None, "User plays the cello", self.db, is_active=True
+        )
+        self.user = self.db.get(User, self.uid)
+        self.assertIn("Memory: User plays the cello", self._memory_lines("cello"))
+        memory_manager.delete_memory(memory.memory_id, self.db)
+        self.user = self.db.get(User, self.uid)
+        self.assertNotIn("Memory: User plays the cello", self._memory_lines("cello"))
+        self.assertEqual(memory_index.stats()["builds"], 1)
+
+    def test_ranked_selection_is_cached_under_the_query_terms(self):
+        lines = self._memory_lines("I miss Lisbon")
+        index_hits = memory_index.stats()["hits"]
+        cache_hits = memory_context_cache.stats()["hits"]
+        self.assertEqual(self._memory_lines("i MISS lisbon!"), lines)
+        self.assertEqual(memory_context_cache.stats()["hits"], cache_hits + 1)
+        self.assertEqual(memory_index.stats()["hits"], index_hits)
+        # Different terms rank again against the index
+        self.assertNotEqual(self._memory_lines("fact number 3")[0], lines[0])
+        self.assertEqual(memory_index.stats()["hits"], index_hits + 1)
+        # A write moves the version, so the cached selection is not reused
+        memory_manager.create_memory_candidate(self.uid, None, "User moved to Lisbon", self.db, is_active=True)
+        self.user = self.db.get(User, self.uid)
+        self.assertIn("Memory: User moved to Lisbon", self._memory_lines("I miss Lisbon"))
+
+    def test_rolled_back_write_never_reaches_the_index(self):
+        self._memory_lines("Lisbon")
+        before = memory_index.stats()
+
+        def locked(conn):
+            raise RuntimeError("database is locked")
+
+        event.listen(self.engine, "commit", locked)
+        with self.assertRaises(RuntimeError):
+            with turn_unit_of_work(self.db):
+                memory_manager.create_memory_candidate(
+                    self.uid, None, "User plays the cello", self.db, is_active=True
+                )
+        event.remove(self.engine, "commit", locked)
+        self.assertEqual(memory_index.stats()["updates"], before["updates"])
+
+        # Another worker's committed write takes the version the rolled-back one had.
+        self.db.execute(update(User).where(User.user_id == self.uid).values(memory_version=User.memory_version + 1))
+        self.db.commit()
+        self.user = self.db.get(User, self.uid)
+        self.assertNotIn("Memory: User plays the cello", self._memory_lines("cello"))
+        self.assertEqual(memory_index.stats()["builds"], before["builds"] + 1)
+
+    def test_write_after_another_workers_write_drops_the_index(self):
+        self._memory_lines("Lisbon")
+        self.db.execute(update(User).where(User.user_id == self.uid).values(memory_version=User.memory_version + 1))
+        self.db.commit()
+        memory_manager.create_memory_candidate(self.uid, None, "User plays the cello", self.db, is_active=True)
+        self.assertEqual(memory_index.stats()["users"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 """Unit tests for memory phase recap filtering (no running server required)."""
+import json
 import unittest
 import uuid
 
@@ -7,7 +8,8 @@ from sqlalchemy.orm import sessionmaker
 
 from app.database import Base
 from app.models import User, Session as StudySession
-from app.memory_manager import create_memory_candidate, get_memory_recap
+from app.memory_manager import create_memory_candidate, delete_memory, get_memory_recap
+from app.memory_recap import build_snapshot, get_snapshot, snapshot_phase_end
 
 
 class MemoryRecapTests(unittest.TestCase):
@@ -81,6 +83,25 @@ class MemoryRecapTests(unittest.TestCase):
         r = get_memory_recap(uid, sid, 1, "PERSISTENT_USER", self.db)
         self.assertEqual([x.text for x in r], ["old"])
 
+    def test_snapshot_served_until_memories_change(self):
+        uid = self._add_user("PERSISTENT_AUTO")
+        sid = self._add_session(uid)
+        create_memory_candidate(uid, sid, "a", self.db, is_active=True, phase=1)
+        b = create_memory_candidate(uid, sid, "b", self.db, is_active=True, phase=1)
+        self.assertIsNone(get_snapshot(self.db, uid, sid, 1))
+
+        snapshot_phase_end(self.db, uid, sid, 1, "PERSISTENT_AUTO")
+        body = get_snapshot(self.db, uid, sid, 1)
+        self.assertEqual(sorted(row["text"] for row in json.loads(body)), ["a", "b"])
+        self.assertIsNone(get_snapshot(self.db, uid, sid, 2))
+        self.assertIsNone(get_snapshot(self.db, uuid.uuid4(), sid, 1))
+
+        delete_memory(b.memory_id, self.db)
+        self.assertIsNone(get_snapshot(self.db, uid, sid, 1))
+        rebuilt = build_snapshot(self.db, uid, sid, 1, "PERSISTENT_AUTO")
+        self.assertEqual([row["text"] for row in json.loads(rebuilt)], ["a"])
+        self.assertEqual(get_snapshot(self.db, uid, sid, 1), rebuilt)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+"""Check that the hot query shapes are served by an index (SQLite EXPLAIN QUERY PLAN)."""
+import unittest
+import uuid
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Message, User, Session as StudySession
+from app import logging as event_log
+from app import memory_manager
+from app.routers import auth, chat
+
+HOT_TABLES = ("messages", "memories", "sessions", "events")
+
+
+class QueryIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="PERSISTENT_AUTO",
+            )
+        )
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        self.db.commit()
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._capture)
+
+    def tearDown(self):
+        event.remove(self.engine, "before_cursor_execute", self._capture)
+        self.db.close()
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def _plans(self):
+        plans = []
+        with self.engine.connect() as conn:
+            for statement, parameters in self.statements:
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+                plans.append((statement, [row[-1] for row in rows]))
+        return plans
+
+    def assertIndexed(self, ordered: bool = True):
+        plans = self._plans()
+        self.assertTrue(plans)
+        for statement, details in plans:
+            for detail in details:
+                for table in HOT_TABLES:
+                    self.assertNotEqual(detail, f"SCAN {table}", f"full scan of {table}: {statement}")
+                if ordered:
+                    self.assertNotIn("TEMP B-TREE", detail, f"sort without index: {statement}")
+
+    def test_memory_manager_reads(self):
+        for condition in ("SESSION_AUTO", "PERSISTENT_AUTO", "PERSISTENT_USER"):
+            memory_manager.get_context(self.uid, self.sid, condition, self.db)
+            memory_manager.get_memory_recap(self.uid, self.sid, 1, condition, self.db)
+        memory_manager.get_memory_candidates(self.uid, self.sid, self.db)
+        memory_manager.get_all_existing_memories(self.uid, self.sid, self.db)
+        memory_manager.check_memory_duplicate("User likes tea", self.uid, self.sid, self.db)
+        self.assertIndexed()
+
+    def test_chat_turn_reads(self):
+        chat._resolve_session_phase(self.db, self.uid, self.sid, None)
+        event_log._latest_progress_from_events(self.db, self.uid, self.sid)
+        (
+            self.db.query(Message)
+            .filter(Message.session_id == self.sid, Message.role == "assistant")
+            .order_by(Message.seq.desc())
+            .first()
+        )
+        self.db.query(Message).filter(Message.session_id == self.sid, Message.role == "user").count()
+        self.assertIndexed()
+
+    def test_active_session_lookup(self):
+        auth._find_active_session_for_phase(self.db, self.uid, 1)
+        # The phase map reads an IN-list of sessions, so only require index lookups there.
+        self.assertIndexed(ordered=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Unit tests for the read-only list projections (no running server required)."""
+import unittest
+import uuid
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import read_models, schemas
+from app.database import Base
+from app.memory_manager import create_memory_candidate, get_memory_candidates, update_memory
+from app.models import Memory, Message, Session as StudySession, User
+
+
+class ReadModelTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.db.add(User(user_id=self.uid, username=f"u{self.uid.hex[:10]}", password_hash="x", condition_id="PERSISTENT_USER"))
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_memory_json_matches_response_model(self):
+        create_memory_candidate(self.uid, self.sid, "User likes tea", self.db, is_active=True, phase=1)
+        edited = create_memory_candidate(self.uid, self.sid, "User plays chess", self.db)
+        update_memory(edited.memory_id, "User plays chess weekly", None, self.db)
+        create_memory_candidate(self.uid, None, "User lives in Ohio", self.db)
+
+        adapter = TypeAdapter(List[schemas.MemoryResponse])
+        orm_rows = self.db.query(Memory).filter(Memory.user_id == self.uid).order_by(Memory.created_at.desc()).all()
+        self.assertEqual(
+            read_models.dump_json(read_models.memories(self.db, self.uid)),
+            adapter.dump_json([schemas.MemoryResponse.model_validate(m) for m in orm_rows]),
+        )
+        self.assertEqual(
+            read_models.dump_json(read_models.memory_candidates(self.db, self.uid, self.sid)),
+            adapter.dump_json(
+                [schemas.MemoryResponse.model_validate(m) for m in get_memory_candidates(self.uid, self.sid, self.db)]
+            ),
+        )
+        self.assertEqual(len(read_models.memories(self.db, self.uid, self.sid)), 2)
+
+    def test_message_json_matches_response_model(self):
+        for i in range(4):
+            self.db.add(Message(session_id=self.sid, role="user" if i % 2 == 0 else "assistant", content=f"m{i}"))
+        self.db.commit()
+        orm_rows = self.db.query(Message).filter(Message.session_id == self.sid).order_by(Message.seq).all()
+        self.assertEqual(
+            read_models.dump_json(read_models.session_messages(self.db, self.sid)),
+            TypeAdapter(List[schemas.MessageResponse]).dump_json(
+                [schemas.MessageResponse.model_validate(m) for m in orm_rows]
+            ),
+        )
+        self.assertEqual([m.content for m in read_models.session_messages(self.db, self.sid)], ["m0", "m1", "m2", "m3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
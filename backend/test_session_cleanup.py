@@ -0,0 +1,194 @@
+"""Unit tests for the deferred SESSION_AUTO memory cleanup sweeper (no running server required)."""
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import database, schemas
+from app import logging as event_log
+from app.database import Base
+from app.memory_manager import create_memory_candidate
+from app.models import Event, Memory, Message, Session as StudySession, User
+from app.routers.auth import qualtrics_authenticate
+from app.session_cleanup import SessionCleanupSweeper, clear_session, expire_idle_sessions
+
+
+class SessionCleanupTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        self.sweeper = SessionCleanupSweeper(
+            batch_sessions=2, abandoned_ttl_sec=3600, idle_ttl_sec=0, session_factory=self.Session
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def _add_user(self, condition_id: str):
+        uid = uuid.uuid4()
+        self.db.add(User(user_id=uid, username=f"u{uid.hex[:10]}", password_hash="x", condition_id=condition_id))
+        self.db.commit()
+        return uid
+
+    def _add_session(self, user_id, condition_id, memories=0, ended_at=None, started_at=None):
+        sid = uuid.uuid4()
+        self.db.add(StudySession(
+            session_id=sid, user_id=user_id, condition_id=condition_id,
+            ended_at=ended_at, started_at=started_at or datetime.utcnow(),
+        ))
+        self.db.commit()
+        for i in range(memories):
+            create_memory_candidate(user_id, sid, f"User fact {i}", self.db, is_active=True)
+        return sid
+
+    def _memory_count(self, sid):
+        self.db.expire_all()
+        return self.db.query(Memory).filter(Memory.session_id == sid).count()
+
+    def test_ended_session_auto_sessions_are_cleared(self):
+        uid = self._add_user("SESSION_AUTO")
+        long_ago = datetime.utcnow() - timedelta(minutes=10)
+        ended = [self._add_session(uid, "SESSION_AUTO", memories=3, ended_at=long_ago) for _ in range(3)]
+        legacy = self._add_session(uid, None, memories=2, ended_at=long_ago)
+        open_sid = self._add_session(uid, "SESSION_AUTO", memories=2)
+        persistent = self._add_session(self._add_user("PERSISTENT_AUTO"), "PERSISTENT_AUTO", memories=2, ended_at=long_ago)
+
+        self.assertEqual(self.sweeper.sweep_once(), 11)
+        for sid in ended + [legacy]:
+            self.assertEqual(self._memory_count(sid), 0)
+            self.assertIsNotNone(self.db.get(StudySession, sid).memories_cleared_at)
+        self.assertEqual(self._memory_count(open_sid), 2)
+        self.assertEqual(self._memory_count(persistent), 2)
+
+        stats = self.sweeper.stats()
+        self.assertEqual((stats["sessions_cleaned"], stats["pending"]), (4, 0))
+        self.assertGreaterEqual(stats["lag_seconds"], 590)
+        # Nothing pending: the next sweep is a no-op
+        self.assertEqual(self.sweeper.sweep_once(), 0)
+        self.assertEqual(self.sweeper.stats()["lag_seconds"], 0)
+
+    def test_chunks_cover_every_memory(self):
+        uid = self._add_user("SESSION_AUTO")
+        sid = self._add_session(uid, "SESSION_AUTO", memories=5, ended_at=datetime.utcnow())
+        self.assertEqual(clear_session(self.db, sid, uid, chunk_size=2), 5)
+        self.assertEqual(self._memory_count(sid), 0)
+
+    def test_abandoned_open_sessions_are_cleared_after_ttl(self):
+        uid = self._add_user("SESSION_AUTO")
+        two_hours_ago = datetime.utcnow() - timedelta(hours=2)
+        idle = self._add_session(uid, "SESSION_AUTO", memories=2, started_at=two_hours_ago)
+        active = self._add_session(uid, "SESSION_AUTO", memories=2, started_at=two_hours_ago)
+        self.db.add(Message(session_id=active, role="user", content="still here"))
+        self.db.commit()
+
+        self.sweeper.sweep_once()
+        self.assertEqual(self._memory_count(idle), 0)
+        self.assertIsNone(self.db.get(StudySession, idle).ended_at)
+        self.assertEqual(self._memory_count(active), 2)
+        self.assertEqual(self.sweeper.stats()["abandoned_cleaned"], 1)
+
+    def test_idle_sessions_are_ended_in_batches_with_events(self):
+        uid = self._add_user("PERSISTENT_AUTO")
+        auto_uid = self._add_user("SESSION_AUTO")
+        two_hours_ago = datetime.utcnow() - timedelta(hours=2)
+        idle = [self._add_session(uid, "PERSISTENT_AUTO", started_at=two_hours_ago) for _ in range(3)]
+        idle_auto = self._add_session(auto_uid, "SESSION_AUTO", memories=2, started_at=two_hours_ago)
+        talking = self._add_session(uid, "PERSISTENT_AUTO", started_at=two_hours_ago)
+        self.db.add(Message(session_id=talking, role="user", content="still here"))
+        fresh = self._add_session(uid, "PERSISTENT_AUTO")
+
+        idle_before = datetime.utcnow() - timedelta(hours=1)
+        self.assertEqual(len(expire_idle_sessions(self.db, idle_before, limit=2)), 2)
+        sweeper = SessionCleanupSweeper(
+            idle_ttl_sec=3600, expiry_batch=2, abandoned_ttl_sec=0, session_factory=self.Session
+        )
+        sweeper.sweep_once()
+
+        self.db.expire_all()
+        for sid in idle + [idle_auto]:
+            self.assertIsNotNone(self.db.get(StudySession, sid).ended_at)
+        for sid in (talking, fresh):
+            self.assertIsNone(self.db.get(StudySession, sid).ended_at)
+        events = self.db.query(Event).filter(Event.type == "session_ended").all()
+        self.assertEqual(sorted(e.session_id for e in events), sorted(idle + [idle_auto]))
+        self.assertEqual(sweeper.stats()["sessions_expired"], 2)
+        # Expired SESSION_AUTO sessions are cleaned in the same sweep
+        self.assertEqual(self._memory_count(idle_auto), 0)
+
+    def test_idle_qualtrics_session_is_kept_and_resumed(self):
+        uid = self._add_user("SESSION_AUTO")
+        self.db.get(User, uid).qualtrics_id = "R_idle"
+        self.db.commit()
+        sid = self._add_session(
+            uid, "SESSION_AUTO", memories=2, started_at=datetime.utcnow() - timedelta(hours=2)
+        )
+        event_log.log_progress_update(
+            self.db, uid, sid,
+            current_phase=2, current_prompt_index=3, followups_used_for_prompt=0,
+            phase_complete=False, study_complete=False, name_collected=True, preferred_name="Sam",
+        )
+        sweeper = SessionCleanupSweeper(
+            idle_ttl_sec=3600, abandoned_ttl_sec=0, session_factory=self.Session
+        )
+        sweeper.sweep_once()
+        self.db.expire_all()
+        self.assertIsNone(self.db.get(StudySession, sid).ended_at)
+        self.assertEqual(sweeper.stats()["sessions_expired"], 0)
+
+        response = qualtrics_authenticate(schemas.QualtricsAuthenticateRequest(qualtrics_id="R_idle"), self.db)
+        self.assertEqual((response.session_id, response.phase, response.resumed_session), (sid, 2, True))
+        self.assertEqual(self._memory_count(sid), 2)
+
+    def test_upgrade_stamps_sessions_ended_before_the_sweeper(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        engine = create_engine(f"sqlite:///{path}")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_sessions_condition_cleared_ended"))
+            conn.execute(text("ALTER TABLE sessions DROP COLUMN memories_cleared_at"))
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        uid = uuid.uuid4()
+        db.add(User(user_id=uid, username="kept", password_hash="x", condition_id="SESSION_AUTO"))
+        db.commit()
+        ended, open_sid = uuid.uuid4(), uuid.uuid4()
+        # The ORM model already has the column, so the pre-upgrade rows go in as SQL.
+        for sid, ended_at in ((ended, datetime.utcnow()), (open_sid, None)):
+            db.execute(
+                text(
+                    "INSERT INTO sessions (session_id, user_id, condition_id, started_at, ended_at) "
+                    "VALUES (:sid, :uid, 'SESSION_AUTO', :started_at, :ended_at)"
+                ),
+                {"sid": sid.hex, "uid": uid.hex, "started_at": datetime.utcnow(), "ended_at": ended_at},
+            )
+        db.commit()
+        create_memory_candidate(uid, ended, "User kept this", db, is_active=True)
+        db.close()
+
+        with mock.patch.object(database, "engine", engine), \
+                mock.patch.object(database, "DATABASE_URL", f"sqlite:///{path}"):
+            database.init_db()
+
+        db = Session()
+        self.assertIsNotNone(db.get(StudySession, ended).memories_cleared_at)
+        self.assertIsNone(db.get(StudySession, open_sid).memories_cleared_at)
+        sweeper = SessionCleanupSweeper(abandoned_ttl_sec=0, idle_ttl_sec=0, session_factory=Session)
+        self.assertEqual(sweeper.sweep_once(), 0)
+        self.assertEqual(db.query(Memory).filter(Memory.session_id == ended).count(), 1)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""Unit tests for the materialized session_progress row (no running server required)."""
+import unittest
+import uuid
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import backfill_session_progress
+from app.database import Base
+from app.models import Event, SessionProgress, User, Session as StudySession
+from app import logging as event_log
+from app.progress_cache import progress_cache
+
+
+class SessionProgressTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        progress_cache.clear()
+        self.uid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="SESSION_AUTO",
+            )
+        )
+        self.sid = uuid.uuid4()
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _log(self, prompt_index: int):
+        event_log.log_progress_update(
+            self.db,
+            self.uid,
+            self.sid,
+            current_phase=1,
+            current_prompt_index=prompt_index,
+            followups_used_for_prompt=0,
+            phase_complete=False,
+            study_complete=False,
+        )
+
+    def test_progress_update_rewrites_single_row_and_appends_events(self):
+        self._log(0)
+        self._log(1)
+        self.assertEqual(self.db.query(SessionProgress).count(), 1)
+        self.assertEqual(self.db.query(Event).filter(Event.type == "progress_update").count(), 2)
+        progress = event_log.get_latest_progress(self.db, self.uid, self.sid)
+        self.assertEqual(progress["current_prompt_index"], 1)
+
+    def test_falls_back_to_event_log_for_legacy_sessions(self):
+        event_log.log_event(
+            self.db,
+            "progress_update",
+            self.uid,
+            {"session_id": str(self.sid), "current_phase": 2, "current_prompt_index": 3},
+        )
+        progress = event_log.get_latest_progress(self.db, self.uid, self.sid)
+        self.assertEqual(progress["current_phase"], 2)
+
+    def test_session_events_populate_session_id_column(self):
+        event_log.log_message_sent(self.db, self.uid, self.sid, "hi")
+        event_log.log_event(self.db, "custom", self.uid, {"session_id": str(self.sid)})
+        event_log.log_memory_created(self.db, self.uid, uuid.uuid4())
+        rows = {e.type: e.session_id for e in self.db.query(Event).all()}
+        self.assertEqual(rows["message_sent"], self.sid)
+        self.assertEqual(rows["custom"], self.sid)
+        self.assertIsNone(rows["memory_created"])
+
+    def test_cached_progress_served_when_version_matches(self):
+        self._log(2)
+        other = self.Session()
+        try:
+            hits_before = progress_cache.stats()["hits"]
+            progress = event_log.get_latest_progress(other, self.uid, self.sid)
+            self.assertEqual(progress["current_prompt_index"], 2)
+            self.assertEqual(progress_cache.stats()["hits"], hits_before + 1)
+        finally:
+            other.close()
+
+    def test_write_from_another_worker_is_detected_by_version(self):
+        self._log(0)
+        # Simulate another worker: write directly without touching this process's cache.
+        row = self.db.get(SessionProgress, self.sid)
+        row.state_json = {**row.state_json, "current_prompt_index": 4}
+        row.version += 1
+        self.db.commit()
+        progress = event_log.get_latest_progress(self.Session(), self.uid, self.sid)
+        self.assertEqual(progress["current_prompt_index"], 4)
+        # The next write from this process must not reuse the stale version.
+        self._log(5)
+        self.assertEqual(self.db.get(SessionProgress, self.sid).version, 3)
+
+    def test_other_users_session_returns_none(self):
+        self._log(0)
+        self.assertIsNone(event_log.get_latest_progress(self.db, uuid.uuid4(), self.sid))
+
+    def test_backfill_takes_latest_event_by_seq_within_the_same_second(self):
+        same_second = datetime(2025, 1, 1, 12, 0, 0)
+        # Inserted newest first, so insertion order and created_at cannot pick the winner.
+        for seq, index in ((2, 7), (1, 6)):
+            self.db.add(Event(
+                user_id=self.uid,
+                type="progress_update",
+                payload_json={"session_id": str(self.sid), "current_prompt_index": index},
+                created_at=same_second,
+                seq=seq,
+            ))
+        self.db.commit()
+        with mock.patch.object(backfill_session_progress, "init_db"), \
+                mock.patch.object(backfill_session_progress, "SessionLocal", self.Session):
+            backfill_session_progress.backfill_session_progress()
+        self.db.expire_all()
+        row = self.db.get(SessionProgress, self.sid)
+        self.assertEqual(row.state_json["current_prompt_index"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Unit tests for the turn-scoped unit of work (no running server required)."""
+import unittest
+import uuid
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, turn_unit_of_work
+from app.models import Event, Message, SessionProgress, User, Session as StudySession
+from app import logging as event_log
+from app.progress_cache import progress_cache
+
+
+class TurnUnitOfWorkTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        progress_cache.clear()
+        self.uid = uuid.uuid4()
+        self.sid = uuid.uuid4()
+        self.db.add(
+            User(
+                user_id=self.uid,
+                username=f"u{self.uid.hex[:10]}",
+                password_hash="x",
+                condition_id="SESSION_AUTO",
+            )
+        )
+        self.db.add(StudySession(session_id=self.sid, user_id=self.uid))
+        self.db.commit()
+        self.commits = 0
+        event.listen(self.engine, "commit", self._count_commit)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _count_commit(self, conn):
+        self.commits += 1
+
+    def _turn_writes(self):
+        event_log.log_message_sent(self.db, self.uid, self.sid, "hello")
+        event_log.log_progress_update(
+            self.db,
+            self.uid,
+            self.sid,
+            current_phase=1,
+            current_prompt_index=1,
+            followups_used_for_prompt=0,
+            phase_complete=False,
+            study_complete=False,
+        )
+        self.db.add(Message(session_id=self.sid, role="user", content="hello"))
+        event_log.log_message_received(self.db, self.uid, self.sid, "hi there")
+
+    def test_turn_commits_once(self):
+        with turn_unit_of_work(self.db):
+            self._turn_writes()
+            self.assertEqual(self.commits, 0)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.db.query(Event).count(), 3)
+        self.assertEqual(self.db.query(Message).count(), 1)
+        self.assertEqual(self.db.get(SessionProgress, self.sid).state_json["current_prompt_index"], 1)
+
+    def test_rows_written_before_error_are_kept(self):
+        with self.assertRaises(RuntimeError):
+            with turn_unit_of_work(self.db):
+                event_log.log_message_sent(self.db, self.uid, self.sid, "hello")
+                raise RuntimeError("llm failed")
+        self.assertEqual(self.db.query(Event).count(), 1)
+
+    def test_disabled_keeps_eager_commits(self):
+        with turn_unit_of_work(self.db, enabled=False):
+            self._turn_writes()
+        self.assertGreater(self.commits, 1)
+
+
+    def test_failed_commit_does_not_cache_progress(self):
+        event_log.log_progress_update(
+            self.db, self.uid, self.sid, current_phase=1, current_prompt_index=0,
+            followups_used_for_prompt=0, phase_complete=False, study_complete=False,
+        )
+        cached = progress_cache.get(self.sid)
+        self.assertEqual(cached.version, 1)
+
+        def locked(conn):
+            raise RuntimeError("database is locked")
+
+        event.listen(self.engine, "commit", locked)
+        with self.assertRaises(RuntimeError):
+            with turn_unit_of_work(self.db):
+                event_log.log_progress_update(
+                    self.db, self.uid, self.sid, current_phase=1, current_prompt_index=1,
+                    followups_used_for_prompt=0, phase_complete=False, study_complete=False,
+                )
+        event.remove(self.engine, "commit", locked)
+        # The rolled-back version 2 never reached the cache.
+        self.assertIs(progress_cache.get(self.sid), cached)
+        self.db.rollback()
+        progress = event_log.get_latest_progress(self.db, self.uid, self.sid)
+        self.assertEqual(progress["current_prompt_index"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()